@@ -1,14 +1,28 @@
 from __future__ import annotations
 
+import os
+import statistics
+import time
 import traceback
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Iterator, Optional
 
 from validator.core.runner import run_triad_job
 from validator.core.artifacts import load_artifacts_from_dir
+from validator.core import metrics
+from validator.core.docker import remove_live_containers
+from validator.core.hashing import file_sha256
+from validator.core.scheduler import Allocation, Demand, HostCapacity, ResourcePool, job_demand
+from validator.core.trace import span, tracing
 from validator.checks.preflight import run_preflight
-from validator.reports.json_report import write_report_files
+from validator.checks.policy import Policy, load_policy
+from validator.reports.history import get_history
+from validator.reports.json_report import format_report, write_report_files
 
-def run_static_from_dir(dir_path: str) -> dict:
+def run_static_from_dir(dir_path: str, policy: Optional[Policy] = None) -> dict:
     base_dir = Path(dir_path)
     job = {
         "ok": False,
@@ -18,9 +32,12 @@ def run_static_from_dir(dir_path: str) -> dict:
     }
     try:
         artifacts = load_artifacts_from_dir(base_dir)
-        pre = run_preflight(base_dir, artifacts)
+        pre = run_preflight(base_dir, artifacts, policy=policy)
         job["ok"] = pre.ok
         job["violations"] = [v.to_dict() for v in pre.violations]
+        if "cache" in pre.stage_result.details:
+            job["preflight_cache"] = pre.stage_result.details["cache"]
+        metrics.record_static(job)
         return job
     except Exception as exc:
         tb = traceback.format_exc().splitlines()
@@ -33,13 +50,28 @@ def run_static_from_dir(dir_path: str) -> dict:
             "traceback_tail": "\n".join(tb[-120:]),
         }
 
-def run_triad_from_dir(dir_path: str) -> dict:
+def run_triad_from_dir(dir_path: str, cpuset: str = "", report_format: str = "full") -> dict:
+    # report_format "compact" cuts stage tails to an excerpt (see reports.json_report)
+    start = time.monotonic()
+    metrics.IN_FLIGHT.inc()
+    try:
+        res = _run_triad_from_dir(dir_path, cpuset, report_format)
+    finally:
+        metrics.IN_FLIGHT.dec()
+    metrics.record_job(res, time.monotonic() - start)
+    return res
+
+def _run_triad_from_dir(dir_path: str, cpuset: str = "", report_format: str = "full") -> dict:
     base_dir = Path(dir_path)
     try:
-        artifacts = load_artifacts_from_dir(base_dir)
-        report = run_triad_job(base_dir, artifacts)
-        write_report_files(base_dir, report)
-        return report.to_dict()
+        # every span of the job lands in <runs_dir>/trace.json (Chrome trace format)
+        with tracing() as tracer:
+            with span("triad_job", cat="job"):
+                artifacts = load_artifacts_from_dir(base_dir)
+                report = run_triad_job(base_dir, artifacts, cpuset=cpuset)
+                write_report_files(base_dir, report, load_policy(artifacts.policy))
+            tracer.write(Path(report.runs_dir) / "trace.json")
+        return format_report(report, report_format)
     except Exception as exc:
         tb = traceback.format_exc().splitlines()
         return {
@@ -50,3 +82,242 @@ def run_triad_from_dir(dir_path: str) -> dict:
             "message": str(exc),
             "traceback_tail": "\n".join(tb[-200:]),
         }
+
+_SUBMISSION_MARKERS = ("Dockerfile.problem", "test.patch", "solution.patch")
+
+def find_submission_dirs(root: Path) -> Iterator[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        # skips .validator_runs and other hidden dirs
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        if any(m in filenames for m in _SUBMISSION_MARKERS):
+            dirnames[:] = []
+            yield Path(dirpath)
+
+def _static_worker(dir_path: str, policy: Optional[Policy]) -> dict:
+    start = time.monotonic()
+    res = run_static_from_dir(dir_path, policy=policy)
+    res["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+    return res
+
+def _policy_error(dir_path: Path, exc: Exception) -> dict:
+    return {
+        "ok": False,
+        "dir": str(dir_path),
+        "phase": "STATIC",
+        "error_type": type(exc).__name__,
+        "message": f"validator.toml: {exc}",
+    }
+
+def iter_static_from_root(root_path: str, workers: Optional[int] = None) -> Iterator[dict]:
+    # yields one result per submission folder as it completes, then a final {"summary": ...}
+    root = Path(root_path)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    start = time.monotonic()
+
+    policies: dict[str, Policy] = {}
+    default_policy = Policy()
+    counts: Counter[str] = Counter()
+    violation_counts: Counter[str] = Counter()
+
+    def _policy_for(dir_path: Path) -> Policy:
+        # parsed once per distinct validator.toml content
+        toml_path = dir_path / "validator.toml"
+        if not toml_path.exists():
+            return default_policy
+        key = file_sha256(toml_path)
+        if key not in policies:
+            policies[key] = load_policy(toml_path)
+        return policies[key]
+
+    def _tally(res: dict) -> dict:
+        counts["folders"] += 1
+        if res.get("ok"):
+            counts["ok"] += 1
+        elif "error_type" in res:
+            counts["errors"] += 1
+        else:
+            counts["failed"] += 1
+        for v in res.get("violations", []):
+            violation_counts[v["code"]] += 1
+        if res.get("preflight_cache"):
+            counts["cache_" + res["preflight_cache"]] += 1
+        return res
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: set[Future] = set()
+        for dir_path in find_submission_dirs(root):
+            try:
+                policy = _policy_for(dir_path)
+            except Exception as exc:
+                yield _tally(_policy_error(dir_path, exc))
+                continue
+            pending.add(pool.submit(_static_worker, str(dir_path), policy))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    yield _tally(f.result())
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                yield _tally(f.result())
+
+    elapsed_s = time.monotonic() - start
+    yield {
+        "summary": {
+            "root": str(root),
+            "folders": counts["folders"],
+            "ok": counts["ok"],
+            "failed": counts["failed"],
+            "errors": counts["errors"],
+            "violation_counts": dict(sorted(violation_counts.items())),
+            "distinct_policies": len(policies),
+            "preflight_cache": {"hits": counts["cache_hit"], "misses": counts["cache_miss"]},
+            "workers": workers,
+            "elapsed_s": round(elapsed_s, 3),
+            "folders_per_s": round(counts["folders"] / elapsed_s, 2) if elapsed_s > 0 else None,
+        }
+    }
+
+@dataclass(frozen=True)
+class _BatchJob:
+    dir: str
+    demand: Demand
+    static_ok: bool
+    estimate_s: float
+
+def _plan_batch(dirs: list[Path], capacity: HostCapacity) -> list[_BatchJob]:
+    # preflight everything up front (cached, so the triad's own preflight is a hit): failed
+    # folders need no container and go first; the rest run longest-first by their last
+    # recorded duration, then by size, which keeps the tail of the batch short
+    with ThreadPoolExecutor(max_workers=max(1, len(capacity.cores))) as pool:
+        statics = list(pool.map(run_static_from_dir, [str(d) for d in dirs]))
+    history = get_history()
+    planned = []
+    for d, res in zip(dirs, statics):
+        try:
+            policy = load_policy(d / "validator.toml" if (d / "validator.toml").exists() else None)
+        except Exception:
+            policy = None
+        last = history.query(limit=1, submission_dir=str(d))
+        planned.append((d, res, policy, last[0].elapsed_ms / 1000 if last else None))
+
+    known = [e for _, _, _, e in planned if e is not None]
+    default_s = statistics.median(known) if known else 0.0
+    jobs = []
+    for d, res, policy, estimate in planned:
+        static_ok = bool(res.get("ok")) and policy is not None
+        jobs.append(_BatchJob(
+            dir=str(d),
+            demand=job_demand(policy, capacity) if static_ok else Demand(cores=0, memory_bytes=0),
+            static_ok=static_ok,
+            estimate_s=default_s if estimate is None else estimate,
+        ))
+    jobs.sort(key=lambda j: (j.static_ok, -j.estimate_s, -j.demand.cores, -j.demand.memory_bytes, j.dir))
+    return jobs
+
+def _batch_record(job: _BatchJob, alloc: Optional[Allocation], res: dict, queued_s: float, elapsed_s: float) -> dict:
+    summary = res.get("summary") or {}
+    rec = {
+        "dir": job.dir,
+        "ok": bool(res.get("ok")),
+        "job_id": res.get("job_id"),
+        "triad": summary.get("triad"),
+        "reason": summary.get("reason"),
+        "runs_dir": res.get("runs_dir"),
+        "cpuset": alloc.cpuset if alloc else None,
+        "memory_bytes": alloc.memory_bytes if alloc else 0,
+        "queued_s": round(queued_s, 3),
+        "elapsed_s": round(elapsed_s, 3),
+    }
+    if "error_type" in res:
+        rec["error_type"] = res["error_type"]
+        rec["message"] = res.get("message", "")
+    return rec
+
+def _timed_triad(dir_path: str, cpuset: str) -> tuple[dict, float]:
+    start = time.monotonic()
+    return run_triad_from_dir(dir_path, cpuset=cpuset), time.monotonic() - start
+
+def iter_triad_batch(dirs: list[Path], capacity: HostCapacity, status_interval_s: float = 5.0, on_status: Optional[Callable[[dict], None]] = None) -> Iterator[dict]:
+    # runs triads concurrently as host cores/memory allow: each admitted job holds a disjoint
+    # cpuset and its policy's memory until it finishes. Yields one record per job as it
+    # completes, then a final {"summary": ...}
+    start = time.monotonic()
+    jobs = _plan_batch(dirs, capacity)
+    pool = ResourcePool(capacity)
+    workers = max(1, len(capacity.cores))
+    queue = list(jobs)
+    running: dict[Future, tuple[_BatchJob, Optional[Allocation], float]] = {}
+    counts: Counter[str] = Counter()
+    peak = 0
+    next_status = start + status_interval_s
+
+    def _status() -> dict:
+        return {
+            "elapsed_s": round(time.monotonic() - start, 1),
+            "running": len(running),
+            "queued": len(queue),
+            "done": counts["jobs"],
+            "total": len(jobs),
+            **pool.usage(),
+        }
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="triad-batch")
+    try:
+        while queue or running:
+            # admit in priority order; later jobs that fit backfill around one that does not
+            for job in list(queue):
+                if len(running) >= workers:
+                    break
+                alloc = None
+                if job.static_ok:
+                    alloc = pool.try_acquire(job.demand)
+                    if alloc is None:
+                        continue
+                queue.remove(job)
+                fut = executor.submit(_timed_triad, job.dir, alloc.cpuset if alloc else "")
+                running[fut] = (job, alloc, time.monotonic() - start)
+            peak = max(peak, len(running))
+
+            done, _ = wait(running, timeout=max(next_status - time.monotonic(), 0.01), return_when=FIRST_COMPLETED)
+            for fut in done:
+                job, alloc, queued_s = running.pop(fut)
+                if alloc is not None:
+                    pool.release(alloc)
+                res, elapsed_s = fut.result()
+                counts["jobs"] += 1
+                if not job.static_ok:
+                    counts["static_failed"] += 1
+                counts["ok" if res.get("ok") else "errors" if "error_type" in res else "failed"] += 1
+                yield _batch_record(job, alloc, res, queued_s, elapsed_s)
+            if on_status is not None and time.monotonic() >= next_status:
+                on_status(_status())
+                next_status = time.monotonic() + status_interval_s
+    except BaseException:
+        # interrupted: stop admitting and kill running stages' containers so the
+        # workers return promptly
+        queue.clear()
+        executor.shutdown(wait=False, cancel_futures=True)
+        remove_live_containers()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+    elapsed_s = time.monotonic() - start
+    usage = pool.usage()
+    yield {
+        "summary": {
+            "jobs": counts["jobs"],
+            "ok": counts["ok"],
+            "failed": counts["failed"],
+            "errors": counts["errors"],
+            "static_failed": counts["static_failed"],
+            "capacity": capacity.to_dict(),
+            "peak_running": peak,
+            "core_utilization": usage["core_utilization"],
+            "memory_utilization": usage["memory_utilization"],
+            "elapsed_s": round(elapsed_s, 3),
+            "jobs_per_min": round(counts["jobs"] * 60 / elapsed_s, 2) if elapsed_s > 0 else None,
+        }
+    }
@@ -1,21 +1,184 @@
-from fastapi import FastAPI
+import asyncio
+import os
+import shutil
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from validator.api import run_static_from_dir, run_triad_from_dir
+from validator.checks.preflight_cache import get_preflight_cache
+from validator.reports.history import AGGREGATES, get_history, parse_time
+from validator.reports.json_report import REPORT_FORMATS, compact_report, iter_report_json
+from validator.core import metrics
+from validator.core.docker import remove_live_containers
+from validator.core.jobqueue import DONE, ERROR, JobQueue
+from validator.core.reaper import reap_orphans_once
+from validator.core.retention import release_upload
+from validator.core.upload import TarUpload, UploadError, is_upload_dir, new_upload_dir, upload_max_bytes
+
+def _release_if_upload(dir_path: str) -> None:
+    if is_upload_dir(dir_path):
+        release_upload(Path(dir_path))
+
+job_queue = JobQueue(run_triad_from_dir, workers=int(os.environ.get("VALIDATOR_QUEUE_WORKERS", "2")), on_done=_release_if_upload)
+metrics.REGISTRY.register(metrics.Gauge("validator_queue_depth", "Jobs waiting in the queue.", job_queue.depth))
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # containers of a previous server that crashed are gone before new jobs start
+    await asyncio.to_thread(reap_orphans_once)
+    job_queue.start()
+    try:
+        yield
+    finally:
+        job_queue.stop()
+        # stages still running in worker threads lose their containers
+        remove_live_containers()
+
+app = FastAPI(lifespan=lifespan)
 
 class DirPayload(BaseModel):
     dir_path: str
 
+def _report_format(value: str) -> str:
+    if value not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(REPORT_FORMATS)}")
+    return value
+
+async def _receive_upload(request: Request) -> dict:
+    # the request body is a tar (or tar.gz) of the submission folder; members are written
+    # and hashed chunk by chunk off the event loop
+    upload = TarUpload(new_upload_dir(), upload_max_bytes())
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await asyncio.to_thread(upload.feed, chunk)
+        await asyncio.to_thread(upload.close)
+    except UploadError as exc:
+        shutil.rmtree(upload.dest, ignore_errors=True)
+        raise HTTPException(status_code=413 if exc.code == "upload_too_large" else 400, detail={"error": exc.code, "message": str(exc)})
+    except BaseException:
+        # client went away mid-upload
+        shutil.rmtree(upload.dest, ignore_errors=True)
+        raise
+    return upload.to_dict()
+
+def _report_response(res: dict) -> StreamingResponse:
+    # reports can be large: encoded chunk by chunk instead of through jsonable_encoder
+    return StreamingResponse(iter_report_json(res), media_type="application/json")
+
+def _history_filters(ok, reason, since, until, dir_path, violation, failed_stage) -> dict:
+    try:
+        return {
+            "ok": ok,
+            "reason": reason,
+            "since": parse_time(since) if since else None,
+            "until": parse_time(until) if until else None,
+            "submission_dir": str(Path(dir_path).resolve()) if dir_path else None,
+            "violation": violation,
+            "failed_stage": failed_stage,
+        }
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/v1/postchecks/static/from-dir")
 def static_from_dir(payload: DirPayload):
     return run_static_from_dir(payload.dir_path)
 
+@app.post("/v1/postchecks/static/from-upload")
+async def static_from_upload(request: Request):
+    upload = await _receive_upload(request)
+    try:
+        res = await asyncio.to_thread(run_static_from_dir, upload["dir"])
+    finally:
+        await asyncio.to_thread(release_upload, Path(upload["dir"]))
+    return {**res, "upload": upload}
+
+@app.get("/v1/postchecks/static/cache")
+def static_cache_stats():
+    return get_preflight_cache().stats().to_dict()
+
 @app.post("/v1/jobs/from-dir")
-def jobs_from_dir(payload: DirPayload, wait: bool = True):
-    # wait is accepted for compatibility; execution is synchronous in local mode
-    return run_triad_from_dir(payload.dir_path)
+def jobs_from_dir(payload: DirPayload, wait: bool = True, format: str = "full"):
+    if wait:
+        return _report_response(run_triad_from_dir(payload.dir_path, report_format=_report_format(format)))
+    rec = job_queue.submit(str(Path(payload.dir_path).resolve()))
+    return rec.to_dict()
+
+@app.post("/v1/jobs/from-upload")
+async def jobs_from_upload(request: Request, wait: bool = True, format: str = "full"):
+    report_format = _report_format(format)
+    upload = await _receive_upload(request)
+    if wait:
+        try:
+            res = await asyncio.to_thread(run_triad_from_dir, upload["dir"], report_format=report_format)
+        finally:
+            await asyncio.to_thread(release_upload, Path(upload["dir"]))
+        return _report_response({**res, "upload": upload})
+    # released by the queue once the job's result is stored
+    rec = job_queue.submit(upload["dir"])
+    return {**rec.to_dict(), "upload": upload}
+
+@app.get("/v1/jobs")
+def list_jobs(status: str | None = None, limit: int = 100):
+    return {"jobs": [r.to_dict() for r in job_queue.list(status=status, limit=limit)], "queued": job_queue.depth()}
+
+@app.get("/v1/jobs/{job_id}")
+def job_status(job_id: str):
+    rec = job_queue.get(job_id)
+    if rec is None:
+        raise HTTPException(status_code=404, detail="unknown job_id")
+    return rec.to_dict()
+
+@app.get("/v1/jobs/{job_id}/result")
+def job_result(job_id: str, format: str = "full"):
+    report_format = _report_format(format)
+    rec = job_queue.get(job_id)
+    if rec is None:
+        raise HTTPException(status_code=404, detail="unknown job_id")
+    if rec.status not in (DONE, ERROR):
+        raise HTTPException(status_code=409, detail=f"job is {rec.status}")
+    res = job_queue.result(job_id)
+    if report_format == "compact" and res is not None:
+        res = compact_report(res)
+    return _report_response(res)
+
+@app.get("/v1/history")
+def history(
+    ok: bool | None = None,
+    reason: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    dir_path: str | None = None,
+    violation: str | None = None,
+    failed_stage: str | None = None,
+    limit: int = 100,
+):
+    filters = _history_filters(ok, reason, since, until, dir_path, violation, failed_stage)
+    return {"runs": [r.to_dict() for r in get_history().query(limit=limit, **filters)]}
+
+@app.get("/v1/history/stats")
+def history_stats(
+    by: str = "reason",
+    ok: bool | None = None,
+    reason: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    dir_path: str | None = None,
+    violation: str | None = None,
+    failed_stage: str | None = None,
+):
+    if by not in AGGREGATES:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(AGGREGATES)}")
+    filters = _history_filters(ok, reason, since, until, dir_path, violation, failed_stage)
+    return {"by": by, "groups": get_history().aggregate(by, **filters)}
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import fcntl
+import io
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+# Stand-in for the docker CLI calls in validator/core/docker.py, selected with
+#   VALIDATOR_DOCKER="python /path/to/validator/bench/fake_docker.py"
+# Builds only sleep; `run` / `exec` sleep for the container start latency and then run the
+# command on the host with /app mapped to the bind-mounted checkout. Images and containers
+# are tracked in a JSON file so cache lookups behave like the real daemon; a container's
+# host processes run in their own session and outlive a killed client until `rm -f`.
+#
+#   VALIDATOR_FAKE_DOCKER_STATE    state file (default $VALIDATOR_STATE_DIR/fake-docker.json)
+#   VALIDATOR_FAKE_BUILD_S         build latency in seconds (default 0.5)
+#   VALIDATOR_FAKE_RUN_S           container start latency in seconds (default 0.1)
+
+_IMAGE_SIZE = 150 * 1024 * 1024
+
+_FORMAT_FIELD = re.compile(r'\{\{\s*\.(Names|Label\s+"([^"]*)")\s*\}\}')
+
+def _state_path() -> Path:
+    explicit = os.environ.get("VALIDATOR_FAKE_DOCKER_STATE")
+    if explicit:
+        return Path(explicit)
+    root = Path(os.environ.get("VALIDATOR_STATE_DIR") or Path.home() / ".cache" / "validator-local")
+    root.mkdir(parents=True, exist_ok=True)
+    return root / "fake-docker.json"
+
+@contextmanager
+def _state() -> Iterator[dict]:
+    path = _state_path()
+    with open(f"{path}.lock", "w") as lk:
+        fcntl.flock(lk, fcntl.LOCK_EX)
+        try:
+            state = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            state = {"images": {}, "containers": {}}
+        yield state
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(tmp, path)
+
+def _latency(name: str, default: float) -> None:
+    time.sleep(float(os.environ.get(name, default)))
+
+def _remap(args: list[str], mount: str) -> list[str]:
+    return [a.replace("/app", mount) for a in args]
+
+def _relay(src: Any, dst: Any) -> None:
+    while chunk := src.read1(65536):
+        dst.write(chunk)
+        dst.flush()
+
+def _exec_host(cmd: list[str], mount: str, env: dict[str, str], container: Optional[str] = None) -> int:
+    if cmd[:2] == ["bash", "-lc"]:
+        # the host's login profile is not the image's and can cost seconds per stage
+        cmd = ["bash", "-c"] + cmd[2:]
+    full_env = dict(os.environ)
+    full_env.update({k: v.replace("/app", mount) for k, v in env.items()})
+    try:
+        proc = subprocess.Popen(_remap(cmd, mount), cwd=mount, env=full_env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    except FileNotFoundError:
+        return 127
+    if container is not None:
+        # so `rm -f` can kill it like the daemon would
+        with _state() as st:
+            if container in st["containers"]:
+                st["containers"][container].setdefault("pids", []).append(proc.pid)
+    # relayed rather than inherited, so killing this client closes the caller's pipes
+    relays = [threading.Thread(target=_relay, args=(proc.stdout, sys.stdout.buffer)), threading.Thread(target=_relay, args=(proc.stderr, sys.stderr.buffer))]
+    for t in relays:
+        t.start()
+    for t in relays:
+        t.join()
+    return proc.wait()
+
+def _build(args: list[str]) -> int:
+    tag = args[args.index("-t") + 1] if "-t" in args else "sha256:fake"
+    labels = dict(a.split("=", 1) for i, a in enumerate(args) if i and args[i - 1] == "--label")
+    if args and args[-1] == "-":
+        # build context streamed on stdin as a tar; -f names the Dockerfile inside it
+        data = sys.stdin.buffer.read()
+        try:
+            with tarfile.open(fileobj=io.BytesIO(data), mode="r") as tf:
+                names = set(tf.getnames())
+        except tarfile.TarError as exc:
+            print(f"ERROR: invalid build context: {exc}", file=sys.stderr)
+            return 1
+        dockerfile = args[args.index("-f") + 1] if "-f" in args else "Dockerfile"
+        if dockerfile not in names:
+            print(f"ERROR: Cannot locate specified Dockerfile: {dockerfile}", file=sys.stderr)
+            return 1
+        print(f"Step 1/1 : context {len(names)} entries, {len(data)} bytes")
+    for i, a in enumerate(args):
+        if i and args[i - 1] == "--cache-to" and "dest=" in a:
+            # buildx local cache export: an OCI layout directory
+            dest = Path(dict(o.partition("=")[::2] for o in a.split(","))["dest"])
+            dest.mkdir(parents=True, exist_ok=True)
+            (dest / "index.json").write_text(json.dumps({"schemaVersion": 2, "manifests": []}), encoding="utf-8")
+    _latency("VALIDATOR_FAKE_BUILD_S", 0.5)
+    with _state() as st:
+        st["images"][tag] = {"size": _IMAGE_SIZE, "labels": labels, "created": time.time()}
+    print(f"Successfully tagged {tag}")
+    return 0
+
+def _run(args: list[str]) -> int:
+    opts: dict = {"mount": None, "name": None, "detach": False, "env": {}, "labels": {}}
+    i = 0
+    while i < len(args) and args[i].startswith("-"):
+        flag = args[i]
+        if flag in ("--rm", "-d", "--init"):
+            opts["detach"] = opts["detach"] or flag == "-d"
+            i += 1
+            continue
+        value = args[i + 1]
+        if flag == "-v":
+            opts["mount"] = value.split(":", 1)[0]
+        elif flag == "--name":
+            opts["name"] = value
+        elif flag == "-e":
+            k, _, v = value.partition("=")
+            opts["env"][k] = v
+        elif flag == "--label":
+            k, _, v = value.partition("=")
+            opts["labels"][k] = v
+        i += 2
+    tag, cmd = args[i], args[i + 1:]
+
+    name = opts["name"]
+    with _state() as st:
+        known = tag in st["images"]
+        if known and name in st["containers"]:
+            print(f'Conflict. The container name "/{name}" is already in use', file=sys.stderr)
+            return 125
+        if known and name is not None:
+            st["containers"][name] = {"mount": opts["mount"], "image": tag, "labels": opts["labels"], "created": time.time(), "pids": []}
+    if not known:
+        print(f"Unable to find image '{tag}' locally", file=sys.stderr)
+        return 125
+    _latency("VALIDATOR_FAKE_RUN_S", 0.1)
+    if opts["detach"]:
+        print(name)
+        return 0
+    code = _exec_host(cmd, opts["mount"] or os.getcwd(), opts["env"], container=name)
+    if name is not None:
+        # --rm
+        with _state() as st:
+            st["containers"].pop(name, None)
+    return code
+
+def _exec(args: list[str]) -> int:
+    env: dict[str, str] = {}
+    while args and args[0].startswith("-"):
+        if args[0] == "-e":
+            k, _, v = args[1].partition("=")
+            env[k] = v
+        args = args[2:] if args[0] in ("-e", "-w", "-u") else args[1:]
+    name, cmd = args[0], args[1:]
+    with _state() as st:
+        container = st["containers"].get(name)
+    if container is None:
+        print(f"Error: No such container: {name}", file=sys.stderr)
+        return 1
+    return _exec_host(cmd, container["mount"], env, container=name)
+
+def _rm(args: list[str]) -> int:
+    with _state() as st:
+        for name in args:
+            if name.startswith("-"):
+                continue
+            container = st["containers"].pop(name, None) or {}
+            for pid in container.get("pids", []):
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+    return 0
+
+def _ps(args: list[str]) -> int:
+    label = args[args.index("--filter") + 1].removeprefix("label=") if "--filter" in args else None
+    fmt = args[args.index("--format") + 1] if "--format" in args else "{{.Names}}"
+    key, _, value = (label or "").partition("=")
+
+    with _state() as st:
+        for name, c in st["containers"].items():
+            labels = c.get("labels", {})
+            if label is not None and (key not in labels or (value and labels[key] != value)):
+                continue
+            print(_FORMAT_FIELD.sub(lambda m: name if m.group(2) is None else labels.get(m.group(2), ""), fmt))
+    return 0
+
+def _rmi(args: list[str]) -> int:
+    code = 0
+    with _state() as st:
+        for tag in args:
+            if tag.startswith("-"):
+                continue
+            if st["images"].pop(tag, None) is None:
+                print(f"Error: No such image: {tag}", file=sys.stderr)
+                code = 1
+    return code
+
+def _image_inspect(args: list[str]) -> int:
+    tag = args[-1]
+    with _state() as st:
+        image = st["images"].get(tag)
+    if image is None:
+        print(f"Error: No such image: {tag}", file=sys.stderr)
+        return 1
+    print(image["size"])
+    return 0
+
+def _images(args: list[str]) -> int:
+    label = args[args.index("--filter") + 1].removeprefix("label=") if "--filter" in args else None
+    with _state() as st:
+        for tag, image in st["images"].items():
+            if label is None or label.split("=", 1)[0] in image.get("labels", {}):
+                print(tag)
+    return 0
+
+def main(argv: list[str]) -> int:
+    if not argv:
+        print("usage: fake_docker <command> ...", file=sys.stderr)
+        return 2
+    cmd, args = argv[0], argv[1:]
+    if cmd == "build":
+        return _build(args)
+    if cmd == "buildx" and args[:1] == ["build"]:
+        return _build(args[1:])
+    if cmd == "run":
+        return _run(args)
+    if cmd == "exec":
+        return _exec(args)
+    if cmd == "rm":
+        return _rm(args)
+    if cmd == "rmi":
+        return _rmi(args)
+    if cmd == "image" and args[:1] == ["inspect"]:
+        return _image_inspect(args[1:])
+    if cmd == "images":
+        return _images(args)
+    if cmd == "ps":
+        return _ps(args)
+    print(f"fake docker: unsupported command {cmd!r}", file=sys.stderr)
+    return 2
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
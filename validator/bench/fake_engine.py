@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import re
+import socketserver
+import struct
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Stub of the Docker Engine API endpoints used by validator/core/engine.py, served on a
+# unix socket:
+#   python validator/bench/fake_engine.py --socket /tmp/engine.sock
+#   DOCKER_HOST=unix:///tmp/engine.sock VALIDATOR_DOCKER_BACKEND=engine validator triad ...
+# Same behaviour as fake_docker.py: builds only sleep (after checking the context tar
+# holds the Dockerfile), containers run their command on the host with /app mapped to the
+# bind mount. Latency knobs: VALIDATOR_FAKE_BUILD_S, VALIDATOR_FAKE_RUN_S.
+
+_FRAME = struct.Struct(">BxxxL")
+_IMAGE_SIZE = 150 * 1024 * 1024
+_VERSION_PREFIX = re.compile(r"^/v\d+\.\d+(?=/)")
+
+class _Output:
+    # multiplexed container output, replayable for `logs?follow=1`
+    def __init__(self) -> None:
+        self.frames: list[bytes] = []
+        self.done = False
+        self.cond = threading.Condition()
+
+    def add(self, kind: int, data: bytes) -> None:
+        with self.cond:
+            self.frames.append(_FRAME.pack(kind, len(data)) + data)
+            self.cond.notify_all()
+
+    def finish(self) -> None:
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+class _Container:
+    def __init__(self, cid: str, name: str, image: str, spec: dict[str, Any]):
+        self.id = cid
+        self.name = name
+        self.image = image
+        self.spec = spec
+        self.created = int(time.time())
+        binds = spec.get("HostConfig", {}).get("Binds") or []
+        self.mount = binds[0].split(":", 1)[0] if binds else os.getcwd()
+        self.proc: Optional[subprocess.Popen] = None
+        self.output = _Output()
+        self.exit_code: Optional[int] = None
+        self.idle = (spec.get("Entrypoint") or [None])[0] == "sleep"
+
+class _State:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.images: dict[str, dict[str, Any]] = {}
+        self.containers: dict[str, _Container] = {}
+        self.execs: dict[str, dict[str, Any]] = {}
+
+    def container(self, ref: str) -> Optional[_Container]:
+        with self.lock:
+            if ref in self.containers:
+                return self.containers[ref]
+            for c in self.containers.values():
+                if c.name == ref:
+                    return c
+        return None
+
+def _host_cmd(cmd: list[str], mount: str) -> list[str]:
+    if cmd[:2] == ["bash", "-lc"]:
+        # the host's login profile is not the image's and can cost seconds per stage
+        cmd = ["bash", "-c"] + cmd[2:]
+    return [a.replace("/app", mount) for a in cmd]
+
+def _spawn(cmd: list[str], mount: str, output: _Output) -> subprocess.Popen:
+    proc = subprocess.Popen(_host_cmd(cmd, mount), cwd=mount, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def pump(stream: Any, kind: int) -> None:
+        while chunk := stream.read1(65536):
+            output.add(kind, chunk)
+        stream.close()
+
+    pumps = [threading.Thread(target=pump, args=(proc.stdout, 1), daemon=True), threading.Thread(target=pump, args=(proc.stderr, 2), daemon=True)]
+    for t in pumps:
+        t.start()
+
+    def reap() -> None:
+        for t in pumps:
+            t.join()
+        proc.wait()
+        output.finish()
+
+    threading.Thread(target=reap, daemon=True).start()
+    return proc
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: _State
+
+    def log_message(self, format: str, *args: Any) -> None:
+        return None
+
+    def address_string(self) -> str:
+        return "unix"
+
+    # --- plumbing
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            out = io.BytesIO()
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return out.getvalue()
+                out.write(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self, status: int, obj: Any) -> None:
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _empty(self, status: int = 204) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _error(self, status: int, message: str) -> None:
+        self._json(status, {"message": message})
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _route(self, method: str) -> None:
+        url = urlsplit(self.path)
+        path = _VERSION_PREFIX.sub("", url.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._body() if method in ("POST", "PUT") else b""
+        try:
+            self._dispatch(method, path, query, body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_GET(self) -> None:
+        self._route("GET")
+
+    def do_POST(self) -> None:
+        self._route("POST")
+
+    def do_DELETE(self) -> None:
+        self._route("DELETE")
+
+    # --- endpoints
+
+    def _dispatch(self, method: str, path: str, query: dict[str, str], body: bytes) -> None:
+        st = self.state
+        if path == "/_ping":
+            data = b"OK"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if method == "POST" and path == "/build":
+            return self._build(query, body)
+        if method == "GET" and path == "/images/json":
+            label = (json.loads(query.get("filters", "{}")).get("label") or [None])[0]
+            with st.lock:
+                found = [
+                    {"Id": img["id"], "RepoTags": [tag], "Size": img["size"], "Labels": img["labels"]}
+                    for tag, img in st.images.items()
+                    if label is None or label.split("=", 1)[0] in img["labels"]
+                ]
+            return self._json(200, found)
+        m = re.match(r"^/images/(.+)/json$", path)
+        if method == "GET" and m:
+            tag = unquote(m.group(1))
+            with st.lock:
+                img = st.images.get(tag)
+            if img is None:
+                return self._error(404, f"No such image: {tag}")
+            return self._json(200, {"Id": img["id"], "RepoTags": [tag], "Size": img["size"], "Config": {"Labels": img["labels"]}})
+        m = re.match(r"^/images/(.+)$", path)
+        if method == "DELETE" and m:
+            tag = unquote(m.group(1))
+            with st.lock:
+                img = st.images.pop(tag, None)
+            if img is None:
+                return self._error(404, f"No such image: {tag}")
+            return self._json(200, [{"Untagged": tag}, {"Deleted": img["id"]}])
+        if method == "POST" and path == "/containers/create":
+            return self._create(query, json.loads(body or b"{}"))
+        if method == "GET" and path == "/containers/json":
+            label = (json.loads(query.get("filters", "{}")).get("label") or [None])[0]
+            with st.lock:
+                found = [
+                    {
+                        "Id": c.id,
+                        "Names": ["/" + c.name],
+                        "Image": c.image,
+                        "Created": c.created,
+                        "Labels": c.spec.get("Labels") or {},
+                        "State": "running" if c.idle or (c.proc is not None and c.proc.poll() is None) else "exited",
+                    }
+                    for c in st.containers.values()
+                    if label is None or label.split("=", 1)[0] in (c.spec.get("Labels") or {})
+                ]
+            return self._json(200, found)
+        m = re.match(r"^/containers/([^/]+)(?:/(\w+))?$", path)
+        if m:
+            c = st.container(unquote(m.group(1)))
+            if c is None:
+                return self._error(404, f"No such container: {unquote(m.group(1))}")
+            return self._container(method, m.group(2) or "", c, query, body)
+        m = re.match(r"^/exec/([^/]+)/(start|json)$", path)
+        if m:
+            with st.lock:
+                ex = st.execs.get(m.group(1))
+            if ex is None:
+                return self._error(404, f"No such exec instance: {m.group(1)}")
+            if m.group(2) == "json":
+                return self._json(200, {"ID": m.group(1), "Running": ex["exit_code"] is None, "ExitCode": ex["exit_code"]})
+            return self._exec_start(ex)
+        return self._error(404, f"page not found: {method} {path}")
+
+    def _build(self, query: dict[str, str], body: bytes) -> None:
+        dockerfile = query.get("dockerfile", "Dockerfile")
+        try:
+            with tarfile.open(fileobj=io.BytesIO(body), mode="r") as tf:
+                names = set(tf.getnames())
+        except tarfile.TarError as exc:
+            return self._error(400, f"invalid build context: {exc}")
+        if dockerfile not in names:
+            return self._error(500, f"Cannot locate specified Dockerfile: {dockerfile}")
+        tag = query.get("t", "")
+        labels = json.loads(query.get("labels") or "{}")
+        self._start_chunked("application/json")
+        self._chunk(json.dumps({"stream": f"Step 1/1 : context {len(names)} entries, {len(body)} bytes\n"}).encode("utf-8") + b"\r\n")
+        time.sleep(float(os.environ.get("VALIDATOR_FAKE_BUILD_S", "0.5")))
+        image_id = "sha256:" + uuid.uuid4().hex * 2
+        with self.state.lock:
+            if tag:
+                self.state.images[tag] = {"id": image_id, "size": _IMAGE_SIZE, "labels": labels, "created": time.time()}
+        self._chunk(json.dumps({"aux": {"ID": image_id}}).encode("utf-8") + b"\r\n")
+        self._chunk(json.dumps({"stream": f"Successfully tagged {tag}\n"}).encode("utf-8") + b"\r\n")
+        self._end_chunked()
+
+    def _create(self, query: dict[str, str], spec: dict[str, Any]) -> None:
+        st = self.state
+        image = spec.get("Image", "")
+        name = query.get("name") or f"fake_{uuid.uuid4().hex[:8]}"
+        with st.lock:
+            if image not in st.images:
+                return self._error(404, f"No such image: {image}")
+            if any(c.name == name for c in st.containers.values()):
+                return self._error(409, f'Conflict. The container name "/{name}" is already in use')
+            cid = uuid.uuid4().hex * 2
+            st.containers[cid] = _Container(cid, name, image, spec)
+        self._json(201, {"Id": cid, "Warnings": []})
+
+    def _container(self, method: str, action: str, c: _Container, query: dict[str, str], body: bytes) -> None:
+        st = self.state
+        if method == "DELETE" and not action:
+            if c.proc is not None and c.proc.poll() is None:
+                if query.get("force") not in ("1", "true"):
+                    return self._error(409, "You cannot remove a running container")
+                c.proc.kill()
+            with st.lock:
+                st.containers.pop(c.id, None)
+            return self._empty()
+        if method == "POST" and action == "start":
+            time.sleep(float(os.environ.get("VALIDATOR_FAKE_RUN_S", "0.1")))
+            if c.idle:
+                c.output.finish()
+            elif c.proc is None:
+                c.proc = _spawn(list(c.spec.get("Cmd") or []), c.mount, c.output)
+            return self._empty()
+        if method == "GET" and action == "logs":
+            self._start_chunked("application/vnd.docker.multiplexed-stream")
+            sent = 0
+            while True:
+                with c.output.cond:
+                    while sent == len(c.output.frames) and not (c.output.done or query.get("follow") not in ("1", "true")):
+                        c.output.cond.wait()
+                    frames = c.output.frames[sent:]
+                    done = c.output.done or query.get("follow") not in ("1", "true")
+                for f in frames:
+                    self._chunk(f)
+                sent += len(frames)
+                if done and sent == len(c.output.frames):
+                    break
+            return self._end_chunked()
+        if method == "POST" and action == "wait":
+            code = c.proc.wait() if c.proc is not None else 0
+            return self._json(200, {"StatusCode": code})
+        if method == "POST" and action == "kill":
+            if c.proc is not None and c.proc.poll() is None:
+                c.proc.kill()
+            return self._empty()
+        if method == "POST" and action == "exec":
+            if not c.idle and (c.proc is None or c.proc.poll() is not None):
+                return self._error(409, f"Container {c.id} is not running")
+            spec = json.loads(body or b"{}")
+            eid = uuid.uuid4().hex * 2
+            with st.lock:
+                st.execs[eid] = {"container": c, "cmd": list(spec.get("Cmd") or []), "exit_code": None}
+            return self._json(201, {"Id": eid})
+        return self._error(404, f"page not found: {method} /containers/{c.id}/{action}")
+
+    def _exec_start(self, ex: dict[str, Any]) -> None:
+        # hijacked raw stream: no length, connection closed at the end
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.docker.raw-stream")
+        self.end_headers()
+        output = _Output()
+        proc = _spawn(ex["cmd"], ex["container"].mount, output)
+        sent = 0
+        try:
+            while True:
+                with output.cond:
+                    while sent == len(output.frames) and not output.done:
+                        output.cond.wait()
+                    frames = output.frames[sent:]
+                    done = output.done
+                for f in frames:
+                    self.wfile.write(f)
+                self.wfile.flush()
+                sent += len(frames)
+                if done and sent == len(output.frames):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            proc.kill()
+        ex["exit_code"] = proc.wait()
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(socket_path: str) -> _Server:
+    # serves on a background thread; call shutdown() to stop
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    handler = type("Handler", (_Handler,), {"state": _State()})
+    server = _Server(socket_path, handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Stub Docker Engine API on a unix socket.")
+    parser.add_argument("--socket", required=True)
+    args = parser.parse_args(argv)
+    server = serve(args.socket)
+    print(f"listening on {args.socket}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import platform
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from validator.api import run_triad_from_dir
+from validator.bench import fake_docker, fake_engine
+from validator.bench.synth import SynthSpec, make_submission
+from validator.core.engine import EngineClient
+
+# Times the validator's own hot paths on a synthetic submission, with docker replaced by
+# validator.bench.fake_docker so build/test latency is a fixed, known constant. Per-step
+# durations come from the trace.json each triad run writes.
+
+RESULT_VERSION = 1
+
+_ENGINE_START_S = 10
+
+# metric -> (span category, fnmatch pattern on the span name); matching spans are summed
+METRICS: dict[str, tuple[str, str]] = {
+    "preflight": ("stage", "PREFLIGHT"),
+    "extract_repo": ("stage", "EXTRACT_REPO"),
+    "git_baseline": ("stage", "ENSURE_GIT_BASELINE"),
+    "patch_check": ("stage", "PATCH_CHECK"),
+    "patch_apply": ("cmd", "*APPLY_*"),
+    "report_bundle": ("step", "write_report_files"),
+    "docker_build": ("stage", "DOCKER_BUILD"),
+    "job": ("job", "triad_job"),
+}
+
+# informational only: dominated by the simulated docker latency
+_NOT_COMPARED = {"docker_build", "job"}
+
+def fake_docker_cli() -> str:
+    # by path rather than -m: docker commands run with cwd set to the checkout, where the
+    # validator package may not be importable; fake_docker only needs the stdlib
+    return shlex.join([sys.executable, str(Path(fake_docker.__file__).resolve())])
+
+def _span_totals(trace: dict[str, Any]) -> dict[str, float]:
+    totals: dict[str, float] = {}
+    for ev in trace.get("traceEvents", []):
+        if ev.get("ph") != "X":
+            continue
+        for metric, (cat, pattern) in METRICS.items():
+            if ev.get("cat") != cat:
+                continue
+            if fnmatch.fnmatchcase(ev["name"], pattern):
+                totals[metric] = totals.get(metric, 0.0) + ev["dur"] / 1000
+    return totals
+
+def _summarize(samples: list[float]) -> dict[str, Any]:
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "samples_ms": [round(s, 3) for s in samples],
+    }
+
+def _git_rev() -> Optional[str]:
+    head = Path(__file__).resolve().parents[2] / ".git" / "HEAD"
+    try:
+        ref = head.read_text(encoding="utf-8").strip()
+        if ref.startswith("ref: "):
+            return (head.parent / ref[5:]).read_text(encoding="utf-8").strip()
+        return ref
+    except OSError:
+        return None
+
+def _start_fake_engine(socket_path: Path) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, str(Path(fake_engine.__file__).resolve()), "--socket", str(socket_path)], stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + _ENGINE_START_S
+    while not EngineClient(str(socket_path)).ping(timeout_s=1):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError(f"fake engine did not start on {socket_path}")
+        time.sleep(0.05)
+    return proc
+
+def run_bench(spec: SynthSpec, repeat: int = 5, build_latency_s: float = 0.5, run_latency_s: float = 0.1, backend: str = "cli", work_dir: Optional[Path] = None, keep: bool = False) -> dict[str, Any]:
+    # call once per process, before anything opens the state dir: the bench gets fresh,
+    # empty caches in its own temp dir.
+    # backend "cli" drives fake_docker.py through VALIDATOR_DOCKER, "engine" talks to
+    # fake_engine.py over a unix socket
+    tmp = Path(tempfile.mkdtemp(prefix="validator-bench-", dir=str(work_dir) if work_dir else None))
+    os.environ["VALIDATOR_STATE_DIR"] = str(tmp / "state")
+    os.environ["VALIDATOR_PREFLIGHT_CACHE"] = "0"
+    os.environ["VALIDATOR_FAKE_BUILD_S"] = str(build_latency_s)
+    os.environ["VALIDATOR_FAKE_RUN_S"] = str(run_latency_s)
+    os.environ["VALIDATOR_DOCKER_BACKEND"] = backend
+    engine = None
+    if backend == "engine":
+        os.environ.pop("VALIDATOR_DOCKER", None)
+        os.environ["DOCKER_HOST"] = f"unix://{tmp / 'engine.sock'}"
+        engine = _start_fake_engine(tmp / "engine.sock")
+    else:
+        os.environ["VALIDATOR_DOCKER"] = fake_docker_cli()
+
+    try:
+        sub = make_submission(tmp / "submission", spec)
+        samples: dict[str, list[float]] = {m: [] for m in METRICS}
+        runs = []
+        for _ in range(repeat):
+            res = run_triad_from_dir(str(sub))
+            runs.append({"ok": bool(res.get("ok")), "reason": (res.get("summary") or {}).get("reason", res.get("error_type", ""))})
+            if "runs_dir" not in res:
+                continue
+            totals = _span_totals(json.loads((Path(res["runs_dir"]) / "trace.json").read_text(encoding="utf-8")))
+            for metric in METRICS:
+                if metric in totals:
+                    samples[metric].append(totals[metric])
+            if not keep:
+                # keep the next repeat's disk state the same as this one's
+                shutil.rmtree(res["runs_dir"], ignore_errors=True)
+    finally:
+        if engine is not None:
+            engine.terminate()
+            engine.wait()
+        if not keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "version": RESULT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_rev": _git_rev(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "spec": spec.to_dict(),
+        "repeat": repeat,
+        "fake_docker": {"backend": backend, "build_latency_s": build_latency_s, "run_latency_s": run_latency_s},
+        "ok": bool(runs) and all(r["ok"] for r in runs),
+        "runs": runs,
+        "work_dir": str(tmp) if keep else None,
+        "metrics": {m: _summarize(s) for m, s in samples.items() if s},
+    }
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.10, min_delta_ms: float = 1.0) -> dict[str, Any]:
+    # a metric regresses when its median grows by more than `threshold` (relative) and by
+    # more than min_delta_ms (absolute), so sub-millisecond jitter is not flagged
+    rows = []
+    for metric, cur in current.get("metrics", {}).items():
+        base = baseline.get("metrics", {}).get(metric)
+        if base is None:
+            continue
+        b, c = base["median_ms"], cur["median_ms"]
+        change = (c - b) / b if b else 0.0
+        rows.append({
+            "metric": metric,
+            "baseline_ms": b,
+            "current_ms": c,
+            "change": round(change, 4),
+            "regressed": metric not in _NOT_COMPARED and change > threshold and c - b > min_delta_ms,
+        })
+    return {
+        "threshold": threshold,
+        # results from a different spec or fake docker setup are not comparable
+        "same_setup": baseline.get("spec") == current.get("spec") and baseline.get("fake_docker") == current.get("fake_docker"),
+        "rows": rows,
+        "regressions": [r["metric"] for r in rows if r["regressed"]],
+    }
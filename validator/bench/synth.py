@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import random
+import zipfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+# Synthetic submission folders for `validator bench`: a package of `files` modules of about
+# `file_bytes` each, a test.patch padded to about `patch_bytes`, and a one-line
+# solution.patch. The triad passes on them: the new test fails until the solution doubles
+# pkg.core.scale, and the existing test passes either way. Output is deterministic per spec.
+
+_DIR_FANOUT = 50
+_PROBLEM_TEST = "tests/test_bench_problem.py"
+
+_CORE_PY = """def ident(x):
+    return x
+
+def scale(x):
+    return x
+"""
+
+_EXISTING_TEST = """from pkg.core import ident
+
+def test_ident():
+    assert ident(3) == 3
+"""
+
+_TEST_SH = f"""#!/bin/bash
+set -e
+if [ "$1" = "base" ]; then
+  python -m pytest -q -p no:cacheprovider tests --ignore={_PROBLEM_TEST}
+elif [ "$1" = "new" ]; then
+  python -m pytest -q -p no:cacheprovider {_PROBLEM_TEST}
+fi
+"""
+
+_SOLUTION_PATCH = """diff --git a/pkg/core.py b/pkg/core.py
+index 0000001..0000002 100644
+--- a/pkg/core.py
++++ b/pkg/core.py
+@@ -2,4 +2,4 @@ def ident(x):
+     return x
+{blank}
+ def scale(x):
+-    return x
++    return x * 2
+""".format(blank=" ")
+
+_VALIDATOR_TOML = """[gates]
+test_patch_min_bytes = 0
+solution_patch_min_bytes = 0
+
+[runner]
+baseline_cache = {baseline_cache}
+force_full_run = {force_full_run}
+
+[docker]
+image_cache = {image_cache}
+"""
+
+_WORDS = ("alpha", "beta", "gamma", "delta", "value", "index", "total", "count", "item", "node")
+
+@dataclass(frozen=True)
+class SynthSpec:
+    files: int = 200
+    file_bytes: int = 4096
+    patch_bytes: int = 16384
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def _module_source(rng: random.Random, n: int, size: int) -> str:
+    lines = [f'"""synthetic module {n}"""\n', "\n"]
+    total = sum(len(x) for x in lines)
+    i = 0
+    while total < size:
+        a, b = rng.choice(_WORDS), rng.choice(_WORDS)
+        fn = f"def {a}_{b}_{i}(x, y={rng.randint(0, 999)}):\n    return (x * {rng.randint(1, 97)} + y) % {rng.randint(101, 9973)}\n\n"
+        lines.append(fn)
+        total += len(fn)
+        i += 1
+    return "".join(lines)
+
+def _new_file_diff(path: str, text: str, mode: str = "100644") -> str:
+    body = text.splitlines(keepends=True)
+    out = [
+        f"diff --git a/{path} b/{path}\n",
+        f"new file mode {mode}\n",
+        "index 0000000..0000001\n",
+        "--- /dev/null\n",
+        f"+++ b/{path}\n",
+        f"@@ -0,0 +1,{len(body)} @@\n",
+    ]
+    out += ["+" + line for line in body]
+    return "".join(out)
+
+def _problem_test(target_bytes: int, fixed_bytes: int) -> str:
+    # padded with table rows rather than test functions so pytest time stays flat
+    head = "from pkg.core import scale\n\nCASES = [\n"
+    tail = "]\n\ndef test_scale():\n    for x, want in CASES:\n        assert scale(x) == want\n"
+    parts = [head]
+    total = fixed_bytes + len(head) + len(tail) + head.count("\n") + tail.count("\n")
+    i = 0
+    while i == 0 or total < target_bytes:
+        row = f"    ({i}, {i * 2}),\n"
+        parts.append(row)
+        total += len(row) + 1
+        i += 1
+    parts.append(tail)
+    return "".join(parts)
+
+def make_submission(dest: Path, spec: SynthSpec, baseline_cache: bool = False, force_full_run: bool = True, image_cache: bool = False) -> Path:
+    # caches default to off so every bench repeat exercises the cold paths
+    rng = random.Random(spec.seed)
+    dest.mkdir(parents=True, exist_ok=True)
+
+    with zipfile.ZipFile(dest / "repo.zip", "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("pkg/__init__.py", "")
+        zf.writestr("pkg/core.py", _CORE_PY)
+        zf.writestr("tests/__init__.py", "")
+        zf.writestr("tests/test_core.py", _EXISTING_TEST)
+        for n in range(spec.files):
+            zf.writestr(f"pkg/mod{n // _DIR_FANOUT:03d}/m{n:05d}.py", _module_source(rng, n, spec.file_bytes))
+        for d in range((spec.files + _DIR_FANOUT - 1) // _DIR_FANOUT):
+            zf.writestr(f"pkg/mod{d:03d}/__init__.py", "")
+
+    test_sh_diff = _new_file_diff("test.sh", _TEST_SH, mode="100755")
+    fixed = len(test_sh_diff) + len(_new_file_diff(_PROBLEM_TEST, ""))
+    test_patch = test_sh_diff + _new_file_diff(_PROBLEM_TEST, _problem_test(spec.patch_bytes, fixed))
+    (dest / "test.patch").write_text(test_patch, encoding="utf-8")
+    (dest / "solution.patch").write_text(_SOLUTION_PATCH, encoding="utf-8")
+    (dest / "Dockerfile.problem").write_text("FROM python:3.11-slim\nWORKDIR /app\nCOPY . /app\nRUN pip install pytest\n", encoding="utf-8")
+    (dest / "description.txt").write_text("Make pkg.core.scale double its argument.\n", encoding="utf-8")
+    (dest / "validator.toml").write_text(_VALIDATOR_TOML.format(
+        baseline_cache=str(baseline_cache).lower(),
+        force_full_run=str(force_full_run).lower(),
+        image_cache=str(image_cache).lower(),
+    ), encoding="utf-8")
+    return dest
@@ -1,32 +1,22 @@
 from __future__ import annotations
 
-import re
-from pathlib import Path
+from validator.checks.patch_index import PatchIndex
 from validator.reports.models import Violation
 
-_DIFF_RE = re.compile(r"^diff --git a/(.+?) b/(.+?)$")
+def is_problem_test(path: str) -> bool:
+    return path.startswith("tests/test_") and path.endswith("_problem.py")
 
-def _touched_files(patch_text: str) -> list[str]:
-    files: list[str] = []
-    for line in patch_text.splitlines():
-        m = _DIFF_RE.match(line.strip())
-        if m:
-            # b-path is authoritative for new files
-            files.append(m.group(2))
-    return files
-
-def check_test_patch_boundaries(test_patch: Path) -> list[Violation]:
-    txt = test_patch.read_text(encoding="utf-8", errors="replace")
-    touched = _touched_files(txt)
+def check_test_patch_boundaries(test_patch: PatchIndex) -> list[Violation]:
+    touched = test_patch.touched
 
     allowed = {"test.sh"}
-    new_tests = [p for p in touched if p.startswith("tests/test_") and p.endswith("_problem.py")]
+    new_tests = [p for p in touched if is_problem_test(p)]
 
     violations: list[Violation] = []
     for p in touched:
         if p in allowed:
             continue
-        if p.startswith("tests/test_") and p.endswith("_problem.py"):
+        if is_problem_test(p):
             continue
         violations.append(Violation(
             code="TEST_PATCH_BOUNDARY",
@@ -44,9 +34,8 @@ def check_test_patch_boundaries(test_patch: Path) -> list[Violation]:
         ))
     return violations
 
-def check_solution_patch_boundaries(solution_patch: Path) -> list[Violation]:
-    txt = solution_patch.read_text(encoding="utf-8", errors="replace")
-    touched = _touched_files(txt)
+def check_solution_patch_boundaries(solution_patch: PatchIndex) -> list[Violation]:
+    touched = solution_patch.touched
 
     violations: list[Violation] = []
     for p in touched:
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from validator.core.hashing import cached_file_sha256
+
+_DIFF_RE = re.compile(r"^diff --git a/(.+?) b/(.+?)$")
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_NO_NEWLINE = "\\ No newline at end of file"
+_MEMO_SIZE = 64
+
+@dataclass
+class Hunk:
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    added: int = 0
+    removed: int = 0
+
+@dataclass
+class PatchFile:
+    old_path: Optional[str]
+    new_path: Optional[str]
+    is_new: bool = False
+    is_deleted: bool = False
+    is_binary: bool = False
+    hunks: list[Hunk] = field(default_factory=list)
+    added: int = 0
+    removed: int = 0
+    # full content of files the patch creates (e.g. test.sh); None for modified files
+    post_image: Optional[str] = None
+
+    @property
+    def path(self) -> str:
+        # b-path is authoritative for new files
+        return self.new_path if self.new_path is not None else (self.old_path or "")
+
+@dataclass(frozen=True)
+class PatchIndex:
+    digest: str
+    size_bytes: int
+    files: list[PatchFile]
+
+    @property
+    def touched(self) -> list[str]:
+        return [f.path for f in self.files]
+
+    @property
+    def added(self) -> int:
+        return sum(f.added for f in self.files)
+
+    @property
+    def removed(self) -> int:
+        return sum(f.removed for f in self.files)
+
+    def file(self, path: str) -> Optional[PatchFile]:
+        for f in self.files:
+            if f.path == path:
+                return f
+        return None
+
+def _strip_prefix(raw: str) -> Optional[str]:
+    path = raw.split("\t", 1)[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        return path[2:]
+    return path
+
+class _Parser:
+    def __init__(self) -> None:
+        self.files: list[PatchFile] = []
+        self.cur: Optional[PatchFile] = None
+        self.post: Optional[list[str]] = None
+        self.hunk: Optional[Hunk] = None
+        self.old_left = 0
+        self.new_left = 0
+        self.last_added = False
+
+    def _finish_file(self) -> None:
+        if self.cur is not None and self.post is not None:
+            self.cur.post_image = "".join(self.post)
+        self.cur = None
+        self.post = None
+        self.hunk = None
+        self.old_left = self.new_left = 0
+
+    def _start_file(self, old_path: Optional[str], new_path: Optional[str]) -> None:
+        self._finish_file()
+        self.cur = PatchFile(old_path=old_path, new_path=new_path)
+        self.files.append(self.cur)
+
+    def feed(self, line: str) -> None:
+        body = line.rstrip("\n")
+        if self.hunk is not None and (self.old_left > 0 or self.new_left > 0):
+            self._hunk_line(body)
+            return
+        if self.hunk is not None and body == _NO_NEWLINE:
+            self._no_newline()
+            return
+
+        m = _DIFF_RE.match(body.strip())
+        if m:
+            self._start_file(m.group(1), m.group(2))
+            return
+
+        m = _HUNK_RE.match(body)
+        if m and self.cur is not None:
+            old_len = int(m.group(2)) if m.group(2) is not None else 1
+            new_len = int(m.group(4)) if m.group(4) is not None else 1
+            self.hunk = Hunk(int(m.group(1)), old_len, int(m.group(3)), new_len)
+            self.cur.hunks.append(self.hunk)
+            self.old_left, self.new_left = old_len, new_len
+            if self.cur.is_new and self.post is None:
+                self.post = []
+            return
+
+        if body.startswith("--- "):
+            # plain unified diffs have no "diff --git" header
+            if self.cur is None or self.cur.hunks:
+                self._start_file(_strip_prefix(body[4:]), None)
+            else:
+                self.cur.old_path = _strip_prefix(body[4:])
+            if self.cur.old_path is None:
+                self.cur.is_new = True
+            return
+        if body.startswith("+++ ") and self.cur is not None:
+            self.cur.new_path = _strip_prefix(body[4:])
+            if self.cur.new_path is None:
+                self.cur.is_deleted = True
+            return
+
+        if self.cur is None:
+            return
+        if body.startswith("new file mode"):
+            self.cur.is_new = True
+        elif body.startswith("deleted file mode"):
+            self.cur.is_deleted = True
+        elif body.startswith("rename from "):
+            self.cur.old_path = body[len("rename from "):]
+        elif body.startswith("rename to "):
+            self.cur.new_path = body[len("rename to "):]
+        elif body.startswith("GIT binary patch") or body.startswith("Binary files "):
+            self.cur.is_binary = True
+
+    def _hunk_line(self, body: str) -> None:
+        assert self.cur is not None and self.hunk is not None
+        tag = body[:1]
+        if tag == "+":
+            self.hunk.added += 1
+            self.cur.added += 1
+            self.new_left -= 1
+            if self.post is not None:
+                self.post.append(body[1:] + "\n")
+            self.last_added = True
+        elif tag == "-":
+            self.hunk.removed += 1
+            self.cur.removed += 1
+            self.old_left -= 1
+            self.last_added = False
+        elif tag == "\\":
+            self._no_newline()
+        else:
+            # context line (a bare empty line is context too)
+            self.old_left -= 1
+            self.new_left -= 1
+            self.last_added = False
+
+    def _no_newline(self) -> None:
+        if self.last_added and self.post:
+            self.post[-1] = self.post[-1][:-1]
+
+    def result(self) -> list[PatchFile]:
+        self._finish_file()
+        return self.files
+
+def _parse(path: Path) -> PatchIndex:
+    # the digest is taken from the same bytes the parser sees
+    parser = _Parser()
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            size += len(raw)
+            h.update(raw)
+            parser.feed(raw.decode("utf-8", errors="replace"))
+    return PatchIndex(digest=h.hexdigest(), size_bytes=size, files=parser.result())
+
+_memo: OrderedDict[str, PatchIndex] = OrderedDict()
+_memo_lock = threading.Lock()
+
+def parse_patch(path: Path) -> PatchIndex:
+    # single streaming pass over the patch; memoized by content hash so every check in a
+    # preflight (and repeated preflights of the same file) share one parse. An unchanged
+    # file's digest comes from the digest cache; otherwise it is hashed during the parse.
+    parsed: list[PatchIndex] = []
+
+    def parse_and_hash(p: Path) -> str:
+        parsed.append(_parse(p))
+        return parsed[0].digest
+
+    digest = cached_file_sha256(path, compute=parse_and_hash)
+    if not parsed:
+        with _memo_lock:
+            hit = _memo.get(digest)
+            if hit is not None:
+                _memo.move_to_end(digest)
+                return hit
+        parsed.append(_parse(path))
+
+    index = parsed[0]
+    with _memo_lock:
+        _memo[index.digest] = index
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return index
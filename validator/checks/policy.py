@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -15,10 +16,18 @@ class Policy:
     new_timeout_s: int = 900
     postchecks_timeout_s: int = 300
     max_log_bytes: int = 2_000_000
+    # repo.zip, checked against the central directory before extracting
+    repo_zip_max_files: int = 200_000
+    repo_zip_max_bytes: int = 8 * 1024**3
+    repo_zip_max_member_bytes: int = 1024**3
+    repo_zip_max_ratio: float = 250.0  # uncompressed/compressed, for members of 1 MiB and up
 
     docker_network: str = "none"
     docker_cpus: float = 2.0
     docker_memory: str = "4g"
+    docker_image_cache: bool = True
+    docker_build_context: str = "minimal"  # "minimal": what the Dockerfile COPY/ADDs, minus .git; "full": whole checkout
+    build_cache_dir: str = ""  # persistent BuildKit layer cache (needs docker buildx); not part of the image key
 
     test_patch_min_bytes: int = 14_336
     solution_patch_min_bytes: int = 2_765
@@ -33,6 +42,35 @@ class Policy:
     enforce_new_runs_only_new: bool = True
     forbid_backticks: bool = True
 
+    parallel_phases: bool = False
+    container_mode: str = "run"  # "run": docker run --rm per stage, "exec": one container per job
+    baseline_cache: bool = True
+    patch_check: bool = True
+    force_full_run: bool = False  # ignore memoized phase 1 results
+    junit_results: bool = False  # per-test outcomes from pytest JUnit XML
+    flaky_retries: int = 0  # reruns of just the failing tests before a test stage fails
+    flaky_max_tests: int = 20  # more failing tests than this is not a flake: no rerun
+    extract_workers: int = 0  # repo.zip extraction threads, 0 = min(8, cpus)
+    scratch_dir: str = ""  # extract the checkout under this dir (e.g. /dev/shm) instead of runs/
+
+    report_format: str = "full"  # report.json: "full" or "compact" (stage tails cut, logs referenced)
+
+    bundle_compress_level: int = 6
+    bundle_input_store: bool = False  # reference large inputs by sha256 in the shared blob store
+    bundle_store_min_bytes: int = 1024 * 1024
+
+_SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?$")
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+def parse_size_bytes(value: str | int) -> int:
+    # docker-style sizes: "512m", "4g", "2000000"
+    if isinstance(value, int):
+        return value
+    m = _SIZE_RE.match(value.strip().lower())
+    if not m:
+        raise ValueError(f"invalid size: {value!r}")
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2)])
+
 def load_policy(policy_path: Path | None) -> Policy:
     if policy_path is None or not policy_path.exists():
         return Policy()
@@ -46,6 +84,19 @@ def load_policy(policy_path: Path | None) -> Policy:
     gates = raw.get("gates", {})
     rules_pb = raw.get("rules", {}).get("patch_boundaries", {})
     rules_sh = raw.get("rules", {}).get("test_sh", {})
+    runner = raw.get("runner", {})
+    bundle = raw.get("bundle", {})
+    report = raw.get("report", {})
+
+    build_context = str(docker.get("build_context", "minimal"))
+    if build_context not in ("minimal", "full"):
+        raise ValueError(f"[docker] build_context must be minimal or full, got {build_context!r}")
+    report_format = str(report.get("format", "full"))
+    if report_format not in ("full", "compact"):
+        raise ValueError(f"[report] format must be full or compact, got {report_format!r}")
+    container_mode = str(runner.get("container_mode", "run"))
+    if container_mode not in ("run", "exec"):
+        raise ValueError(f"[runner] container_mode must be run or exec, got {container_mode!r}")
 
     return Policy(
         docker_build_timeout_s=int(limits.get("docker_build_timeout_s", 900)),
@@ -53,10 +104,17 @@ def load_policy(policy_path: Path | None) -> Policy:
         new_timeout_s=int(limits.get("new_timeout_s", 900)),
         postchecks_timeout_s=int(limits.get("postchecks_timeout_s", 300)),
         max_log_bytes=int(limits.get("max_log_bytes", 2_000_000)),
+        repo_zip_max_files=int(limits.get("repo_zip_max_files", 200_000)),
+        repo_zip_max_bytes=parse_size_bytes(limits.get("repo_zip_max_bytes", "8g")),
+        repo_zip_max_member_bytes=parse_size_bytes(limits.get("repo_zip_max_member_bytes", "1g")),
+        repo_zip_max_ratio=float(limits.get("repo_zip_max_ratio", 250.0)),
 
         docker_network=str(docker.get("network", "none")),
         docker_cpus=float(docker.get("cpus", 2.0)),
         docker_memory=str(docker.get("memory", "4g")),
+        docker_image_cache=bool(docker.get("image_cache", True)),
+        docker_build_context=build_context,
+        build_cache_dir=str(docker.get("build_cache_dir", "")),
 
         test_patch_min_bytes=int(gates.get("test_patch_min_bytes", 14_336)),
         solution_patch_min_bytes=int(gates.get("solution_patch_min_bytes", 2_765)),
@@ -69,4 +127,21 @@ def load_policy(policy_path: Path | None) -> Policy:
         enforce_base_ignores_new=bool(rules_sh.get("enforce_base_ignores_new", True)),
         enforce_new_runs_only_new=bool(rules_sh.get("enforce_new_runs_only_new", True)),
         forbid_backticks=bool(rules_sh.get("forbid_backticks", True)),
+
+        parallel_phases=bool(runner.get("parallel_phases", False)),
+        container_mode=container_mode,
+        baseline_cache=bool(runner.get("baseline_cache", True)),
+        patch_check=bool(runner.get("patch_check", True)),
+        force_full_run=bool(runner.get("force_full_run", False)),
+        junit_results=bool(runner.get("junit_results", False)),
+        flaky_retries=int(runner.get("flaky_retries", 0)),
+        flaky_max_tests=int(runner.get("flaky_max_tests", 20)),
+        extract_workers=int(runner.get("extract_workers", 0)),
+        scratch_dir=str(runner.get("scratch_dir", "")),
+
+        report_format=report_format,
+
+        bundle_compress_level=int(bundle.get("compress_level", 6)),
+        bundle_input_store=bool(bundle.get("input_store", False)),
+        bundle_store_min_bytes=parse_size_bytes(bundle.get("store_min_bytes", 1024 * 1024)),
     )
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import sqlite3
+from dataclasses import dataclass, replace
 from pathlib import Path
+from typing import Optional
 
 from validator.core.artifacts import SubmissionArtifacts
 from validator.checks.policy import Policy, load_policy
 from validator.checks.boundaries import check_test_patch_boundaries, check_solution_patch_boundaries
 from validator.checks.encoding import check_ascii_lf
+from validator.checks.patch_index import parse_patch
+from validator.checks.preflight_cache import cache_enabled, decode_result, encode_result, get_preflight_cache
 from validator.checks.sizes import check_min_size
-from validator.checks.test_sh import check_test_sh
+from validator.checks.test_sh import check_test_sh, check_test_sh_text
+from validator.core.trace import span
 from validator.reports.models import Violation, StageResult
 
 @dataclass(frozen=True)
@@ -17,28 +22,67 @@ class PreflightResult:
     violations: list[Violation]
     stage_result: StageResult
 
-def run_preflight(submission_dir: Path, artifacts: SubmissionArtifacts, policy: Policy | None = None) -> PreflightResult:
-    pol = policy if policy is not None else load_policy(artifacts.policy)
+def run_preflight(submission_dir: Path, artifacts: SubmissionArtifacts, policy: Policy | None = None, use_cache: Optional[bool] = None) -> PreflightResult:
+    # results are cached on disk by input digests + policy; VALIDATOR_PREFLIGHT_CACHE=0 disables
+    with span("PREFLIGHT", cat="stage") as sp:
+        pol = policy if policy is not None else load_policy(artifacts.policy)
+        res = _cached_preflight(submission_dir, artifacts, pol, cache_enabled() if use_cache is None else use_cache)
+    return replace(res, stage_result=replace(res.stage_result, elapsed_ms=sp.elapsed_ms))
+
+def _cached_preflight(submission_dir: Path, artifacts: SubmissionArtifacts, pol: Policy, use_cache: bool) -> PreflightResult:
+    if not use_cache:
+        return _run_checks(submission_dir, artifacts, pol)
+
+    cache = get_preflight_cache()
+    with span("preflight_cache_lookup"):
+        key = cache.key_for(submission_dir, artifacts, pol)
+        try:
+            hit = cache.get(key)
+        except sqlite3.Error:
+            hit = None  # the cache is an optimization: a lookup that fails is a miss
+    if hit is not None:
+        ok, violations, stage = decode_result(hit)
+        status = "hit"
+    else:
+        res = _run_checks(submission_dir, artifacts, pol)
+        ok, violations, stage = res.ok, res.violations, res.stage_result
+        try:
+            cache.put(key, encode_result(ok, violations, stage))
+        except sqlite3.Error:
+            pass
+        status = "miss"
+    stage = replace(stage, details={**stage.details, "cache": status, "key": key})
+    return PreflightResult(ok=ok, violations=violations, stage_result=stage)
+
+def _run_checks(submission_dir: Path, artifacts: SubmissionArtifacts, pol: Policy) -> PreflightResult:
     violations: list[Violation] = []
 
     # size gates
     violations += check_min_size(artifacts.test_patch, pol.test_patch_min_bytes, "TEST_PATCH_SIZE")
     violations += check_min_size(artifacts.solution_patch, pol.solution_patch_min_bytes, "SOLUTION_PATCH_SIZE")
 
+    # each patch is parsed once (memoized by content hash) and shared by the checks below
+    with span("parse_patches"):
+        test_idx = parse_patch(artifacts.test_patch)
+        solution_idx = parse_patch(artifacts.solution_patch)
+
     # boundaries
     if pol.enforce_test_patch_boundaries:
-        violations += check_test_patch_boundaries(artifacts.test_patch)
+        violations += check_test_patch_boundaries(test_idx)
     if pol.enforce_solution_patch_boundaries:
-        violations += check_solution_patch_boundaries(artifacts.solution_patch)
+        violations += check_solution_patch_boundaries(solution_idx)
 
     # description encoding
     if artifacts.description is not None:
         violations += check_ascii_lf(artifacts.description, pol.description_ascii_only, pol.description_lf_only)
 
-    # test.sh rules (requires patch to add it, but we can preflight by parsing patch content)
-    # If test.sh exists directly in submission_dir, check it too.
+    # test.sh rules: check the test.sh that test.patch creates; a loose test.sh in
+    # submission_dir is the fallback when the patch only modifies (or lacks) it
+    sh_file = test_idx.file("test.sh")
     sh_path = submission_dir / "test.sh"
-    if sh_path.exists():
+    if sh_file is not None and sh_file.post_image is not None:
+        violations += check_test_sh_text(sh_file.post_image, pol.forbid_backticks)
+    elif sh_path.exists():
         violations += check_test_sh(sh_path, pol.forbid_backticks)
 
     ok = (len(violations) == 0)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from validator.checks.policy import Policy
+from validator.core.artifacts import SubmissionArtifacts
+from validator.core.hashing import cached_file_sha256, json_sha256
+from validator.core.state import connect
+from validator.reports.models import StageResult, Violation
+
+# PreflightResult is a pure function of the input files and the policy, so results are
+# stored in sqlite keyed by their digests. File digests come from cached_file_sha256, so a
+# hit costs a few stat() calls and indexed selects.
+
+_DB_NAME = "preflight.sqlite"
+# bump whenever a check changes what it reports
+_CACHE_VERSION = 2
+
+@dataclass(frozen=True)
+class PreflightCacheStats:
+    entries: int
+    size_bytes: int
+    hits: int
+    misses: int
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+def cache_enabled() -> bool:
+    return os.environ.get("VALIDATOR_PREFLIGHT_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+class PreflightCache:
+    def __init__(self, db_name: str = _DB_NAME):
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, size_bytes INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def key_for(self, submission_dir: Path, artifacts: SubmissionArtifacts, policy: Policy) -> str:
+        def _digest(path: Optional[Path]) -> Optional[str]:
+            return cached_file_sha256(path) if path is not None and path.is_file() else None
+
+        return json_sha256({
+            "version": _CACHE_VERSION,
+            "test_patch": _digest(artifacts.test_patch),
+            "solution_patch": _digest(artifacts.solution_patch),
+            "description": _digest(artifacts.description),
+            # only consulted when test.patch does not create test.sh
+            "test_sh": _digest(submission_dir / "test.sh"),
+            "policy": dataclasses.asdict(policy),
+        })
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        # IMMEDIATE takes the write lock up front (waiting out the busy timeout); a deferred
+        # BEGIN that upgrades to a write after the SELECT fails at once when another process
+        # holds it
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT result FROM results WHERE key=?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE results SET hits=hits+1, last_used_at=? WHERE key=?", (time.time(), key))
+                self._bump("hits" if row is not None else "misses")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        data = json.dumps(result, sort_keys=True)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, size_bytes, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+
+    def stats(self) -> PreflightCacheStats:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return PreflightCacheStats(
+            entries=int(entries),
+            size_bytes=int(size),
+            hits=int(counters.get("hits", 0)),
+            misses=int(counters.get("misses", 0)),
+        )
+
+    def prune(self, max_entries: Optional[int], max_bytes: Optional[int], dry_run: bool = False) -> tuple[int, int]:
+        # drops least recently used results; returns (removed entries, reclaimed bytes)
+        with self._lock:
+            rows = self._conn.execute("SELECT key, size_bytes FROM results ORDER BY last_used_at ASC, key ASC").fetchall()
+            count, total = len(rows), sum(r[1] for r in rows)
+            victims: list[tuple[str, int]] = []
+            for key, size in rows:
+                over_count = max_entries is not None and count > max_entries
+                over_bytes = max_bytes is not None and total > max_bytes
+                if not (over_count or over_bytes):
+                    break
+                victims.append((key, size))
+                count -= 1
+                total -= size
+            if not dry_run:
+                self._conn.executemany("DELETE FROM results WHERE key=?", [(k,) for k, _ in victims])
+        return len(victims), sum(s for _, s in victims)
+
+    def _bump(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value=value+1", (name,)
+        )
+
+_cache: Optional[PreflightCache] = None
+_cache_pid = 0
+_cache_lock = threading.Lock()
+
+def get_preflight_cache() -> PreflightCache:
+    # one connection per process; pool workers forked after first use open their own
+    global _cache, _cache_pid
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = PreflightCache()
+            _cache_pid = os.getpid()
+        return _cache
+
+def encode_result(ok: bool, violations: list[Violation], stage: StageResult) -> dict[str, Any]:
+    return {"ok": ok, "violations": [v.to_dict() for v in violations], "stage": stage.to_dict()}
+
+def decode_result(data: dict[str, Any]) -> tuple[bool, list[Violation], StageResult]:
+    return bool(data["ok"]), [Violation(**v) for v in data["violations"]], StageResult(**data["stage"])
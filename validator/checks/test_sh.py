@@ -4,8 +4,11 @@ from pathlib import Path
 from validator.reports.models import Violation
 
 def check_test_sh(path: Path, forbid_backticks: bool) -> list[Violation]:
-    violations: list[Violation] = []
     txt = path.read_text(encoding="utf-8", errors="replace")
+    return check_test_sh_text(txt, forbid_backticks)
+
+def check_test_sh_text(txt: str, forbid_backticks: bool) -> list[Violation]:
+    violations: list[Violation] = []
 
     if forbid_backticks and "`" in txt:
         violations.append(Violation(
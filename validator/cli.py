@@ -1,24 +1,367 @@
 import argparse
 import json
+import signal
 import sys
+import tempfile
+import time
 from pathlib import Path
 
-from validator.api import run_static_from_dir, run_triad_from_dir
+from validator.api import find_submission_dirs, iter_static_from_root, iter_triad_batch, run_static_from_dir, run_triad_from_dir
+from validator.bench.harness import compare_results, run_bench
+from validator.bench.synth import SynthSpec, make_submission
+from validator.checks.policy import load_policy, parse_size_bytes
+from validator.checks.preflight_cache import get_preflight_cache
+from validator.core.docker import DockerConfig, measure_container_overhead
+from validator.core.baselines import list_baselines, prune_baselines
+from validator.core.image_cache import list_cached_images, prune_images
+from validator.core.phase_memo import list_phase1, prune_phase1
+from validator.core.reaper import reap_orphans
+from validator.core.scheduler import host_capacity
+from validator.core.retention import DROP_WORK_MODES, collect_garbage, find_runs_parents
+from validator.reports.bundle import export_bundle
+from validator.reports.history import AGGREGATES, backfill, get_history, parse_time
+from validator.reports.json_report import REPORT_FORMATS, iter_report_json
 
 def _print_json(obj) -> None:
     print(json.dumps(obj, indent=2, sort_keys=True))
 
+def _static_root_cmd(root: str, workers) -> int:
+    all_ok = True
+    for res in iter_static_from_root(root, workers=workers):
+        if "summary" not in res and not res.get("ok"):
+            all_ok = False
+        sys.stdout.write(json.dumps(res, sort_keys=True) + "\n")
+        sys.stdout.flush()
+    return 0 if all_ok else 1
+
+def _positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+def _gib(n: int) -> str:
+    return f"{n / (1 << 30):.1f}G"
+
+def _print_batch_status(st: dict) -> None:
+    sys.stderr.write(
+        f"[{st['elapsed_s']:7.1f}s] running {st['running']} queued {st['queued']} done {st['done']}/{st['total']}"
+        f" | cores {st['cores_used']}/{st['cores']} mem {_gib(st['memory_used_bytes'])}/{_gib(st['memory_bytes'])}"
+        f" | avg core util {st['core_utilization']:.0%}\n"
+    )
+    sys.stderr.flush()
+
+def _triad_batch_cmd(args) -> int:
+    dirs = [Path(d).resolve() for d in args.dir or []]
+    for root in args.root or []:
+        dirs.extend(find_submission_dirs(Path(root).resolve()))
+    dirs = list(dict.fromkeys(dirs))
+    capacity = host_capacity(cpus=args.cpus, memory_bytes=args.memory)
+    on_status = None if args.quiet else _print_batch_status
+    all_ok = True
+    for res in iter_triad_batch(dirs, capacity, status_interval_s=args.status_interval, on_status=on_status):
+        if "summary" not in res and not res.get("ok"):
+            all_ok = False
+        sys.stdout.write(json.dumps(res, sort_keys=True) + "\n")
+        sys.stdout.flush()
+    return 0 if all_ok else 1
+
+def _container_overhead_cmd(args) -> int:
+    policy = load_policy(Path(args.dir) / "validator.toml" if args.dir else None)
+    cfg = DockerConfig(network=policy.docker_network, cpus=policy.docker_cpus, memory=policy.docker_memory)
+    with tempfile.TemporaryDirectory(prefix="validator-overhead-") as tmp:
+        res = measure_container_overhead(args.image, Path(tmp), cfg, repeat=args.repeat)
+    _print_json(res)
+    return 0 if res["exec"]["per_stage_ms"] else 1
+
+def _cache_cmd(args) -> int:
+    if args.kind == "baselines":
+        return _baseline_cache_cmd(args)
+    if args.kind == "preflight":
+        return _preflight_cache_cmd(args)
+    if args.kind == "phase1":
+        return _phase1_cache_cmd(args)
+
+    if args.cache_cmd == "ls":
+        images = list_cached_images()
+        _print_json({
+            "images": [vars(i) for i in images],
+            "total_bytes": sum(i.size_bytes for i in images),
+        })
+        return 0
+
+    if args.cache_cmd == "prune":
+        removed = prune_images(args.max_entries, args.max_bytes, dry_run=args.dry_run)
+        _print_json({
+            "dry_run": args.dry_run,
+            "removed": [vars(i) for i in removed],
+            "reclaimed_bytes": sum(i.size_bytes for i in removed),
+        })
+        return 0
+
+    return 2
+
+def _baseline_cache_cmd(args) -> int:
+    def _entry(b) -> dict:
+        return {"digest": b.digest, "path": str(b.path), "size_bytes": b.size_bytes, "last_used_at": b.last_used_at}
+
+    if args.cache_cmd == "ls":
+        baselines = list_baselines()
+        _print_json({
+            "baselines": [_entry(b) for b in baselines],
+            "total_bytes": sum(b.size_bytes for b in baselines),
+        })
+        return 0
+
+    if args.cache_cmd == "prune":
+        removed = prune_baselines(args.max_entries, args.max_bytes, dry_run=args.dry_run)
+        _print_json({
+            "dry_run": args.dry_run,
+            "removed": [_entry(b) for b in removed],
+            "reclaimed_bytes": sum(b.size_bytes for b in removed),
+        })
+        return 0
+
+    return 2
+
+def _phase1_cache_cmd(args) -> int:
+    def _entry(e) -> dict:
+        return {"key": e.key, "path": str(e.path), "size_bytes": e.size_bytes, "last_used_at": e.last_used_at}
+
+    if args.cache_cmd == "ls":
+        entries = list_phase1()
+        _print_json({"phase1": [_entry(e) for e in entries], "total_bytes": sum(e.size_bytes for e in entries)})
+        return 0
+
+    if args.cache_cmd == "prune":
+        removed = prune_phase1(args.max_entries, args.max_bytes, dry_run=args.dry_run)
+        _print_json({
+            "dry_run": args.dry_run,
+            "removed": [_entry(e) for e in removed],
+            "reclaimed_bytes": sum(e.size_bytes for e in removed),
+        })
+        return 0
+
+    return 2
+
+def _preflight_cache_cmd(args) -> int:
+    cache = get_preflight_cache()
+    if args.cache_cmd == "ls":
+        _print_json(cache.stats().to_dict())
+        return 0
+
+    if args.cache_cmd == "prune":
+        removed, reclaimed = cache.prune(args.max_entries, args.max_bytes, dry_run=args.dry_run)
+        _print_json({"dry_run": args.dry_run, "removed": removed, "reclaimed_bytes": reclaimed})
+        return 0
+
+    return 2
+
+def _history_cmd(args) -> int:
+    index = get_history()
+    if args.history_cmd == "backfill":
+        counts = backfill(index, Path(args.root).resolve())
+        _print_json({**counts, "total_runs": index.count()})
+        return 0
+
+    filters = {
+        "ok": False if args.failed else (True if args.passed else None),
+        "reason": args.reason,
+        "since": args.since,
+        "until": args.until,
+        "submission_dir": str(Path(args.dir).resolve()) if args.dir else None,
+        "violation": args.violation,
+        "failed_stage": args.failed_stage,
+    }
+    if args.history_cmd == "ls":
+        _print_json({"runs": [r.to_dict() for r in index.query(limit=args.limit, **filters)]})
+        return 0
+
+    if args.history_cmd == "stats":
+        _print_json({"by": args.by, "groups": index.aggregate(args.by, **filters)})
+        return 0
+
+    return 2
+
+def _gc_cmd(args) -> int:
+    if args.root:
+        dirs = find_runs_parents(Path(args.root).resolve())
+    else:
+        # every submission folder the history index has seen
+        dirs = [Path(d) for d in get_history().submission_dirs()]
+    res = collect_garbage(
+        dirs,
+        keep_last=args.keep_last,
+        drop_work=args.drop_work,
+        max_bytes=args.max_bytes,
+        dry_run=args.dry_run,
+    )
+    _print_json({**res.to_dict(), "submission_dirs": len(dirs)})
+    return 0
+
+def _reap_cmd(args) -> int:
+    max_age_s = time.time() - args.older_than if args.older_than is not None else None
+    reaped = reap_orphans(max_age_s=max_age_s, dry_run=args.dry_run)
+    _print_json({"dry_run": args.dry_run, "containers": [r.to_dict() for r in reaped]})
+    return 0 if args.dry_run or all(r.removed for r in reaped) else 1
+
+def _terminate(signum, frame) -> None:
+    # unwind like Ctrl-C so running stages remove their containers
+    raise SystemExit(128 + signum)
+
+def _bench_cmd(args) -> int:
+    if args.bench_cmd == "compare":
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+        res = compare_results(baseline, current, threshold=args.threshold)
+        _print_json(res)
+        return 1 if res["regressions"] else 0
+
+    spec = SynthSpec(files=args.files, file_bytes=args.file_bytes, patch_bytes=args.patch_bytes, seed=args.seed)
+    if args.bench_cmd == "synth":
+        out = make_submission(Path(args.out).resolve(), spec)
+        _print_json({"dir": str(out), "spec": spec.to_dict()})
+        return 0
+
+    res = run_bench(spec, repeat=args.repeat, build_latency_s=args.build_latency, run_latency_s=args.run_latency, backend=args.backend, keep=args.keep)
+    if args.out:
+        Path(args.out).write_text(json.dumps(res, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.compare:
+        res["compare"] = compare_results(json.loads(Path(args.compare).read_text(encoding="utf-8")), res, threshold=args.threshold)
+    _print_json(res)
+    if not res["ok"]:
+        return 1
+    return 1 if args.compare and res["compare"]["regressions"] else 0
+
 def main(argv=None) -> int:
     parser = argparse.ArgumentParser(prog="validator", description="Folder-first validator (triad + preflight + bundles).")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
     p_static = sub.add_parser("static", help="Run preflight/static checks only.")
-    p_static.add_argument("--dir", required=True, help="Folder containing repo.zip + artifacts.")
+    static_target = p_static.add_mutually_exclusive_group(required=True)
+    static_target.add_argument("--dir", help="Folder containing repo.zip + artifacts.")
+    static_target.add_argument("--root", help="Preflight every submission folder under this root; prints NDJSON.")
+    p_static.add_argument("--workers", type=int, default=None, help="Process pool size for --root (default: cpu count).")
 
     p_triad = sub.add_parser("triad", help="Run full triad (test-only then test+solution).")
     p_triad.add_argument("--dir", required=True, help="Folder containing repo.zip + artifacts.")
+    p_triad.add_argument("--format", choices=REPORT_FORMATS, default="full", help="compact: stage logs cut to an excerpt, referenced in stage_logs/; printed unindented.")
+
+    p_batch = sub.add_parser("triad-batch", help="Run many triads at once, admitted against host cores/memory; prints NDJSON.")
+    p_batch.add_argument("--root", action="append", help="Run every submission folder under this root (repeatable).")
+    p_batch.add_argument("--dir", action="append", help="A submission folder (repeatable).")
+    p_batch.add_argument("--cpus", type=int, default=None, help="Cores the batch may use (default: all this process may run on).")
+    p_batch.add_argument("--memory", type=parse_size_bytes, default=None, help="Memory the batch may hand out (default: physical memory), e.g. 32g.")
+    p_batch.add_argument("--status-interval", type=float, default=5.0, help="Seconds between utilization lines on stderr.")
+    p_batch.add_argument("--quiet", action="store_true", help="No utilization lines.")
+
+    p_cache = sub.add_parser("cache", help="Inspect or prune the docker image, baseline repo, preflight and phase 1 caches.")
+    cache_sub = p_cache.add_subparsers(dest="cache_cmd", required=True)
+    p_ls = cache_sub.add_parser("ls", help="List cache entries, least recently used first.")
+    p_ls.add_argument("--kind", choices=["images", "baselines", "preflight", "phase1"], default="images")
+    p_prune = cache_sub.add_parser("prune", help="Evict least recently used entries over the limits.")
+    p_prune.add_argument("--kind", choices=["images", "baselines", "preflight", "phase1"], default="images")
+    p_prune.add_argument("--max-entries", type=int, default=None, help="Keep at most this many entries.")
+    p_prune.add_argument("--max-bytes", type=parse_size_bytes, default=None, help="Keep at most this many bytes (e.g. 50g).")
+    p_prune.add_argument("--dry-run", action="store_true", help="Report what would be removed without removing it.")
+
+    p_overhead = sub.add_parser("container-overhead", help="Measure per-stage container overhead of docker run vs docker exec.")
+    p_overhead.add_argument("--image", required=True, help="Image tag to measure against (e.g. from a previous DOCKER_BUILD).")
+    p_overhead.add_argument("--repeat", type=int, default=5, help="No-op invocations per mode.")
+    p_overhead.add_argument("--dir", default=None, help="Submission folder whose validator.toml supplies the [docker] limits.")
+
+    p_history = sub.add_parser("history", help="Query the index of past triad runs.")
+    history_sub = p_history.add_subparsers(dest="history_cmd", required=True)
+    p_hls = history_sub.add_parser("ls", help="List runs, newest first.")
+    p_hstats = history_sub.add_parser("stats", help="Aggregate runs by reason, day, stage or violation code.")
+    p_hstats.add_argument("--by", choices=AGGREGATES, default="reason")
+    for p in (p_hls, p_hstats):
+        outcome = p.add_mutually_exclusive_group()
+        outcome.add_argument("--failed", action="store_true", help="Only runs that did not pass.")
+        outcome.add_argument("--passed", action="store_true", help="Only runs that passed.")
+        p.add_argument("--reason", default=None, help="Summary reason, e.g. docker_build_failed.")
+        p.add_argument("--since", type=parse_time, default=None, help="ISO date/datetime or age such as 7d, 12h.")
+        p.add_argument("--until", type=parse_time, default=None, help="ISO date/datetime or age such as 1d.")
+        p.add_argument("--dir", default=None, help="Only runs of this submission folder.")
+        p.add_argument("--violation", default=None, help="Only runs with this preflight violation code.")
+        p.add_argument("--failed-stage", default=None, help="Only runs where this stage failed.")
+    p_hls.add_argument("--limit", type=int, default=100)
+    p_backfill = history_sub.add_parser("backfill", help="Import existing .validator_runs/*/report.json files.")
+    p_backfill.add_argument("--root", required=True, help="Folder to scan for .validator_runs directories.")
+
+    p_gc = sub.add_parser("gc", help="Apply retention to .validator_runs folders and the blob store.")
+    p_gc.add_argument("--root", default=None, help="Scan this folder for .validator_runs (default: folders in the job history).")
+    p_gc.add_argument("--keep-last", type=_positive_int, default=None, help="Keep only the newest N finished runs per submission.")
+    p_gc.add_argument("--drop-work", choices=DROP_WORK_MODES, default="success", help="Delete work/ of passed runs (success), of every finished run (all), or never (none).")
+    p_gc.add_argument("--max-bytes", type=parse_size_bytes, default=None, help="Delete oldest runs until the kept runs fit (e.g. 100g); a submission's newest run is always kept.")
+    p_gc.add_argument("--dry-run", action="store_true", help="Report what would be removed without removing it.")
+
+    p_reap = sub.add_parser("reap", help="Remove validator containers left behind by crashed runs.")
+    p_reap.add_argument("--older-than", type=parse_time, default=None, help="Also remove containers of live or remote owners created before this (e.g. 6h or an ISO date).")
+    p_reap.add_argument("--dry-run", action="store_true", help="List orphaned containers without removing them.")
+
+    p_bundle = sub.add_parser("bundle", help="Work with run bundles.")
+    bundle_sub = p_bundle.add_subparsers(dest="bundle_cmd", required=True)
+    p_export = bundle_sub.add_parser("export", help="Write a self-contained copy of a run's bundle.zip (inputs from the blob store included).")
+    p_export.add_argument("--run", required=True, help="Run folder: <dir>/.validator_runs/<job_id>.")
+    p_export.add_argument("--out", required=True, help="Output zip path.")
+
+    p_bench = sub.add_parser("bench", help="Time preflight, extraction, git baseline, patching and report writing on synthetic submissions.")
+    bench_sub = p_bench.add_subparsers(dest="bench_cmd", required=True)
+    p_brun = bench_sub.add_parser("run", help="Run the triad repeatedly against a fake docker backend and print JSON timings.")
+    p_bsynth = bench_sub.add_parser("synth", help="Only generate a synthetic submission folder.")
+    for p in (p_brun, p_bsynth):
+        p.add_argument("--files", type=int, default=200, help="Modules in the synthetic repo.zip.")
+        p.add_argument("--file-bytes", type=parse_size_bytes, default=4096, help="Approximate size of each module (e.g. 4k).")
+        p.add_argument("--patch-bytes", type=parse_size_bytes, default=16384, help="Approximate size of test.patch (e.g. 16k).")
+        p.add_argument("--seed", type=int, default=0)
+    p_bsynth.add_argument("--out", required=True, help="Folder to write the submission to.")
+    p_brun.add_argument("--repeat", type=int, default=5)
+    p_brun.add_argument("--build-latency", type=float, default=0.5, help="Simulated docker build seconds.")
+    p_brun.add_argument("--run-latency", type=float, default=0.1, help="Simulated container start seconds.")
+    p_brun.add_argument("--backend", choices=["cli", "engine"], default="cli", help="Fake docker CLI (cli) or stub Engine API socket (engine).")
+    p_brun.add_argument("--out", default=None, help="Also write the JSON result to this file.")
+    p_brun.add_argument("--compare", default=None, help="Previous result JSON; exit 1 if a hot path regressed.")
+    p_brun.add_argument("--keep", action="store_true", help="Keep the temp folder with the submission, runs and state.")
+    p_bcompare = bench_sub.add_parser("compare", help="Compare two result files; exit 1 if a hot path regressed.")
+    p_bcompare.add_argument("baseline")
+    p_bcompare.add_argument("current")
+    for p in (p_brun, p_bcompare):
+        p.add_argument("--threshold", type=float, default=0.10, help="Relative median increase that counts as a regression.")
 
     args = parser.parse_args(argv)
+    signal.signal(signal.SIGTERM, _terminate)
+
+    if args.cmd == "cache":
+        return _cache_cmd(args)
+
+    if args.cmd == "history":
+        return _history_cmd(args)
+
+    if args.cmd == "gc":
+        return _gc_cmd(args)
+
+    if args.cmd == "bench":
+        return _bench_cmd(args)
+
+    if args.cmd == "reap":
+        return _reap_cmd(args)
+
+    if args.cmd == "triad-batch":
+        if not args.root and not args.dir:
+            parser.error("triad-batch needs --root or --dir")
+        return _triad_batch_cmd(args)
+
+    if args.cmd == "bundle":
+        manifest = export_bundle(Path(args.run).resolve(), Path(args.out).resolve())
+        _print_json({"out": str(Path(args.out).resolve()), **manifest})
+        return 0
+
+    if args.cmd == "container-overhead":
+        return _container_overhead_cmd(args)
+
+    if args.cmd == "static" and args.root:
+        return _static_root_cmd(str(Path(args.root).resolve()), args.workers)
 
     dir_path = str(Path(args.dir).resolve())
 
@@ -28,8 +371,12 @@ def main(argv=None) -> int:
         return 0 if res.get("ok") else 1
 
     if args.cmd == "triad":
-        res = run_triad_from_dir(dir_path)
-        _print_json(res)
+        res = run_triad_from_dir(dir_path, report_format=args.format)
+        if args.format == "compact":
+            sys.stdout.writelines(iter_report_json(res))
+            sys.stdout.write("\n")
+        else:
+            _print_json(res)
         return 0 if res.get("ok") else 1
 
     return 2
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from validator.checks.policy import parse_size_bytes
+from validator.core.sandbox import safe_rmtree
+from validator.core.state import LruIndex, state_dir
+from validator.core.subprocess import CmdResult, run_cmd
+
+# committed baselines are kept as bare repos keyed by the repo.zip sha256; a job gets its
+# working copy with `git clone --local`, which hardlinks the objects instead of re-extracting
+# and re-hashing the tree
+
+_ROOT_FILE = "validator-root"
+_DEFAULT_MAX_BYTES = "20g"
+
+@dataclass(frozen=True)
+class CachedBaseline:
+    digest: str
+    path: Path
+    size_bytes: int
+    last_used_at: float
+
+def _baselines_dir() -> Path:
+    return state_dir("baselines")
+
+def _index() -> LruIndex:
+    return LruIndex("baseline")
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def default_max_bytes() -> int:
+    return parse_size_bytes(os.environ.get("VALIDATOR_BASELINE_CACHE_MAX_BYTES", _DEFAULT_MAX_BYTES))
+
+def lookup_baseline(digest: str) -> Optional[tuple[Path, str]]:
+    # returns (bare repo, repo root relative to the extracted zip) or None
+    bare = _baselines_dir() / f"{digest}.git"
+    root_file = bare / _ROOT_FILE
+    if not root_file.exists():
+        return None
+    _index().touch(digest)
+    return bare, root_file.read_text(encoding="utf-8").strip() or "."
+
+def clone_baseline(bare: Path, dest: Path, max_log_bytes: int, log_prefix: Optional[Path] = None) -> CmdResult:
+    cmd = ["git", "clone", "--local", "--quiet", str(bare), str(dest)]
+    return run_cmd(cmd, cwd=None, timeout_s=600, max_log_bytes=max_log_bytes, log_prefix=log_prefix)
+
+def is_cacheable(repo_root: Path, max_log_bytes: int) -> bool:
+    # a clone only carries committed content; anything else the extracted tree holds
+    # (ignored files, changes in a zip that shipped its own .git) would be lost on a hit
+    r = run_cmd(["git", "status", "--porcelain", "--ignored"], cwd=str(repo_root), timeout_s=120, max_log_bytes=max_log_bytes)
+    return r.ok and r.stdout_tail.strip() == ""
+
+def publish_baseline(digest: str, repo_root: Path, rel_root: str, max_log_bytes: int) -> bool:
+    base = _baselines_dir()
+    final = base / f"{digest}.git"
+    if final.exists():
+        return True
+
+    staging = Path(tempfile.mkdtemp(prefix=f".{digest[:12]}-", dir=base))
+    try:
+        bare = staging / "repo.git"
+        r = run_cmd(["git", "clone", "--bare", "--local", "--quiet", str(repo_root), str(bare)], cwd=None, timeout_s=600, max_log_bytes=max_log_bytes)
+        if not r.ok:
+            return False
+        (bare / _ROOT_FILE).write_text(rel_root + "\n", encoding="utf-8")
+        try:
+            os.rename(bare, final)
+        except OSError:
+            # another job published the same digest first
+            return final.exists()
+    finally:
+        safe_rmtree(staging)
+
+    _index().touch(digest, _dir_size(final))
+    prune_baselines(max_entries=None, max_bytes=default_max_bytes())
+    return True
+
+def list_baselines() -> list[CachedBaseline]:
+    index = _index()
+    base = _baselines_dir()
+    present = {p.name[:-4] for p in base.glob("*.git") if (p / _ROOT_FILE).exists()}
+    known = {e.key for e in index.entries()}
+    for digest in known - present:
+        index.remove(digest)
+    for digest in present - known:
+        index.touch(digest, _dir_size(base / f"{digest}.git"), when=0.0)
+    return [
+        CachedBaseline(digest=e.key, path=base / f"{e.key}.git", size_bytes=e.size_bytes, last_used_at=e.last_used_at)
+        for e in index.entries()
+    ]
+
+def prune_baselines(max_entries: Optional[int], max_bytes: Optional[int], dry_run: bool = False) -> list[CachedBaseline]:
+    list_baselines()
+    index = _index()
+    base = _baselines_dir()
+    removed: list[CachedBaseline] = []
+    for e in index.select_evictions(max_entries, max_bytes):
+        path = base / f"{e.key}.git"
+        if not dry_run:
+            # clones made from it hardlinked their objects, so they stay intact
+            safe_rmtree(path)
+            index.remove(e.key)
+        removed.append(CachedBaseline(digest=e.key, path=path, size_bytes=e.size_bytes, last_used_at=e.last_used_at))
+    return removed
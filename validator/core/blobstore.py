@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import os
+import shutil
+import stat
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from validator.core.hashing import cached_file_sha256
+from validator.core.state import state_dir
+
+# content-addressed, read-only copies of large inputs: blobs/<sha[:2]>/<sha>. Sources are
+# copied (never hardlinked) so that rewriting a submission file in place can't corrupt a
+# blob; consumers hardlink blobs into their run folders, so st_nlink == 1 means unused.
+
+@dataclass(frozen=True)
+class BlobRef:
+    digest: str
+    size_bytes: int
+    path: Path
+
+def blobs_dir() -> Path:
+    return state_dir("blobs")
+
+def blob_path(digest: str) -> Path:
+    return blobs_dir() / digest[:2] / digest
+
+def put_file(src: Path, digest: Optional[str] = None) -> BlobRef:
+    digest = digest or cached_file_sha256(src)
+    dest = blob_path(digest)
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{digest[:12]}-", dir=dest.parent)
+        try:
+            with os.fdopen(fd, "wb") as out, open(src, "rb") as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp, dest)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+    return BlobRef(digest=digest, size_bytes=dest.stat().st_size, path=dest)
+
+def link_blob(ref: BlobRef, dest: Path) -> bool:
+    # hardlink a blob into a run folder; False when the store is on another filesystem
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(ref.path, dest)
+    except FileExistsError:
+        return dest.stat().st_ino == ref.path.stat().st_ino
+    except OSError:
+        return False
+    return True
+
+def sweep_blobs(grace_s: float = 3600, dry_run: bool = False) -> list[BlobRef]:
+    # a blob nobody links to any more can go; the grace period covers a job that has
+    # put_file()d a blob but not linked it yet
+    removed: list[BlobRef] = []
+    cutoff = time.time() - grace_s
+    for sub in sorted(blobs_dir().iterdir()):
+        if not sub.is_dir():
+            continue
+        for p in sorted(sub.iterdir()):
+            if p.name.startswith("."):
+                continue
+            st = p.stat()
+            if st.st_nlink > 1 or st.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                p.unlink()
+            removed.append(BlobRef(digest=p.name, size_bytes=st.st_size, path=p))
+    return removed
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import json
+import os
+import posixpath
+import re
+import shlex
+import stat
+import tarfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from validator.core.hashing import cached_file_sha256
+
+# Build context sent with `docker build`. In "minimal" mode only the paths Dockerfile.problem
+# COPY/ADDs (or bind-mounts into a RUN) from the context are included, minus .dockerignore
+# patterns and .git (the whole checkout minus those when the paths cannot be told); "full"
+# sends the whole checkout minus .dockerignore, like the CLI did.
+# Either way the context is filtered here and streamed to the daemon as an uncompressed tar,
+# so both backends see the same bytes.
+
+_READ_CHUNK = 1024 * 1024
+_ZERO_BLOCKS = b"\0" * (2 * tarfile.BLOCKSIZE)
+_HEREDOC = re.compile(r"(?:^|\s)<<-?[\"']?(\w+)[\"']?")
+_URL = re.compile(r"^(?:https?://|git@|git://)")
+
+# --- Dockerfile sources
+
+def _instructions(text: str) -> Iterator[tuple[str, str]]:
+    # (KEYWORD, rest) with continuation lines joined, comments and heredoc bodies dropped
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+        if not line or line.startswith("#"):
+            continue
+        while line.endswith("\\") and i < len(lines):
+            nxt = lines[i].strip()
+            i += 1
+            if not nxt.startswith("#"):
+                line = line[:-1] + " " + nxt
+        keyword, _, rest = line.partition(" ")
+        for end in _HEREDOC.findall(rest) if keyword.upper() in ("RUN", "COPY", "ADD") else ():
+            close = next((j for j in range(i, len(lines)) if lines[j].strip() == end), None)
+            if close is not None:
+                i = close + 1
+        yield keyword.upper(), rest.strip()
+
+def _args(rest: str) -> Optional[list[str]]:
+    if rest.startswith("["):
+        try:
+            value = json.loads(rest)
+            return [str(v) for v in value] if isinstance(value, list) else None
+        except ValueError:
+            return None
+    try:
+        return shlex.split(rest, posix=True)
+    except ValueError:
+        return None
+
+def _bind_sources(rest: str) -> list[str]:
+    # RUN --mount=type=bind,source=x reads x from the context (default: all of it)
+    sources = []
+    for m in re.finditer(r"--mount=(\S+)", rest):
+        opts = dict(o.partition("=")[::2] for o in m.group(1).split(","))
+        if opts.get("type", "bind") == "bind" and "from" not in opts:
+            sources.append(opts.get("source") or opts.get("src") or ".")
+    return sources
+
+def dockerfile_sources(text: str) -> Optional[list[str]]:
+    # context paths (possibly with wildcards) the Dockerfile reads; None when that is the
+    # whole context or cannot be told statically (variables, unparsable instructions)
+    sources: list[str] = []
+    for keyword, rest in _instructions(text):
+        if keyword == "RUN":
+            sources.extend(_bind_sources(rest))
+            continue
+        if keyword not in ("COPY", "ADD"):
+            continue
+        args = _args(rest)
+        if args is None:
+            return None
+        flags = [a for a in args if a.startswith("--")]
+        paths = [a for a in args if not a.startswith("--")]
+        if any(f.startswith("--from") for f in flags) or len(paths) < 2:
+            continue
+        for src in paths[:-1]:
+            if src.startswith("<<") or (keyword == "ADD" and _URL.match(src)):
+                continue
+            sources.append(src)
+    normalized = []
+    for src in sources:
+        if "$" in src:
+            return None
+        src = posixpath.normpath(src.lstrip("/"))
+        if src in (".", ""):
+            return None
+        if not src.startswith(".."):
+            normalized.append(src)
+    return sorted(set(normalized))
+
+# --- .dockerignore
+
+def _glob_regex(pattern: str) -> re.Pattern:
+    # Go filepath.Match plus "**" (any number of directories), as the docker CLI matches
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and "]" in pattern[i + 1:]:
+            j = pattern.index("]", i + 1)
+            out.append("[" + pattern[i + 1:j].replace("\\", "\\\\") + "]")
+            i = j + 1
+            continue
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out) + r"\Z")
+
+def read_dockerignore(path: Path) -> list[str]:
+    try:
+        text = path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return []
+    patterns = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        neg = line.startswith("!")
+        pat = posixpath.normpath(line.lstrip("!").strip().lstrip("/"))
+        if pat != ".":
+            patterns.append(("!" if neg else "") + pat)
+    return patterns
+
+class _Ignore:
+    def __init__(self, patterns: list[str]):
+        self.rules = [(p.startswith("!"), _glob_regex(p.lstrip("!"))) for p in patterns]
+        self.has_exceptions = any(neg for neg, _ in self.rules)
+
+    def excluded(self, rel: str) -> bool:
+        # last matching pattern wins; a pattern matching a parent directory matches too
+        prefixes = [rel[:i] for i, ch in enumerate(rel) if ch == "/"] + [rel]
+        hit = False
+        for neg, rx in self.rules:
+            if any(rx.match(p) for p in prefixes):
+                hit = not neg
+        return hit
+
+# --- selection and tar stream
+
+class _Selector:
+    def __init__(self, sources: Optional[list[str]]):
+        self.sources = None if sources is None else [tuple(s.split("/")) for s in sources]
+
+    def _matches(self, parts: tuple[str, ...], src: tuple[str, ...]) -> bool:
+        return all(fnmatchcase(p, s) for p, s in zip(parts, src))
+
+    def selected(self, parts: tuple[str, ...]) -> bool:
+        return self.sources is None or any(len(parts) >= len(s) and self._matches(parts, s) for s in self.sources)
+
+    def on_path(self, parts: tuple[str, ...]) -> bool:
+        # a directory that may hold a selected path further down
+        return self.selected(parts) or any(len(parts) < len(s) and self._matches(parts, s) for s in self.sources)
+
+def _tar_entry(info: tarfile.TarInfo, data: Optional[Path] = None, payload: bytes = b"") -> Iterator[bytes]:
+    yield info.tobuf(tarfile.PAX_FORMAT)
+    if data is not None:
+        # exactly info.size bytes, even if the file changed since it was stat'ed
+        remaining = info.size
+        with open(data, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(_READ_CHUNK, remaining))
+                if not chunk:
+                    yield b"\0" * remaining
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    elif payload:
+        yield payload
+    pad = -info.size % tarfile.BLOCKSIZE
+    if pad:
+        yield b"\0" * pad
+
+def _tar_info(path: Path, arcname: str) -> Optional[tarfile.TarInfo]:
+    st = path.lstat()
+    info = tarfile.TarInfo(arcname)
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.mtime = int(st.st_mtime)
+    if stat.S_ISREG(st.st_mode):
+        info.type = tarfile.REGTYPE
+        info.size = st.st_size
+    elif stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+    elif stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(path)
+    else:
+        # sockets, fifos, devices: the CLI skips them too
+        return None
+    return info
+
+def iter_context_tar(members: Iterable[tuple[Path, str]], extra: Optional[dict[str, bytes]] = None) -> Iterator[bytes]:
+    # uncompressed tar, produced lazily so it is streamed with chunked encoding (or through
+    # a pipe) instead of being staged in memory or on disk
+    for name, payload in (extra or {}).items():
+        info = tarfile.TarInfo(name)
+        info.size = len(payload)
+        info.mode = 0o644
+        info.mtime = int(time.time())
+        yield from _tar_entry(info, payload=payload)
+    for path, arcname in members:
+        info = _tar_info(path, arcname)
+        if info is None:
+            continue
+        yield from _tar_entry(info, data=path if info.type == tarfile.REGTYPE else None)
+    yield _ZERO_BLOCKS
+
+@dataclass
+class ContextStats:
+    files: int = 0
+    bytes: int = 0
+    upload_ms: Optional[int] = None
+
+@dataclass(frozen=True)
+class BuildContext:
+    root: Path
+    dockerfile: Path
+    mode: str
+    sources: Optional[tuple[str, ...]]  # None: the whole tree
+    ignore: tuple[str, ...]
+    dockerignore: str  # "repo" (root .dockerignore honoured) or "generated"
+    # Dockerfile.problem lives outside the context: it is shipped under a random name and
+    # dropped from the context by the generated .dockerignore, as the CLI does
+    dockerfile_name: str = field(default_factory=lambda: f".validator-dockerfile-{uuid.uuid4().hex[:12]}")
+    stats: ContextStats = field(default_factory=ContextStats)
+
+    def members(self) -> Iterator[tuple[Path, str]]:
+        select = _Selector(None if self.sources is None else list(self.sources))
+        ignore = _Ignore(list(self.ignore))
+        for root, dirs, files in os.walk(self.root):
+            dirs.sort()
+            rel_root = Path(root).relative_to(self.root)
+            keep = []
+            for name in dirs:
+                rel = (rel_root / name).as_posix()
+                parts = tuple(rel.split("/"))
+                if not select.on_path(parts):
+                    continue
+                if ignore.excluded(rel):
+                    if ignore.has_exceptions:
+                        keep.append(name)
+                    continue
+                keep.append(name)
+                yield Path(root) / name, rel
+            dirs[:] = keep
+            for name in sorted(files):
+                rel = (rel_root / name).as_posix()
+                if rel == ".dockerignore":
+                    continue  # replaced by the generated one
+                if select.selected(tuple(rel.split("/"))) and not ignore.excluded(rel):
+                    self.stats.files += 1
+                    yield Path(root) / name, rel
+
+    def stream(self) -> Iterator[bytes]:
+        # upload_ms is set once the consumer has taken the last chunk
+        start = time.monotonic()
+        extra = {
+            self.dockerfile_name: self.dockerfile.read_bytes(),
+            ".dockerignore": f"{self.dockerfile_name}\n.dockerignore\n".encode("utf-8"),
+        }
+        for chunk in iter_context_tar(self.members(), extra):
+            self.stats.bytes += len(chunk)
+            yield chunk
+        self.stats.upload_ms = int((time.monotonic() - start) * 1000)
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "sources": None if self.sources is None else list(self.sources),
+            "dockerignore": self.dockerignore,
+            "files": self.stats.files,
+            "bytes": self.stats.bytes,
+            "upload_ms": self.stats.upload_ms,
+        }
+
+def plan_build_context(dockerfile: Path, context_dir: Path, mode: str = "minimal") -> BuildContext:
+    ignore = read_dockerignore(context_dir / ".dockerignore")
+    origin = "repo" if (context_dir / ".dockerignore").exists() else "generated"
+    sources = None
+    if mode == "minimal":
+        found = dockerfile_sources(dockerfile.read_text(encoding="utf-8", errors="replace"))
+        sources = None if found is None else tuple(found)
+        if not any(s.split("/")[0] == ".git" for s in sources or ()):
+            # .git is what _ensure_git just wrote; only a Dockerfile that COPYs it by name
+            # gets it ("full" mode for anything else that needs it)
+            ignore = [".git", *ignore]
+    return BuildContext(root=context_dir, dockerfile=dockerfile, mode=mode, sources=sources, ignore=tuple(ignore), dockerignore=origin)
+
+def layer_cache_dir(cache_root: str, dockerfile: Path) -> str:
+    # one BuildKit cache per Dockerfile, so jobs of the same problem reuse the dependency
+    # install layers without overwriting each other's cache index
+    if not cache_root:
+        return ""
+    return str(Path(cache_root).expanduser() / cached_file_sha256(dockerfile)[:16])
@@ -1,37 +1,422 @@
 from __future__ import annotations
 
+import atexit
+import os
+import re
+import shlex
+import socket
+import statistics
+import threading
+import time
+import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional, Protocol
 
+from validator.core.build_context import BuildContext
+from validator.core.state import instance_id
 from validator.core.subprocess import run_cmd, CmdResult
 
+CACHE_LABEL = "validator.cache"
+DIGEST_LABEL = "validator.digest"
+
+# every container the validator creates carries these, so a later process can tell which
+# job and which process (host:pid, and an instance id in case the pid is reused) it
+# belonged to
+MANAGED_LABEL = "validator.managed"
+JOB_LABEL = "validator.job"
+OWNER_LABEL = "validator.owner"
+INSTANCE_LABEL = "validator.instance"
+CREATED_LABEL = "validator.created"
+
+_CONTAINER_LABEL_KEYS = [JOB_LABEL, OWNER_LABEL, CREATED_LABEL, INSTANCE_LABEL]
+_UNSAFE_NAME = re.compile(r"[^a-zA-Z0-9_.-]+")
+
+BACKENDS = ("auto", "cli", "engine")
+
+def docker_cli() -> list[str]:
+    # VALIDATOR_DOCKER swaps the docker CLI, e.g. for the fake backend of `validator bench`
+    return shlex.split(os.environ.get("VALIDATOR_DOCKER") or "docker")
+
 @dataclass(frozen=True)
 class DockerConfig:
     network: str
     cpus: float
     memory: str
+    # --cpuset-cpus, e.g. "0-3"; set by the triad-batch scheduler
+    cpuset: str = ""
 
-def docker_build(tag: str, dockerfile: Path, context_dir: Path, timeout_s: int, max_log_bytes: int) -> CmdResult:
-    cmd = [
-        "docker", "build",
-        "-f", str(dockerfile),
-        "-t", tag,
-        str(context_dir),
-    ]
-    return run_cmd(cmd, cwd=str(context_dir), timeout_s=timeout_s, max_log_bytes=max_log_bytes)
-
-def docker_run(tag: str, repo_dir: Path, command: list[str], timeout_s: int, max_log_bytes: int, cfg: DockerConfig) -> CmdResult:
-    cmd = [
-        "docker", "run", "--rm",
+def _limit_args(cfg: DockerConfig) -> list[str]:
+    argv = [
         "--network", cfg.network,
         "--cpus", str(cfg.cpus),
         "--memory", cfg.memory,
-        "-v", f"{str(repo_dir)}:/app",
+    ]
+    if cfg.cpuset:
+        argv += ["--cpuset-cpus", cfg.cpuset]
+    return argv
+
+def _label_args(labels: Optional[dict[str, str]]) -> list[str]:
+    argv: list[str] = []
+    for k, v in sorted((labels or {}).items()):
+        argv += ["--label", f"{k}={v}"]
+    return argv
+
+# docker CLI argument lists (without the binary), built from the same arguments the backends
+# take: CliBackend runs them, EngineBackend reports them as CmdResult.cmd
+
+def build_args(tag: str, context: BuildContext, labels: Optional[dict[str, str]], cache_dir: str = "") -> list[str]:
+    # -f names the Dockerfile inside the context tar, which goes in on stdin ("-")
+    argv = ["build"]
+    if cache_dir:
+        argv = [
+            "buildx", "build", "--load",
+            "--cache-from", f"type=local,src={cache_dir}",
+            "--cache-to", f"type=local,dest={cache_dir},mode=max",
+        ]
+    return [*argv, "-f", context.dockerfile_name, "-t", tag, *_label_args(labels), "-"]
+
+def run_args(tag: str, repo_dir: Path, command: list[str], cfg: DockerConfig, name: Optional[str], labels: Optional[dict[str, str]]) -> list[str]:
+    argv = ["run", "--rm"]
+    if name:
+        argv += ["--name", name]
+    return [*argv, *_label_args(labels), *_limit_args(cfg), "-v", f"{repo_dir}:/app", "-w", "/app", tag, *command]
+
+def start_args(tag: str, name: str, repo_dir: Path, cfg: DockerConfig, labels: Optional[dict[str, str]]) -> list[str]:
+    # same limits and bind mount as run_args, but kept alive for exec
+    return [
+        "run", "-d",
+        "--name", name,
+        *_label_args(labels),
+        *_limit_args(cfg),
+        "-v", f"{repo_dir}:/app",
         "-w", "/app",
-        tag,
-    ] + command
-    return run_cmd(cmd, cwd=str(repo_dir), timeout_s=timeout_s, max_log_bytes=max_log_bytes)
+        "--entrypoint", "sleep",
+        tag, "infinity",
+    ]
+
+def exec_args(name: str, command: list[str]) -> list[str]:
+    return ["exec", "-w", "/app", name, *command]
+
+def rm_args(name: str) -> list[str]:
+    return ["rm", "-f", name]
+
+def inspect_size_args(tag: str) -> list[str]:
+    return ["image", "inspect", "--format", "{{.Size}}", tag]
+
+def rmi_args(tag: str) -> list[str]:
+    return ["rmi", tag]
+
+def images_args(label: str) -> list[str]:
+    return ["images", "--filter", f"label={label}", "--format", "{{.Repository}}:{{.Tag}}"]
+
+def ps_args(label: str, keys: list[str]) -> list[str]:
+    fmt = "\t".join(["{{.Names}}", *(f'{{{{.Label "{k}"}}}}' for k in keys)])
+    return ["ps", "-a", "--filter", f"label={label}", "--format", fmt]
+
+class DockerBackend(Protocol):
+    name: str
+
+    def build(self, tag: str, context: BuildContext, timeout_s: int, max_log_bytes: int, labels: Optional[dict[str, str]], log_prefix: Optional[Path], cancel: Optional[threading.Event]) -> CmdResult: ...
+    def run(self, tag: str, repo_dir: Path, command: list[str], timeout_s: int, max_log_bytes: int, cfg: DockerConfig, log_prefix: Optional[Path], name: Optional[str], labels: Optional[dict[str, str]], cancel: Optional[threading.Event]) -> CmdResult: ...
+    def start(self, tag: str, name: str, repo_dir: Path, cfg: DockerConfig, max_log_bytes: int, log_prefix: Optional[Path], labels: Optional[dict[str, str]]) -> CmdResult: ...
+    def exec(self, name: str, command: list[str], timeout_s: int, max_log_bytes: int, log_prefix: Optional[Path], cancel: Optional[threading.Event]) -> CmdResult: ...
+    def rm(self, name: str, max_log_bytes: int) -> CmdResult: ...
+    def image_inspect_size(self, tag: str, max_log_bytes: int) -> CmdResult: ...
+    def rmi(self, tag: str, max_log_bytes: int) -> CmdResult: ...
+    def list_images(self, label: str, max_log_bytes: int) -> CmdResult: ...
+    def list_containers(self, label: str, keys: list[str], max_log_bytes: int) -> CmdResult: ...
+
+def _docker(argv: list[str], cwd: Optional[str], timeout_s: int, max_log_bytes: int, log_prefix: Optional[Path] = None, cancel: Optional[threading.Event] = None, stdin: Optional[Iterable[bytes]] = None) -> CmdResult:
+    return run_cmd([*docker_cli(), *argv], cwd=cwd, timeout_s=timeout_s, max_log_bytes=max_log_bytes, log_prefix=log_prefix, cancel=cancel, stdin=stdin)
+
+class CliBackend:
+    # one docker CLI process per operation
+    name = "cli"
+
+    def build(self, tag: str, context: BuildContext, timeout_s: int, max_log_bytes: int, labels: Optional[dict[str, str]], log_prefix: Optional[Path], cancel: Optional[threading.Event], cache_dir: str = "") -> CmdResult:
+        # cache_dir (buildx only, so CLI only): BuildKit layer cache on local disk
+        argv = build_args(tag, context, labels, cache_dir)
+        return _docker(argv, None, timeout_s, max_log_bytes, log_prefix=log_prefix, cancel=cancel, stdin=context.stream())
+
+    def run(self, tag: str, repo_dir: Path, command: list[str], timeout_s: int, max_log_bytes: int, cfg: DockerConfig, log_prefix: Optional[Path], name: Optional[str], labels: Optional[dict[str, str]], cancel: Optional[threading.Event]) -> CmdResult:
+        argv = run_args(tag, repo_dir, command, cfg, name, labels)
+        return _docker(argv, str(repo_dir), timeout_s, max_log_bytes, log_prefix=log_prefix, cancel=cancel)
+
+    def start(self, tag: str, name: str, repo_dir: Path, cfg: DockerConfig, max_log_bytes: int, log_prefix: Optional[Path], labels: Optional[dict[str, str]]) -> CmdResult:
+        argv = start_args(tag, name, repo_dir, cfg, labels)
+        return _docker(argv, str(repo_dir), 120, max_log_bytes, log_prefix=log_prefix)
+
+    def exec(self, name: str, command: list[str], timeout_s: int, max_log_bytes: int, log_prefix: Optional[Path], cancel: Optional[threading.Event]) -> CmdResult:
+        return _docker(exec_args(name, command), None, timeout_s, max_log_bytes, log_prefix=log_prefix, cancel=cancel)
+
+    def rm(self, name: str, max_log_bytes: int) -> CmdResult:
+        return _docker(rm_args(name), None, 120, max_log_bytes)
+
+    def image_inspect_size(self, tag: str, max_log_bytes: int) -> CmdResult:
+        return _docker(inspect_size_args(tag), None, 60, max_log_bytes)
+
+    def rmi(self, tag: str, max_log_bytes: int) -> CmdResult:
+        return _docker(rmi_args(tag), None, 120, max_log_bytes)
+
+    def list_images(self, label: str, max_log_bytes: int) -> CmdResult:
+        return _docker(images_args(label), None, 60, max_log_bytes)
+
+    def list_containers(self, label: str, keys: list[str], max_log_bytes: int) -> CmdResult:
+        return _docker(ps_args(label, keys), None, 60, max_log_bytes)
+
+_CLI = CliBackend()
+_backend_lock = threading.Lock()
+_backend: Optional[tuple[tuple, DockerBackend]] = None
+
+def _select_backend(choice: str, socket_path: Optional[str]) -> DockerBackend:
+    from validator.core.engine import DEFAULT_SOCKET, EngineBackend, EngineClient
+
+    if choice not in BACKENDS:
+        raise ValueError(f"VALIDATOR_DOCKER_BACKEND must be one of {', '.join(BACKENDS)}, got {choice!r}")
+    if choice == "cli":
+        return _CLI
+    if choice == "engine":
+        return EngineBackend(socket_path or DEFAULT_SOCKET)
+    # auto: an explicit VALIDATOR_DOCKER or a non-unix DOCKER_HOST means the CLI
+    if os.environ.get("VALIDATOR_DOCKER") or socket_path is None or not Path(socket_path).exists():
+        return _CLI
+    return EngineBackend(socket_path) if EngineClient(socket_path).ping() else _CLI
+
+def get_backend() -> DockerBackend:
+    # VALIDATOR_DOCKER_BACKEND = auto (default) | cli | engine; auto uses the Engine API
+    # when the daemon socket answers /_ping and falls back to the CLI otherwise
+    from validator.core.engine import engine_socket_path
+
+    global _backend
+    choice = (os.environ.get("VALIDATOR_DOCKER_BACKEND") or "auto").strip().lower()
+    socket_path = engine_socket_path()
+    key = (choice, os.environ.get("VALIDATOR_DOCKER") or "", socket_path, os.getpid())
+    with _backend_lock:
+        if _backend is None or _backend[0] != key:
+            _backend = (key, _select_backend(choice, socket_path))
+        return _backend[1]
+
+def docker_build(tag: str, context: BuildContext, timeout_s: int, max_log_bytes: int, labels: Optional[dict[str, str]] = None, log_prefix: Optional[Path] = None, cancel: Optional[threading.Event] = None, cache_dir: str = "") -> CmdResult:
+    if cache_dir:
+        # exporting a BuildKit layer cache needs buildx, which the Engine API /build
+        # endpoint cannot drive
+        return _CLI.build(tag, context, timeout_s, max_log_bytes, labels, log_prefix, cancel, cache_dir=cache_dir)
+    return get_backend().build(tag, context, timeout_s, max_log_bytes, labels, log_prefix, cancel)
+
+def owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def container_labels(job_id: str) -> dict[str, str]:
+    return {
+        MANAGED_LABEL: "1",
+        JOB_LABEL: job_id,
+        OWNER_LABEL: owner_id(),
+        INSTANCE_LABEL: instance_id(),
+        CREATED_LABEL: str(int(time.time())),
+    }
+
+def container_name(*parts: str) -> str:
+    # docker names are [a-zA-Z0-9][a-zA-Z0-9_.-]*
+    return "-".join(_UNSAFE_NAME.sub("_", p).strip("_.-").lower() for p in parts if p)
+
+# containers this process started and has not removed yet; whatever is left when the
+# process exits (interrupt, SIGTERM, API shutdown) is force-removed
+_live_lock = threading.Lock()
+_live: set[str] = set()
+
+def _track(name: str) -> None:
+    with _live_lock:
+        _live.add(name)
+
+def _untrack(name: str) -> None:
+    with _live_lock:
+        _live.discard(name)
+
+def remove_live_containers() -> list[str]:
+    with _live_lock:
+        names = sorted(_live)
+    removed = []
+    for name in names:
+        try:
+            if docker_rm(name).ok:
+                removed.append(name)
+        except Exception:
+            pass
+    return removed
+
+atexit.register(remove_live_containers)
+
+def docker_run(tag: str, repo_dir: Path, command: list[str], timeout_s: int, max_log_bytes: int, cfg: DockerConfig, log_prefix: Optional[Path] = None, name: Optional[str] = None, labels: Optional[dict[str, str]] = None, cancel: Optional[threading.Event] = None) -> CmdResult:
+    if not name:
+        return get_backend().run(tag, repo_dir, command, timeout_s, max_log_bytes, cfg, log_prefix, name, labels, cancel)
+    _track(name)
+    r = get_backend().run(tag, repo_dir, command, timeout_s, max_log_bytes, cfg, log_prefix, name, labels, cancel)
+    if r.exit_code not in (124, 130):
+        # --rm removed it; a killed client may have left it running
+        _untrack(name)
+    return r
+
+def docker_start(tag: str, name: str, repo_dir: Path, cfg: DockerConfig, max_log_bytes: int, log_prefix: Optional[Path] = None, labels: Optional[dict[str, str]] = None) -> CmdResult:
+    # same limits and bind mount as docker_run, but kept alive for docker_exec
+    _track(name)
+    return get_backend().start(tag, name, repo_dir, cfg, max_log_bytes, log_prefix, labels)
+
+def docker_exec(name: str, command: list[str], timeout_s: int, max_log_bytes: int, log_prefix: Optional[Path] = None, cancel: Optional[threading.Event] = None) -> CmdResult:
+    return get_backend().exec(name, command, timeout_s, max_log_bytes, log_prefix, cancel)
+
+def docker_rm(name: str, max_log_bytes: int = 4096) -> CmdResult:
+    r = get_backend().rm(name, max_log_bytes)
+    if r.ok:
+        _untrack(name)
+    return r
+
+def docker_list_containers(label: str = MANAGED_LABEL, max_log_bytes: int = 2_000_000) -> list[dict[str, str]]:
+    # all containers (running or not) carrying `label`, as {"name": ..., <label>: value}
+    r = get_backend().list_containers(label, _CONTAINER_LABEL_KEYS, max_log_bytes)
+    if not r.ok:
+        return []
+    out = []
+    for line in r.stdout_tail.splitlines():
+        fields = line.rstrip("\n").split("\t")
+        if not fields[0].strip():
+            continue
+        fields += [""] * (len(_CONTAINER_LABEL_KEYS) + 1 - len(fields))
+        out.append({"name": fields[0].strip(), **dict(zip(_CONTAINER_LABEL_KEYS, fields[1:]))})
+    return out
+
+class OneShotContainers:
+    # container_mode = "run": a fresh `docker run --rm` per test invocation, named
+    # <name>-<n>-<stage>; a timed-out, cancelled or interrupted run is force-removed because
+    # killing the docker client does not stop the container
+    def __init__(self, tag: str, repo_dir: Path, cfg: DockerConfig, max_log_bytes: int, name: str = "", labels: Optional[dict[str, str]] = None, cancel: Optional[threading.Event] = None):
+        self.tag = tag
+        self.repo_dir = repo_dir
+        self.cfg = cfg
+        self.max_log_bytes = max_log_bytes
+        self.name = name
+        self.labels = labels
+        self.cancel = cancel
+        self.last_details: dict = {}
+        self._runs = 0
+
+    def run(self, command: list[str], timeout_s: int, log_prefix: Optional[Path] = None) -> CmdResult:
+        self._runs += 1
+        name = container_name(self.name, str(self._runs), log_prefix.name if log_prefix else "") if self.name else None
+        self.last_details = {"container_mode": "run"}
+        if name is None:
+            return docker_run(self.tag, self.repo_dir, command, timeout_s, self.max_log_bytes, self.cfg, log_prefix, cancel=self.cancel)
+
+        self.last_details["container"] = name
+        try:
+            r = docker_run(self.tag, self.repo_dir, command, timeout_s, self.max_log_bytes, self.cfg, log_prefix, name=name, labels=self.labels, cancel=self.cancel)
+        except BaseException:
+            docker_rm(name)
+            raise
+        if r.exit_code in (124, 130):
+            self.last_details["container_removed"] = docker_rm(name).ok
+        return r
+
+    def close(self) -> None:
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class JobContainer:
+    # container_mode = "exec": one container per job checkout, started lazily and
+    # torn down on close(); a timed-out or cancelled exec also tears it down because
+    # killing the exec client does not stop the process inside the container
+    def __init__(self, tag: str, name: str, repo_dir: Path, cfg: DockerConfig, max_log_bytes: int, labels: Optional[dict[str, str]] = None, cancel: Optional[threading.Event] = None):
+        self.tag = tag
+        self.name = name
+        self.repo_dir = repo_dir
+        self.cfg = cfg
+        self.max_log_bytes = max_log_bytes
+        self.labels = labels
+        self.cancel = cancel
+        self.last_details: dict = {}
+        self._running = False
+
+    def run(self, command: list[str], timeout_s: int, log_prefix: Optional[Path] = None) -> CmdResult:
+        self.last_details = {"container_mode": "exec", "container": self.name}
+        if not self._running:
+            r = docker_start(self.tag, self.name, self.repo_dir, self.cfg, self.max_log_bytes, log_prefix, labels=self.labels)
+            self.last_details["container_start_ms"] = r.elapsed_ms
+            if not r.ok:
+                # leave nothing half-created behind
+                docker_rm(self.name)
+                return r
+            self._running = True
+
+        r = docker_exec(self.name, command, timeout_s, self.max_log_bytes, log_prefix, cancel=self.cancel)
+        if r.exit_code in (124, 130):
+            self.last_details["container_removed"] = self.close()
+        return r
+
+    def close(self) -> bool:
+        if not self._running:
+            return True
+        self._running = False
+        return docker_rm(self.name).ok
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def measure_container_overhead(tag: str, repo_dir: Path, cfg: DockerConfig, repeat: int = 5) -> dict:
+    # per-invocation cost of a no-op in each container_mode, i.e. what a test stage pays
+    # on top of the tests themselves
+    noop = ["true"]
+    run_ms = []
+    for _ in range(repeat):
+        r = docker_run(tag, repo_dir, noop, 120, 4096, cfg)
+        run_ms.append(r.elapsed_ms)
+
+    name = f"validator-overhead-{uuid.uuid4().hex[:8]}"
+    start = docker_start(tag, name, repo_dir, cfg, 4096, labels=container_labels(name))
+    exec_ms = []
+    try:
+        if start.ok:
+            for _ in range(repeat):
+                r = docker_exec(name, noop, 120, 4096)
+                exec_ms.append(r.elapsed_ms)
+    finally:
+        teardown = docker_rm(name)
+
+    return {
+        "image": tag,
+        "repeat": repeat,
+        "run": {"per_stage_ms": run_ms, "median_ms": statistics.median(run_ms) if run_ms else None},
+        "exec": {
+            "per_stage_ms": exec_ms,
+            "median_ms": statistics.median(exec_ms) if exec_ms else None,
+            "start_ms": start.elapsed_ms,
+            "teardown_ms": teardown.elapsed_ms,
+            "start_error": "" if start.ok else start.stderr_tail,
+        },
+    }
+
+def docker_image_inspect_size(tag: str, max_log_bytes: int = 4096) -> CmdResult:
+    # exit_code != 0 means the image is not present locally
+    return get_backend().image_inspect_size(tag, max_log_bytes)
+
+def docker_rmi(tag: str, max_log_bytes: int = 4096) -> CmdResult:
+    return get_backend().rmi(tag, max_log_bytes)
+
+def docker_list_images(label: str, max_log_bytes: int = 2_000_000) -> list[str]:
+    r = get_backend().list_images(label, max_log_bytes)
+    if not r.ok:
+        return []
+    return [line.strip() for line in r.stdout_tail.splitlines() if line.strip()]
 
 def docker_image_tag(job_id: str) -> str:
     return f"validator-job:{job_id}"
+
+def docker_cached_image_tag(digest: str) -> str:
+    return f"validator-cache:{digest[:32]}"
@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+from urllib.parse import quote, urlencode
+
+from validator.checks.policy import parse_size_bytes
+from validator.core.build_context import BuildContext
+from validator.core.docker import DockerConfig, build_args, exec_args, images_args, inspect_size_args, ps_args, rm_args, rmi_args, run_args, start_args
+from validator.core.subprocess import CANCELLED_EXIT_CODE, CmdResult, StreamCapture, open_captures, span_name
+from validator.core.trace import span
+
+# Docker Engine API over the daemon's unix socket: one HTTP request per operation on
+# pooled keep-alive connections instead of a docker CLI process per operation. Results
+# have the same CmdResult shape (and stage logs) as the CLI backend; cmd is the CLI-style
+# argv with "engine" in place of the docker binary.
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+_POOL_SIZE = 8
+_PING_TIMEOUT_S = 2
+_POLL_S = 0.1
+_FRAME = struct.Struct(">BxxxL")
+# CLI exit codes for the same failures, so callers can't tell the backends apart
+_EXIT_DAEMON_ERROR = 125
+_EXIT_BUILD_FAILED = 1
+_EXIT_TIMEOUT = 124
+
+class EngineError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Error response from daemon: {message}")
+        self.status = status
+        self.message = message
+
+def engine_socket_path() -> Optional[str]:
+    # None when DOCKER_HOST points somewhere other than a unix socket
+    host = os.environ.get("DOCKER_HOST")
+    if not host:
+        return DEFAULT_SOCKET
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return None
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+        # kept past close(): http.client hands hijacked streams to the response and drops
+        # its own reference, but abort() must still be able to shut the socket down
+        self._raw: Optional[socket.socket] = None
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = self._raw = sock
+
+    def abort(self) -> None:
+        # unblocks a reader stuck in recv on another thread
+        if self._raw is not None:
+            try:
+                self._raw.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+def _error_message(data: bytes) -> str:
+    try:
+        return str(json.loads(data).get("message", ""))
+    except (ValueError, AttributeError):
+        return data.decode("utf-8", errors="replace").strip()
+
+class EngineClient:
+    def __init__(self, socket_path: str, pool_size: int = _POOL_SIZE):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self._idle: queue.LifoQueue[_UnixConnection] = queue.LifoQueue()
+
+    def _release(self, conn: _UnixConnection, resp: http.client.HTTPResponse) -> None:
+        if resp.will_close or not resp.isclosed() or self._idle.qsize() >= self.pool_size:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def open(self, method: str, path: str, params: Optional[dict[str, Any]] = None, body: Any = None, headers: Optional[dict[str, str]] = None) -> tuple[_UnixConnection, http.client.HTTPResponse]:
+        # raises EngineError for 4xx/5xx; the caller reads the response and hands the
+        # connection back with release()
+        url = path + ("?" + urlencode(params) if params else "")
+        hdrs = dict(headers or {})
+        chunked = False
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            hdrs["Content-Type"] = "application/json"
+        elif body is not None and not isinstance(body, bytes):
+            chunked = True
+        # a keep-alive connection the daemon already closed fails on first use; replayable
+        # requests are retried once on a fresh connection
+        attempts = 2 if not chunked else 1
+        for attempt in range(attempts):
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = _UnixConnection(self.socket_path)
+                reused = False
+            try:
+                conn.request(method, url, body=body, headers=hdrs, encode_chunked=chunked)
+                resp = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if not reused or attempt == attempts - 1:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+        if resp.status >= 400:
+            data = resp.read()
+            self._release(conn, resp)
+            raise EngineError(resp.status, _error_message(data))
+        return conn, resp
+
+    def release(self, conn: _UnixConnection, resp: http.client.HTTPResponse) -> None:
+        self._release(conn, resp)
+
+    def call(self, method: str, path: str, params: Optional[dict[str, Any]] = None, body: Any = None) -> Any:
+        conn, resp = self.open(method, path, params=params, body=body)
+        data = resp.read()
+        self._release(conn, resp)
+        if not data:
+            return None
+        if resp.getheader("Content-Type", "").startswith("application/json"):
+            return json.loads(data)
+        return data.decode("utf-8", errors="replace")
+
+    def ping(self, timeout_s: float = _PING_TIMEOUT_S) -> bool:
+        conn = _UnixConnection(self.socket_path, timeout=timeout_s)
+        try:
+            conn.request("GET", "/_ping")
+            resp = conn.getresponse()
+            resp.read()
+            return resp.status == 200
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+# --- streaming with deadline / cancel
+
+def _follow(conn: _UnixConnection, reader: Callable[[], None], deadline: float, cancel: Optional[threading.Event], on_timeout: Callable[[], None]) -> Optional[int]:
+    # runs reader on a helper thread; None when it finished, otherwise the exit code
+    # the CLI would report for a timeout or cancellation
+    errors: list[BaseException] = []
+
+    def run() -> None:
+        try:
+            reader()
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            errors.append(exc)
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    outcome: Optional[int] = None
+    while t.is_alive():
+        t.join(timeout=_POLL_S)
+        if not t.is_alive():
+            break
+        if cancel is not None and cancel.is_set():
+            outcome = CANCELLED_EXIT_CODE
+        elif time.monotonic() >= deadline:
+            outcome = _EXIT_TIMEOUT
+            on_timeout()
+        else:
+            continue
+        conn.abort()
+        t.join()
+    if outcome is None and errors:
+        raise errors[0]
+    return outcome
+
+def _demux(resp: http.client.HTTPResponse, captures: dict[str, StreamCapture]) -> None:
+    # non-tty container output: 8-byte frame header (stream id, size) + payload
+    while True:
+        head = resp.read(_FRAME.size)
+        if len(head) < _FRAME.size:
+            return
+        kind, size = _FRAME.unpack(head)
+        data = resp.read(size)
+        captures["stderr" if kind == 2 else "stdout"].write(data)
+
+class EngineBackend:
+    name = "engine"
+
+    def __init__(self, socket_path: str):
+        self.client = EngineClient(socket_path)
+
+    def _result(self, cmd: list[str], captures: dict[str, StreamCapture], exit_code: int, start: float) -> CmdResult:
+        for c in captures.values():
+            c.close()
+        return CmdResult(
+            ok=exit_code == 0,
+            cmd=cmd,
+            exit_code=exit_code,
+            elapsed_ms=int((time.monotonic() - start) * 1000),
+            stdout_tail=captures["stdout"].text(),
+            stderr_tail=captures["stderr"].text(),
+            logs={name: ref for name, c in captures.items() if (ref := c.log_ref()) is not None},
+        )
+
+    def _op(self, args: list[str], max_log_bytes: int, log_prefix: Optional[Path], body: Callable[[dict[str, StreamCapture]], int]) -> CmdResult:
+        # same span naming and log layout as run_cmd
+        cmd = ["engine"] + args
+        name = span_name(cmd) if log_prefix is None else f"{log_prefix.name}: {span_name(cmd)}"
+        with span(name, cat="cmd", cmd=cmd) as sp:
+            captures = open_captures(cmd, max_log_bytes, log_prefix)
+            start = time.monotonic()
+            try:
+                code = body(captures)
+            except EngineError as exc:
+                captures["stderr"].write((str(exc) + "\n").encode("utf-8", errors="replace"))
+                code = _EXIT_DAEMON_ERROR
+            except (OSError, http.client.HTTPException) as exc:
+                captures["stderr"].write(f"Cannot connect to the Docker daemon at unix://{self.client.socket_path}: {exc}\n".encode("utf-8", errors="replace"))
+                code = _EXIT_DAEMON_ERROR
+            res = self._result(cmd, captures, code, start)
+            sp.args["exit_code"] = res.exit_code
+        return res
+
+    def build(self, tag: str, context: BuildContext, timeout_s: int, max_log_bytes: int, labels: Optional[dict[str, str]], log_prefix: Optional[Path], cancel: Optional[threading.Event]) -> CmdResult:
+        params = {"t": tag, "dockerfile": context.dockerfile_name, "rm": "1", "forcerm": "1"}
+        if labels:
+            params["labels"] = json.dumps(labels, sort_keys=True)
+        deadline = time.monotonic() + timeout_s
+
+        def body(captures: dict[str, StreamCapture]) -> int:
+            conn, resp = self.client.open("POST", "/build", params=params, body=context.stream(), headers={"Content-Type": "application/x-tar"})
+            failed: list[bool] = []
+
+            def read() -> None:
+                for line in resp:
+                    if not line.strip():
+                        continue
+                    msg = json.loads(line)
+                    if "error" in msg:
+                        failed.append(True)
+                        captures["stderr"].write((str(msg["error"]) + "\n").encode("utf-8", errors="replace"))
+                    elif "stream" in msg:
+                        captures["stdout"].write(str(msg["stream"]).encode("utf-8", errors="replace"))
+                    elif "status" in msg:
+                        line_out = " ".join(str(msg[k]) for k in ("id", "status", "progress") if msg.get(k))
+                        captures["stdout"].write((line_out + "\n").encode("utf-8", errors="replace"))
+
+            # closing the connection makes the daemon abort the build
+            outcome = _follow(conn, read, deadline, cancel, on_timeout=lambda: None)
+            if outcome is not None:
+                conn.close()
+                return outcome
+            self.client.release(conn, resp)
+            return _EXIT_BUILD_FAILED if failed else 0
+
+        return self._op(build_args(tag, context, labels), max_log_bytes, log_prefix, body)
+
+    def _create(self, tag: str, repo_dir: Path, cfg: DockerConfig, command: list[str], name: Optional[str] = None, labels: Optional[dict[str, str]] = None, entrypoint: Optional[list[str]] = None) -> str:
+        spec: dict[str, Any] = {
+            "Image": tag,
+            "Cmd": command,
+            "Labels": dict(labels or {}),
+            "WorkingDir": "/app",
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+            "HostConfig": {
+                "Binds": [f"{repo_dir}:/app"],
+                "NetworkMode": cfg.network,
+                "NanoCpus": int(float(cfg.cpus) * 1e9),
+                "Memory": parse_size_bytes(cfg.memory),
+            },
+        }
+        if cfg.cpuset:
+            spec["HostConfig"]["CpusetCpus"] = cfg.cpuset
+        if entrypoint is not None:
+            spec["Entrypoint"] = entrypoint
+        created = self.client.call("POST", "/containers/create", params={"name": name} if name else None, body=spec)
+        return created["Id"]
+
+    def run(self, tag: str, repo_dir: Path, command: list[str], timeout_s: int, max_log_bytes: int, cfg: DockerConfig, log_prefix: Optional[Path], name: Optional[str], labels: Optional[dict[str, str]], cancel: Optional[threading.Event]) -> CmdResult:
+        deadline = time.monotonic() + timeout_s
+
+        def body(captures: dict[str, StreamCapture]) -> int:
+            cid = self._create(tag, repo_dir, cfg, command, name=name, labels=labels)
+            try:
+                self.client.call("POST", f"/containers/{cid}/start")
+                conn, resp = self.client.open("GET", f"/containers/{cid}/logs", params={"follow": "1", "stdout": "1", "stderr": "1"})
+
+                def kill() -> None:
+                    try:
+                        self.client.call("POST", f"/containers/{cid}/kill")
+                    except (EngineError, OSError, http.client.HTTPException):
+                        pass
+
+                outcome = _follow(conn, lambda: _demux(resp, captures), deadline, cancel, on_timeout=kill)
+                if outcome is not None:
+                    conn.close()
+                    return outcome
+                self.client.release(conn, resp)
+                return int(self.client.call("POST", f"/containers/{cid}/wait")["StatusCode"])
+            finally:
+                self._remove(cid)
+
+        return self._op(run_args(tag, repo_dir, command, cfg, name, labels), max_log_bytes, log_prefix, body)
+
+    def start(self, tag: str, name: str, repo_dir: Path, cfg: DockerConfig, max_log_bytes: int, log_prefix: Optional[Path], labels: Optional[dict[str, str]]) -> CmdResult:
+        def body(captures: dict[str, StreamCapture]) -> int:
+            cid = self._create(tag, repo_dir, cfg, ["infinity"], name=name, labels=labels, entrypoint=["sleep"])
+            self.client.call("POST", f"/containers/{cid}/start")
+            captures["stdout"].write((cid + "\n").encode("utf-8"))
+            return 0
+
+        return self._op(start_args(tag, name, repo_dir, cfg, labels), max_log_bytes, log_prefix, body)
+
+    def exec(self, name: str, command: list[str], timeout_s: int, max_log_bytes: int, log_prefix: Optional[Path], cancel: Optional[threading.Event]) -> CmdResult:
+        deadline = time.monotonic() + timeout_s
+
+        def body(captures: dict[str, StreamCapture]) -> int:
+            created = self.client.call("POST", f"/containers/{quote(name, safe='')}/exec", body={
+                "Cmd": command,
+                "WorkingDir": "/app",
+                "AttachStdout": True,
+                "AttachStderr": True,
+                "Tty": False,
+            })
+            eid = created["Id"]
+            # the daemon hijacks this connection for the raw stream and closes it afterwards
+            conn, resp = self.client.open("POST", f"/exec/{eid}/start", body={"Detach": False, "Tty": False})
+            outcome = _follow(conn, lambda: _demux(resp, captures), deadline, cancel, on_timeout=lambda: None)
+            conn.close()
+            if outcome is not None:
+                return outcome
+            info = self.client.call("GET", f"/exec/{eid}/json")
+            return int(info.get("ExitCode") or 0)
+
+        return self._op(exec_args(name, command), max_log_bytes, log_prefix, body)
+
+    def _remove(self, container: str) -> None:
+        try:
+            self.client.call("DELETE", f"/containers/{quote(container, safe='')}", params={"force": "1", "v": "1"})
+        except EngineError as exc:
+            if exc.status != 404:
+                raise
+
+    def rm(self, name: str, max_log_bytes: int) -> CmdResult:
+        def body(captures: dict[str, StreamCapture]) -> int:
+            self._remove(name)
+            captures["stdout"].write((name + "\n").encode("utf-8"))
+            return 0
+
+        return self._op(rm_args(name), max_log_bytes, None, body)
+
+    def image_inspect_size(self, tag: str, max_log_bytes: int) -> CmdResult:
+        def body(captures: dict[str, StreamCapture]) -> int:
+            try:
+                info = self.client.call("GET", f"/images/{quote(tag, safe='')}/json")
+            except EngineError as exc:
+                if exc.status != 404:
+                    raise
+                captures["stderr"].write(f"Error: No such image: {tag}\n".encode("utf-8"))
+                return 1
+            captures["stdout"].write(f"{info.get('Size', 0)}\n".encode("utf-8"))
+            return 0
+
+        return self._op(inspect_size_args(tag), max_log_bytes, None, body)
+
+    def rmi(self, tag: str, max_log_bytes: int) -> CmdResult:
+        def body(captures: dict[str, StreamCapture]) -> int:
+            try:
+                deleted = self.client.call("DELETE", f"/images/{quote(tag, safe='')}")
+            except EngineError as exc:
+                if exc.status not in (404, 409):
+                    raise
+                captures["stderr"].write((str(exc) + "\n").encode("utf-8", errors="replace"))
+                return 1
+            for item in deleted or []:
+                for k, v in item.items():
+                    captures["stdout"].write(f"{k}: {v}\n".encode("utf-8"))
+            return 0
+
+        return self._op(rmi_args(tag), max_log_bytes, None, body)
+
+    def list_images(self, label: str, max_log_bytes: int) -> CmdResult:
+        def body(captures: dict[str, StreamCapture]) -> int:
+            images = self.client.call("GET", "/images/json", params={"filters": json.dumps({"label": [label]})})
+            for image in images or []:
+                for tag in image.get("RepoTags") or []:
+                    if tag != "<none>:<none>":
+                        captures["stdout"].write((tag + "\n").encode("utf-8"))
+            return 0
+
+        return self._op(images_args(label), max_log_bytes, None, body)
+
+    def list_containers(self, label: str, keys: list[str], max_log_bytes: int) -> CmdResult:
+        # same tab-separated layout as `docker ps --format '{{.Names}}\t{{.Label "k"}}...'`
+        def body(captures: dict[str, StreamCapture]) -> int:
+            containers = self.client.call("GET", "/containers/json", params={"all": "1", "filters": json.dumps({"label": [label]})})
+            for c in containers or []:
+                name = ((c.get("Names") or [""])[0]).lstrip("/")
+                values = [(c.get("Labels") or {}).get(k, "") for k in keys]
+                captures["stdout"].write(("\t".join([name, *values]) + "\n").encode("utf-8"))
+            return 0
+
+        return self._op(ps_args(label, keys), max_log_bytes, None, body)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+from validator.checks.policy import Policy
+
+# repo.zip materialization. The central directory is checked against the policy limits
+# before anything is written (member count, declared sizes, compression ratio, unsafe
+# paths, free disk space); members are then written by a thread pool sharing one ZipFile:
+# zlib and file I/O release the GIL, and ZipExtFile never yields more than the declared
+# size, so the up-front checks bound what lands on disk.
+
+_COPY_BUFSIZE = 1 << 20
+# below this, thread start-up costs more than it saves
+_PARALLEL_MIN_FILES = 64
+_PARALLEL_MIN_BYTES = 4 << 20
+# the compression ratio limit applies to members at least this big
+_RATIO_MIN_BYTES = 1 << 20
+
+class ExtractError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+@dataclass(frozen=True)
+class ExtractLimits:
+    max_files: int
+    max_bytes: int
+    max_member_bytes: int
+    max_ratio: float
+
+    @classmethod
+    def from_policy(cls, policy: Policy) -> "ExtractLimits":
+        return cls(
+            max_files=policy.repo_zip_max_files,
+            max_bytes=policy.repo_zip_max_bytes,
+            max_member_bytes=policy.repo_zip_max_member_bytes,
+            max_ratio=policy.repo_zip_max_ratio,
+        )
+
+@dataclass(frozen=True)
+class ExtractStats:
+    files: int
+    dirs: int
+    bytes: int
+    compressed_bytes: int
+    workers: int
+    elapsed_ms: int
+
+    def to_dict(self) -> dict:
+        secs = max(self.elapsed_ms, 1) / 1000
+        return {
+            **asdict(self),
+            "mb_per_s": round(self.bytes / secs / 1e6, 1),
+            "files_per_s": round(self.files / secs, 1),
+        }
+
+def _safe_parts(name: str) -> tuple[str, ...]:
+    path = PurePosixPath(name)
+    parts = tuple(p for p in path.parts if p not in ("", "."))
+    if path.is_absolute() or ".." in parts or "\x00" in name or (parts and ":" in parts[0]):
+        raise ExtractError("zip_unsafe_path", f"unsafe path in repo.zip: {name!r}")
+    return parts
+
+def plan_members(zf: zipfile.ZipFile, limits: ExtractLimits) -> tuple[list[tuple[zipfile.ZipInfo, tuple[str, ...]]], set[tuple[str, ...]]]:
+    # validates the central directory; returns (files, dirs) with a later duplicate winning
+    # like extractall would
+    infos = zf.infolist()
+    if len(infos) > limits.max_files:
+        raise ExtractError("zip_too_many_files", f"repo.zip has {len(infos)} members, limit is {limits.max_files}")
+    files: dict[tuple[str, ...], zipfile.ZipInfo] = {}
+    dirs: set[tuple[str, ...]] = set()
+    total = 0
+    for info in infos:
+        parts = _safe_parts(info.filename)
+        if not parts:
+            continue
+        if info.is_dir():
+            dirs.add(parts)
+            continue
+        if info.file_size > limits.max_member_bytes:
+            raise ExtractError("zip_member_too_large", f"{info.filename} is {info.file_size} bytes uncompressed, limit is {limits.max_member_bytes}")
+        if info.file_size >= _RATIO_MIN_BYTES and info.file_size > limits.max_ratio * max(info.compress_size, 1):
+            raise ExtractError("zip_ratio", f"{info.filename} expands {info.file_size / max(info.compress_size, 1):.0f}x, limit is {limits.max_ratio:g}x")
+        prev = files.pop(parts, None)
+        if prev is not None:
+            total -= prev.file_size
+        files[parts] = info
+        total += info.file_size
+        if total > limits.max_bytes:
+            raise ExtractError("zip_too_large", f"repo.zip expands to more than {limits.max_bytes} bytes")
+        dirs.update(parts[:i] for i in range(1, len(parts)))
+    clash = dirs & files.keys()
+    if clash:
+        raise ExtractError("zip_unsafe_path", f"{'/'.join(min(clash))} is both a file and a directory in repo.zip")
+    return [(info, parts) for parts, info in files.items()], dirs
+
+def _write_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, dest: Path) -> None:
+    with zf.open(info) as src, open(dest, "wb", buffering=0) as dst:
+        if info.file_size <= _COPY_BUFSIZE:
+            dst.write(src.read())
+        else:
+            shutil.copyfileobj(src, dst, _COPY_BUFSIZE)
+
+def extract_zip(zip_path: Path, dest: Path, limits: ExtractLimits, workers: int = 0) -> ExtractStats:
+    start = time.monotonic()
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        files, dirs = plan_members(zf, limits)
+        size = sum(info.file_size for info, _ in files)
+        dest.mkdir(parents=True, exist_ok=True)
+        free = shutil.disk_usage(dest).free
+        if size > free:
+            raise ExtractError("zip_no_space", f"repo.zip expands to {size} bytes, {free} bytes free under {dest}")
+
+        for parts in sorted(dirs, key=len):
+            dest.joinpath(*parts).mkdir(exist_ok=True)
+
+        if workers <= 0:
+            workers = min(8, os.cpu_count() or 1)
+        if len(files) < _PARALLEL_MIN_FILES and size < _PARALLEL_MIN_BYTES:
+            workers = 1
+        if workers == 1:
+            for info, parts in files:
+                _write_member(zf, info, dest.joinpath(*parts))
+        else:
+            # largest members first so one big file does not end up last on a single thread
+            files.sort(key=lambda f: f[0].file_size, reverse=True)
+            failed = threading.Event()
+
+            def write(item: tuple[zipfile.ZipInfo, tuple[str, ...]]) -> None:
+                if not failed.is_set():
+                    try:
+                        _write_member(zf, item[0], dest.joinpath(*item[1]))
+                    except BaseException:
+                        failed.set()
+                        raise
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as pool:
+                for _ in pool.map(write, files):
+                    pass
+
+    return ExtractStats(
+        files=len(files),
+        dirs=len(dirs),
+        bytes=size,
+        compressed_bytes=sum(info.compress_size for info, _ in files),
+        workers=workers,
+        elapsed_ms=int((time.monotonic() - start) * 1000),
+    )
+
+def scratch_repo_dir(scratch_root: str, job_id: str, repo_dir: Path) -> Optional[Path]:
+    # puts the checkout on e.g. a tmpfs: <scratch_root>/validator-<job_id>/repo, linked from
+    # repo_dir. None (extract in place) when scratch_root is unusable
+    target = Path(scratch_root) / f"validator-{job_id}" / "repo"
+    try:
+        target.mkdir(parents=True)
+        repo_dir.rmdir()
+        repo_dir.symlink_to(target, target_is_directory=True)
+        return target
+    except OSError:
+        shutil.rmtree(target.parent, ignore_errors=True)
+        repo_dir.mkdir(parents=True, exist_ok=True)
+        return None
+
+def release_scratch(repo_dir: Path) -> None:
+    # drops the scratch copy behind a repo_dir symlink; the dangling link is left in work/
+    if repo_dir.is_symlink():
+        shutil.rmtree(Path(os.readlink(repo_dir)).parent, ignore_errors=True)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from validator.core.state import connect
+
+_CHUNK = 1024 * 1024
+# files modified this recently may still change within the same mtime tick; hash them every time
+_RACY_WINDOW_NS = 2_000_000_000
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def json_sha256(obj: Any) -> str:
+    data = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def file_fingerprint(path: Path) -> tuple[int, int, int, int]:
+    # (device, inode, size, mtime_ns): changes whenever the file is rewritten or replaced
+    st = path.stat()
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+_digests: Optional[sqlite3.Connection] = None
+_digests_pid = 0
+_digests_lock = threading.Lock()
+
+def _digest_db() -> sqlite3.Connection:
+    # one connection per process; pool workers forked after first use open their own
+    global _digests, _digests_pid
+    if _digests is None or _digests_pid != os.getpid():
+        _digests = connect("cache.sqlite")
+        _digests.execute(
+            "CREATE TABLE IF NOT EXISTS file_digests ("
+            " path TEXT PRIMARY KEY, dev INTEGER NOT NULL, ino INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL)"
+        )
+        _digests_pid = os.getpid()
+    return _digests
+
+def cached_file_sha256(path: Path, compute: Optional[Callable[[Path], str]] = None) -> str:
+    # file_sha256 memoized on disk by path + file_fingerprint, so unchanged files are not re-read;
+    # compute replaces file_sha256 on a miss for callers that hash while reading the file anyway
+    fp = file_fingerprint(path)
+    key = str(path.resolve())
+    with _digests_lock:
+        row = _digest_db().execute(
+            "SELECT dev, ino, size, mtime_ns, sha256 FROM file_digests WHERE path=?", (key,)
+        ).fetchone()
+    if row is not None and tuple(row[:4]) == fp:
+        return row[4]
+
+    digest = (compute or file_sha256)(path)
+    if time.time_ns() - fp[3] > _RACY_WINDOW_NS:
+        with _digests_lock:
+            _digest_db().execute(
+                "INSERT OR REPLACE INTO file_digests (path, dev, ino, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, *fp, digest),
+            )
+    return digest
+
+def remember_file_sha256(path: Path, digest: str) -> None:
+    # seeds the cached_file_sha256 memo for a file the caller has just written and hashed
+    # itself (the racy-window check guards against other writers, of which there are none)
+    with _digests_lock:
+        _digest_db().execute(
+            "INSERT OR REPLACE INTO file_digests (path, dev, ino, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+            (str(path.resolve()), *file_fingerprint(path), digest),
+        )
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from validator.checks.policy import Policy
+from validator.core.docker import CACHE_LABEL, docker_cached_image_tag, docker_image_inspect_size, docker_list_images, docker_rmi
+from validator.core.hashing import cached_file_sha256, json_sha256
+from validator.core.state import LruIndex
+
+# bump when the way images are built changes, so stale images are not reused
+_IMAGE_CACHE_VERSION = 2
+
+def image_cache_digest(dockerfile: Path, repo_zip: Path, policy: Policy) -> str:
+    # the build context is materialized from repo.zip, so its digest stands in for the context;
+    # only settings that change the built image are keyed (run-time limits such as cpus,
+    # memory or network are not, so changing them reuses the image)
+    return json_sha256({
+        "version": _IMAGE_CACHE_VERSION,
+        "dockerfile": cached_file_sha256(dockerfile),
+        "context": cached_file_sha256(repo_zip),
+        "build_context": policy.docker_build_context,
+    })
+
+@dataclass(frozen=True)
+class CachedImage:
+    tag: str
+    size_bytes: int
+    last_used_at: float
+
+def _index() -> LruIndex:
+    return LruIndex("docker_image")
+
+def lookup_image(tag: str) -> bool:
+    r = docker_image_inspect_size(tag)
+    if not r.ok:
+        _index().remove(tag)
+        return False
+    _index().touch(tag, _parse_size(r.stdout_tail))
+    return True
+
+def record_image(tag: str) -> None:
+    r = docker_image_inspect_size(tag)
+    _index().touch(tag, _parse_size(r.stdout_tail) if r.ok else None)
+
+def _parse_size(text: str) -> Optional[int]:
+    try:
+        return int(text.strip())
+    except ValueError:
+        return None
+
+def list_cached_images() -> list[CachedImage]:
+    index = _index()
+    present = set(docker_list_images(CACHE_LABEL))
+    known = {e.key for e in index.entries()}
+    for tag in known - present:
+        index.remove(tag)
+    for tag in present - known:
+        # built by another host/state dir: treat as least recently used
+        r = docker_image_inspect_size(tag)
+        index.touch(tag, _parse_size(r.stdout_tail) if r.ok else None, when=0.0)
+    return [CachedImage(tag=e.key, size_bytes=e.size_bytes, last_used_at=e.last_used_at) for e in index.entries()]
+
+def prune_images(max_entries: Optional[int], max_bytes: Optional[int], dry_run: bool = False) -> list[CachedImage]:
+    list_cached_images()
+    index = _index()
+    removed: list[CachedImage] = []
+    for e in index.select_evictions(max_entries, max_bytes):
+        if not dry_run:
+            r = docker_rmi(e.key)
+            if not r.ok:
+                continue
+            index.remove(e.key)
+        removed.append(CachedImage(tag=e.key, size_bytes=e.size_bytes, last_used_at=e.last_used_at))
+    return removed
+
+def cached_tag_for(dockerfile: Path, repo_zip: Path, policy: Policy) -> tuple[str, str]:
+    digest = image_cache_digest(dockerfile, repo_zip, policy)
+    return docker_cached_image_tag(digest), digest
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from validator.core.state import connect, instance_id, owner_alive
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+_POLL_S = 1.0
+
+@dataclass
+class JobRecord:
+    job_id: str
+    dir_path: str
+    status: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    ok: Optional[bool] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "dir_path": self.dir_path,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "ok": self.ok,
+        }
+
+_COLUMNS = "job_id, dir_path, status, created_at, started_at, finished_at, ok"
+
+def _record(row) -> JobRecord:
+    job_id, dir_path, status, created_at, started_at, finished_at, ok = row
+    return JobRecord(
+        job_id=job_id,
+        dir_path=dir_path,
+        status=status,
+        created_at=created_at,
+        started_at=started_at,
+        finished_at=finished_at,
+        ok=None if ok is None else bool(ok),
+    )
+
+class JobQueue:
+    # sqlite-backed FIFO with a bounded pool of worker threads; queued jobs and jobs
+    # orphaned by a dead server process are picked up again on start()
+    def __init__(
+        self,
+        run_job: Callable[[str], dict],
+        workers: int = 2,
+        db_name: str = "jobs.sqlite",
+        on_done: Optional[Callable[[str], None]] = None,
+    ):
+        # on_done(dir_path) runs once a job's result is stored (not when it is requeued)
+        self._run_job = run_job
+        self._on_done = on_done
+        self._workers = max(1, workers)
+        self._db_name = db_name
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        # set once stop() gave up waiting: the server is about to kill the containers of
+        # jobs still running, so their results are not real verdicts
+        self._abandoned = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._conn = connect(db_name)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT NOT NULL UNIQUE,"
+            " dir_path TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " owner_pid INTEGER,"
+            " ok INTEGER,"
+            " result TEXT,"
+            " owner_instance TEXT)"
+        )
+        if "owner_instance" not in {r[1] for r in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_instance TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_seq ON jobs (status, seq)")
+
+    def start(self) -> None:
+        self._requeue_orphans()
+        self._stop.clear()
+        self._abandoned.clear()
+        for i in range(self._workers):
+            t = threading.Thread(target=self._worker, name=f"validator-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout_s: float = 5.0) -> None:
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout=timeout_s)
+        self._abandoned.set()
+        self._threads = []
+
+    def submit(self, dir_path: str) -> JobRecord:
+        rec = JobRecord(job_id=uuid.uuid4().hex, dir_path=dir_path, status=QUEUED, created_at=time.time())
+        with self._wake:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, dir_path, status, created_at) VALUES (?, ?, ?, ?)",
+                (rec.job_id, rec.dir_path, rec.status, rec.created_at),
+            )
+            self._wake.notify()
+        return rec
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return _record(row) if row else None
+
+    def result(self, job_id: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> list[JobRecord]:
+        sql = f"SELECT {_COLUMNS} FROM jobs"
+        params: list[Any] = []
+        if status:
+            sql += " WHERE status=?"
+            params.append(status)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_record(r) for r in rows]
+
+    def depth(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status=?", (QUEUED,)).fetchone()[0])
+
+    def _requeue_orphans(self) -> None:
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id, owner_pid, owner_instance FROM jobs WHERE status=?", (RUNNING,)).fetchall()
+            for job_id, owner_pid, owner_instance in rows:
+                if owner_pid is None or not owner_alive(int(owner_pid), owner_instance):
+                    self._conn.execute(
+                        "UPDATE jobs SET status=?, started_at=NULL, owner_pid=NULL, owner_instance=NULL WHERE job_id=? AND status=?",
+                        (QUEUED, job_id, RUNNING),
+                    )
+
+    def _claim(self) -> Optional[tuple[str, str]]:
+        # BEGIN IMMEDIATE keeps the claim atomic when several server processes share the db
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, dir_path FROM jobs WHERE status=? ORDER BY seq LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status=?, started_at=?, owner_pid=?, owner_instance=? WHERE job_id=?",
+                        (RUNNING, time.time(), os.getpid(), instance_id(), row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (row[0], row[1]) if row else None
+
+    def _requeue(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status=?, started_at=NULL, owner_pid=NULL, owner_instance=NULL WHERE job_id=? AND status=?",
+                (QUEUED, job_id, RUNNING),
+            )
+
+    def _finish(self, job_id: str, status: str, ok: bool, result: dict) -> bool:
+        if self._abandoned.is_set():
+            # interrupted by shutdown: run again by the next server instead
+            self._requeue(job_id)
+            return False
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status=?, finished_at=?, ok=?, result=? WHERE job_id=?",
+                (status, time.time(), int(ok), json.dumps(result, sort_keys=True), job_id),
+            )
+        return True
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            claimed = self._claim()
+            if claimed is None:
+                with self._wake:
+                    self._wake.wait(timeout=_POLL_S)
+                continue
+
+            job_id, dir_path = claimed
+            try:
+                res = self._run_job(dir_path)
+                finished = self._finish(job_id, DONE, bool(res.get("ok")), res)
+            except Exception as exc:
+                tb = traceback.format_exc().splitlines()
+                finished = self._finish(job_id, ERROR, False, {
+                    "ok": False,
+                    "dir": dir_path,
+                    "phase": "TRIAD",
+                    "error_type": type(exc).__name__,
+                    "message": str(exc),
+                    "traceback_tail": "\n".join(tb[-200:]),
+                })
+            if finished and self._on_done is not None:
+                try:
+                    self._on_done(dir_path)
+                except Exception:
+                    pass  # cleanup never takes a worker down; gc sweeps what is left
+
+def active_dirs(db_name: str = "jobs.sqlite") -> set[str]:
+    # dir_path of jobs still queued or running, whose inputs must stay in place
+    conn = connect(db_name)
+    try:
+        rows = conn.execute("SELECT dir_path FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+    except sqlite3.OperationalError:
+        return set()  # no job was ever queued
+    finally:
+        conn.close()
+    return {r[0] for r in rows}
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+# Per-test outcomes from the JUnit XML pytest writes when the test command runs with
+# PYTEST_ADDOPTS=--junitxml=..., and the pytest plugin used to rerun only chosen tests.
+# Tests are matched by (classname, name), the pair pytest derives from each node id, so
+# a rerun needs no guessing about file paths.
+
+FAILED = ("failed", "error")
+
+# loaded with `-p validator_rerun`; keeps only the items listed in $VALIDATOR_RERUN_IDS
+# ("<classname>\t<name>" per line), using pytest's own junit name mangling
+RERUN_PLUGIN = '''import os
+import re
+
+def _key(nodeid):
+    path, bracket, params = nodeid.partition("[")
+    names = path.split("::")
+    names[0] = re.sub(r"\\.py$", "", names[0].replace("/", "."))
+    names[-1] += bracket + params
+    return ".".join(names[:-1]) + "\\t" + names[-1]
+
+def pytest_collection_modifyitems(config, items):
+    path = os.environ.get("VALIDATOR_RERUN_IDS")
+    if not path:
+        return
+    with open(path, encoding="utf-8") as f:
+        wanted = {line.rstrip("\\n") for line in f if line.strip()}
+    keep = [i for i in items if _key(i.nodeid) in wanted]
+    dropped = [i for i in items if _key(i.nodeid) not in wanted]
+    if dropped:
+        config.hook.pytest_deselected(items=dropped)
+        items[:] = keep
+'''
+
+@dataclass(frozen=True)
+class TestCase:
+    classname: str
+    name: str
+    outcome: str  # passed | failed | error | skipped
+    time_s: float
+    message: str = ""
+
+    @property
+    def key(self) -> str:
+        return f"{self.classname}\t{self.name}"
+
+    @property
+    def test_id(self) -> str:
+        # pytest-style id for display: tests.test_x.TestA + test_b -> tests/test_x.py::TestA::test_b
+        # (a dotted package path and a class are indistinguishable here; best effort)
+        parts = self.classname.split(".")
+        mod = [p for p in parts if not p[:1].isupper()]
+        cls = parts[len(mod):]
+        return "::".join(["/".join(mod) + ".py", *cls, self.name]) if mod else self.name
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "id": self.test_id}
+
+def _outcome(case: ET.Element) -> tuple[str, str]:
+    for tag, outcome in (("failure", "failed"), ("error", "error"), ("skipped", "skipped")):
+        el = case.find(tag)
+        if el is not None:
+            return outcome, (el.get("message") or "")[:500]
+    return "passed", ""
+
+def parse_junit(path: Path) -> Optional[list[TestCase]]:
+    # None when the file is missing or not JUnit XML (the tests did not run under pytest)
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        return None
+    cases = []
+    for case in root.iter("testcase"):
+        outcome, message = _outcome(case)
+        cases.append(TestCase(
+            classname=case.get("classname") or "",
+            name=case.get("name") or "",
+            outcome=outcome,
+            time_s=float(case.get("time") or 0),
+            message=message,
+        ))
+    return cases
+
+def summarize(cases: list[TestCase], max_listed: int = 50) -> dict:
+    counts = {"passed": 0, "failed": 0, "error": 0, "skipped": 0}
+    for c in cases:
+        counts[c.outcome] += 1
+    failing = [c.test_id for c in cases if c.outcome in FAILED]
+    return {**counts, "total": len(cases), "failing": failing[:max_listed]}
+
+def rerun_ids(cases: list[TestCase]) -> str:
+    return "".join(c.key + "\n" for c in cases)
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+def junit_file_name(stage: str) -> str:
+    return _SAFE.sub("_", stage) + ".junit.xml"
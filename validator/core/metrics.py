@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import math
+import os
+import resource
+import threading
+from typing import Any, Callable, Optional
+
+# Prometheus text-format metrics without a client dependency. Recording never takes a
+# lock: each thread writes to its own shard and render() sums the shards at scrape time.
+
+_DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1800)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Sharded:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        d = getattr(self._local, "d", None)
+        if d is None:
+            d = self._local.d = {}
+            with self._shards_lock:  # once per thread
+                self._shards.append(d)
+        return d
+
+    def _snapshot(self) -> list[list[tuple[Any, Any]]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        out = []
+        for d in shards:
+            while True:
+                try:
+                    out.append(list(d.items()))
+                    break
+                except RuntimeError:  # resized by its owner mid-copy
+                    continue
+        return out
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *label_values: str, value: float = 1) -> None:
+        d = self._shard()
+        d[label_values] = d.get(label_values, 0) + value
+
+    def render(self) -> list[str]:
+        totals: dict[tuple, float] = {}
+        for items in self._snapshot():
+            for k, v in items:
+                totals[k] = totals.get(k, 0) + v
+        return [f"{self.name}{_labels(self.labels, k)} {_fmt(v)}" for k, v in sorted(totals.items())]
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...] = _DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        d = self._shard()
+        row = d.get(label_values)
+        if row is None:
+            row = d[label_values] = [0] * len(self.buckets) + [0.0]
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                row[i] += 1
+                break
+        row[-1] += value
+
+    def render(self) -> list[str]:
+        totals: dict[tuple, list] = {}
+        for items in self._snapshot():
+            for k, row in items:
+                acc = totals.setdefault(k, [0] * len(row))
+                for i, v in enumerate(row):
+                    acc[i] += v
+        lines = []
+        for k, row in sorted(totals.items()):
+            cumulative = 0
+            for b, n in zip(self.buckets, row):
+                cumulative += n
+                le = 'le="' + _fmt(b) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, k, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, k)} {_fmt(row[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, k)} {cumulative}")
+        return lines
+
+class Gauge:
+    kind = "gauge"
+
+    # value is read at scrape time: either from a callback or from inc()/dec() (a single
+    # int behind a plain lock; these change once per job, not on a hot path)
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, value: int = 1) -> None:
+        with self._lock:
+            self._value += value
+
+    def dec(self, value: int = 1) -> None:
+        self.inc(-value)
+
+    def render(self) -> list[str]:
+        if self.fn is None:
+            return [f"{self.name} {_fmt(self._value)}"]
+        try:
+            return [f"{self.name} {_fmt(self.fn())}"]
+        except Exception:
+            return []
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Any] = {}
+
+    def register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for m in self._metrics.values():
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+def _rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _vms_bytes() -> float:
+    with open("/proc/self/statm", encoding="ascii") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+REGISTRY = Registry()
+
+JOBS = REGISTRY.register(Counter("validator_jobs_total", "Finished triad jobs by summary reason.", ("triad", "reason")))
+VIOLATIONS = REGISTRY.register(Counter("validator_violations_total", "Preflight violations by code.", ("code",)))
+STATIC_CHECKS = REGISTRY.register(Counter("validator_static_checks_total", "Static (preflight-only) checks by outcome.", ("ok",)))
+STAGE_SECONDS = REGISTRY.register(Histogram("validator_stage_duration_seconds", "Wall time of each executed stage.", ("stage",)))
+JOB_SECONDS = REGISTRY.register(Histogram("validator_job_duration_seconds", "Wall time of a whole triad job.", ()))
+IN_FLIGHT = REGISTRY.register(Gauge("validator_jobs_in_flight", "Triad jobs currently running in this process."))
+CONTAINERS_REMOVED = REGISTRY.register(Counter("validator_containers_removed_total", "Containers force-removed: timed out or interrupted stages and reaped orphans.", ("reason",)))
+REGISTRY.register(Gauge("process_resident_memory_bytes", "Resident memory size in bytes.", _rss_bytes))
+REGISTRY.register(Gauge("process_virtual_memory_bytes", "Virtual memory size in bytes.", _vms_bytes))
+REGISTRY.register(Gauge(
+    "process_max_resident_memory_bytes", "Peak resident memory size in bytes.",
+    lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+))
+
+def record_job(report: dict, elapsed_s: float) -> None:
+    summary = report.get("summary") or {}
+    JOBS.inc(str(summary.get("triad", "ERROR" if "error_type" in report else "")), str(summary.get("reason") or ""))
+    JOB_SECONDS.observe(elapsed_s)
+    for v in report.get("violations") or []:
+        VIOLATIONS.inc(v["code"])
+    for s in report.get("stages") or []:
+        # replayed (cached) stages didn't run in this job
+        if not (s.get("details") or {}).get("cached"):
+            STAGE_SECONDS.observe(s.get("elapsed_ms", 0) / 1000, s["name"])
+        if (s.get("details") or {}).get("container_removed"):
+            CONTAINERS_REMOVED.inc("stage_killed")
+
+def record_static(result: dict) -> None:
+    STATIC_CHECKS.inc("true" if result.get("ok") else "false")
+    for v in result.get("violations") or []:
+        VIOLATIONS.inc(v["code"])
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from validator.core.subprocess import CmdResult, run_cmd
+
+# Patches are applied to a scratch index (GIT_INDEX_FILE) seeded from the baseline commit,
+# so the check never touches the working tree the docker build is reading from.
+
+_HUNK_FAILED_RE = re.compile(r"^error: patch failed: (.+):(\d+)$")
+_FILE_ERROR_RE = re.compile(r"^error: (.+?): (.+)$")
+_GENERIC_FAILURE = "patch does not apply"
+
+@dataclass
+class PatchCheckResult:
+    ok: bool
+    failures: list[dict[str, Any]] = field(default_factory=list)
+    commands: list[CmdResult] = field(default_factory=list)
+
+def parse_apply_errors(stderr: str, patch_name: str) -> list[dict[str, Any]]:
+    failures: list[dict[str, Any]] = []
+    hunk_files: set[str] = set()
+    context: Optional[list[str]] = None
+    for line in stderr.splitlines():
+        if line == "error: while searching for:":
+            context = []
+            continue
+        m = _HUNK_FAILED_RE.match(line)
+        if m:
+            hunk_files.add(m.group(1))
+            failures.append({
+                "patch": patch_name,
+                "file": m.group(1),
+                "line": int(m.group(2)),
+                "reason": "hunk does not apply",
+                "expected_context": "\n".join(context or []).rstrip("\n"),
+            })
+            context = None
+            continue
+        if context is not None:
+            context.append(line)
+            continue
+        m = _FILE_ERROR_RE.match(line)
+        if m:
+            path, reason = m.group(1), m.group(2)
+            if reason == _GENERIC_FAILURE and path in hunk_files:
+                continue
+            failures.append({"patch": patch_name, "file": path, "line": None, "reason": reason})
+    return failures
+
+def check_patches(repo_root: Path, test_patch: Path, solution_patch: Path, index_path: Path, max_log_bytes: int, log_prefix: Optional[Path] = None) -> PatchCheckResult:
+    # test.patch alone, then solution.patch on top of it
+    env = dict(os.environ)
+    env["GIT_INDEX_FILE"] = str(index_path)
+    res = PatchCheckResult(ok=False)
+
+    def _git(args: list[str]) -> CmdResult:
+        r = run_cmd(["git"] + args, cwd=str(repo_root), timeout_s=120, max_log_bytes=max_log_bytes, env=env, log_prefix=log_prefix)
+        res.commands.append(r)
+        return r
+
+    try:
+        r = _git(["read-tree", "HEAD"])
+        if not r.ok:
+            res.failures.append({"patch": "", "file": "", "line": None, "reason": f"cannot read baseline tree: {r.stderr_tail.strip()}"})
+            return res
+
+        r = _git(["apply", "--cached", "-v", str(test_patch)])
+        if not r.ok:
+            res.failures = parse_apply_errors(r.stderr_tail, test_patch.name) or [
+                {"patch": test_patch.name, "file": "", "line": None, "reason": r.stderr_tail.strip()[-500:]}
+            ]
+            return res
+
+        r = _git(["apply", "--cached", "--check", "-v", str(solution_patch)])
+        if not r.ok:
+            res.failures = parse_apply_errors(r.stderr_tail, solution_patch.name) or [
+                {"patch": solution_patch.name, "file": "", "line": None, "reason": r.stderr_tail.strip()[-500:]}
+            ]
+            return res
+    finally:
+        try:
+            index_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    res.ok = True
+    return res
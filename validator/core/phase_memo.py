@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from validator.checks.policy import Policy
+from validator.core.artifacts import SubmissionArtifacts
+from validator.core.hashing import cached_file_sha256, json_sha256
+from validator.core.image_cache import image_cache_digest
+from validator.core.sandbox import safe_rmtree
+from validator.core.state import LruIndex, state_dir
+from validator.reports.models import StageResult
+
+# phase 1 (test.patch only) depends on the image (repo.zip, Dockerfile.problem and how it is
+# built, see image_cache_digest), test.patch and the container limits, not on
+# solution.patch. A passing phase 1 is stored under phase1/<key>/ (stages.json + its stage
+# logs) and replayed when only solution.patch changed.
+
+# bump when phase 1 commands or its pass/fail rules change
+_MEMO_VERSION = 2
+_STAGES_FILE = "stages.json"
+_POLICY_FIELDS = ("docker_network", "docker_cpus", "docker_memory", "base_timeout_s", "new_timeout_s", "max_log_bytes", "junit_results", "flaky_retries", "flaky_max_tests")
+
+@dataclass(frozen=True)
+class MemoEntry:
+    key: str
+    path: Path
+    size_bytes: int
+    last_used_at: float
+
+def _log_refs(stage: StageResult) -> list[str]:
+    # the stage's own logs plus those of its flaky-test reruns
+    refs = list(stage.details.get("logs", {}).values())
+    for attempt in stage.details.get("reruns", []):
+        refs.extend(attempt.get("logs", {}).values())
+    return refs
+
+def _memo_dir() -> Path:
+    return state_dir("phase1")
+
+def _index() -> LruIndex:
+    return LruIndex("phase1")
+
+def phase1_key(artifacts: SubmissionArtifacts, policy: Policy) -> str:
+    pol = asdict(policy)
+    return json_sha256({
+        "version": _MEMO_VERSION,
+        "image": image_cache_digest(artifacts.dockerfile, artifacts.repo_zip, policy),
+        "test_patch": cached_file_sha256(artifacts.test_patch),
+        "policy": {k: pol[k] for k in _POLICY_FIELDS},
+    })
+
+def lookup_phase1(key: str, runs_dir: Path) -> Optional[list[StageResult]]:
+    # returns the stored stages marked as cached, with their logs copied into runs_dir
+    entry = _memo_dir() / key
+    try:
+        data = json.loads((entry / _STAGES_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    stages = []
+    for s in data["stages"]:
+        stage = StageResult(**s)
+        for rel in _log_refs(stage):
+            src = entry / Path(rel).name
+            dest = runs_dir / rel
+            if src.exists() and not dest.exists():
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(src, dest)
+        stage.details = {
+            **stage.details,
+            "cached": True,
+            "memo_key": key,
+            "source_job_id": data["job_id"],
+            "original_elapsed_ms": stage.elapsed_ms,
+        }
+        # nothing ran in this job
+        stage.elapsed_ms = 0
+        stages.append(stage)
+    _index().touch(key)
+    return stages
+
+def record_phase1(key: str, job_id: str, stages: list[StageResult], runs_dir: Path) -> None:
+    final = _memo_dir() / key
+    if final.exists():
+        return
+    staging = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=_memo_dir()))
+    try:
+        size = 0
+        for stage in stages:
+            for rel in _log_refs(stage):
+                src = runs_dir / rel
+                if src.exists():
+                    shutil.copyfile(src, staging / src.name)
+                    size += src.stat().st_size
+        data = json.dumps({"job_id": job_id, "stages": [s.to_dict() for s in stages]}, sort_keys=True)
+        (staging / _STAGES_FILE).write_text(data, encoding="utf-8")
+        try:
+            os.rename(staging, final)
+        except OSError:
+            # recorded by a concurrent job
+            return
+    finally:
+        safe_rmtree(staging)
+    _index().touch(key, size + len(data))
+
+def list_phase1() -> list[MemoEntry]:
+    index = _index()
+    base = _memo_dir()
+    present = {p.name for p in base.iterdir() if (p / _STAGES_FILE).exists()}
+    known = {e.key for e in index.entries()}
+    for key in known - present:
+        index.remove(key)
+    for key in present - known:
+        index.touch(key, sum(p.stat().st_size for p in (base / key).iterdir()), when=0.0)
+    return [MemoEntry(key=e.key, path=base / e.key, size_bytes=e.size_bytes, last_used_at=e.last_used_at) for e in index.entries()]
+
+def prune_phase1(max_entries: Optional[int], max_bytes: Optional[int], dry_run: bool = False) -> list[MemoEntry]:
+    list_phase1()
+    index = _index()
+    removed: list[MemoEntry] = []
+    for e in index.select_evictions(max_entries, max_bytes):
+        path = _memo_dir() / e.key
+        if not dry_run:
+            safe_rmtree(path)
+            index.remove(e.key)
+        removed.append(MemoEntry(key=e.key, path=path, size_bytes=e.size_bytes, last_used_at=e.last_used_at))
+    return removed
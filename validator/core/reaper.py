@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from validator.core import metrics
+from validator.core.docker import CREATED_LABEL, INSTANCE_LABEL, JOB_LABEL, OWNER_LABEL, docker_list_containers, docker_rm
+from validator.core.state import owner_alive
+
+# Containers left behind by validator processes that died without cleaning up (SIGKILL,
+# OOM, host crash). A container is an orphan when its owner label names a process on this
+# host that no longer exists (or our own pid with another instance id: a predecessor that
+# had the same pid); containers owned by other hosts sharing the daemon are only
+# reaped once older than max_age_s.
+
+@dataclass(frozen=True)
+class ReapedContainer:
+    name: str
+    job_id: str
+    owner: str
+    age_s: Optional[float]
+    reason: str
+    removed: bool
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def _orphan_reason(owner: str, instance: str, created: Optional[float], now: float, max_age_s: Optional[float]) -> Optional[str]:
+    host, _, pid = owner.rpartition(":")
+    if host == socket.gethostname() and pid.isdigit() and not owner_alive(int(pid), instance):
+        return "owner_dead"
+    if max_age_s is not None and created is not None and now - created > max_age_s:
+        return "expired"
+    return None
+
+def reap_orphans(max_age_s: Optional[float] = None, dry_run: bool = False) -> list[ReapedContainer]:
+    now = time.time()
+    out = []
+    for c in docker_list_containers():
+        owner = c.get(OWNER_LABEL, "")
+        try:
+            created: Optional[float] = float(c.get(CREATED_LABEL, ""))
+        except ValueError:
+            created = None
+        reason = _orphan_reason(owner, c.get(INSTANCE_LABEL, ""), created, now, max_age_s)
+        if reason is None:
+            continue
+        removed = False
+        if not dry_run:
+            removed = docker_rm(c["name"]).ok
+            if removed:
+                metrics.CONTAINERS_REMOVED.inc(reason)
+        out.append(ReapedContainer(
+            name=c["name"],
+            job_id=c.get(JOB_LABEL, ""),
+            owner=owner,
+            age_s=None if created is None else round(now - created, 1),
+            reason=reason,
+            removed=removed,
+        ))
+    return out
+
+_once_lock = threading.Lock()
+_reaped_pid: Optional[int] = None
+
+def reap_orphans_once() -> list[ReapedContainer]:
+    # startup sweep: runs for the first caller in each process, later callers get []
+    global _reaped_pid
+    with _once_lock:
+        if _reaped_pid == os.getpid():
+            return []
+        _reaped_pid = os.getpid()
+        try:
+            return reap_orphans()
+        except Exception:
+            # no daemon yet; the job itself reports docker errors
+            return []
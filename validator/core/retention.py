@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from validator.core.blobstore import sweep_blobs
+from validator.core.jobqueue import active_dirs
+from validator.core.sandbox import safe_rmtree
+from validator.core.upload import uploads_dir
+from validator.reports.history import get_history
+
+# `validator gc`: retention for <dir>/.validator_runs. report.json, triad_summary.json and
+# bundle.zip are the record of a run; work/ is scratch once the run has finished. Runs
+# without a report.json are still in progress (or crashed) and are never touched.
+
+RUNS_DIRNAME = ".validator_runs"
+DROP_WORK_MODES = ("success", "all", "none")
+
+@dataclass(frozen=True)
+class RunDir:
+    path: Path
+    job_id: str
+    finished: bool
+    ok: bool
+
+@dataclass
+class GcResult:
+    dry_run: bool
+    runs_removed: list[str] = field(default_factory=list)
+    history_rows_removed: int = 0
+    work_dirs_removed: list[str] = field(default_factory=list)
+    uploads_removed: list[str] = field(default_factory=list)
+    blobs_removed: list[str] = field(default_factory=list)
+    reclaimed_bytes: int = 0
+    remaining_bytes: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "dry_run": self.dry_run,
+            "runs_removed": self.runs_removed,
+            "history_rows_removed": self.history_rows_removed,
+            "work_dirs_removed": self.work_dirs_removed,
+            "uploads_removed": self.uploads_removed,
+            "blobs_removed": self.blobs_removed,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "remaining_bytes": self.remaining_bytes,
+        }
+
+def _run_ok(path: Path) -> bool:
+    try:
+        summary = json.loads((path / "triad_summary.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return isinstance(summary, dict) and summary.get("triad") == "OK"
+
+def list_runs(submission_dir: Path) -> list[RunDir]:
+    # oldest first; job ids start with a %Y%m%d_%H%M%S timestamp
+    runs_root = submission_dir / RUNS_DIRNAME
+    if not runs_root.is_dir():
+        return []
+    runs = []
+    for p in sorted(runs_root.iterdir(), key=lambda p: p.name):
+        if p.is_dir():
+            finished = (p / "report.json").is_file()
+            runs.append(RunDir(path=p, job_id=p.name, finished=finished, ok=finished and _run_ok(p)))
+    return runs
+
+def find_runs_parents(root: Path) -> list[Path]:
+    found = []
+    for dirpath, dirnames, _ in os.walk(root):
+        if RUNS_DIRNAME in dirnames:
+            found.append(Path(dirpath))
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+    return found
+
+def freed_bytes(path: Path) -> int:
+    # bytes actually released by deleting path: files that are also hardlinked from
+    # outside it (blob store inputs, baseline git objects) don't count
+    inodes: dict[tuple[int, int], list[int]] = {}
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            entry = inodes.setdefault((st.st_dev, st.st_ino), [st.st_nlink, st.st_size, 0])
+            entry[2] += 1
+    return sum(size for nlink, size, seen in inodes.values() if seen >= nlink)
+
+def _remove(path: Path, dry_run: bool) -> int:
+    freed = freed_bytes(path)
+    if not dry_run:
+        safe_rmtree(path)
+    return freed
+
+def release_upload(path: Path) -> None:
+    # an uploaded submission is scratch once its run is over: the inputs and the runs made
+    # from them go, and so do their history rows
+    job_ids = [r.job_id for r in list_runs(path)]
+    safe_rmtree(path)
+    if job_ids:
+        get_history().remove(job_ids)
+
+def sweep_uploads(grace_s: float = 86400, dry_run: bool = False) -> list[tuple[Path, int]]:
+    # uploads left behind by a crashed server or an abandoned request; uploads of queued or
+    # running jobs are kept, and the grace period covers one still being received or run
+    active = active_dirs()
+    cutoff = time.time() - grace_s
+    removed = []
+    for p in sorted(uploads_dir().iterdir()):
+        if not p.is_dir() or str(p) in active:
+            continue
+        newest = max([p.stat().st_mtime] + [r.path.stat().st_mtime for r in list_runs(p)])
+        if newest > cutoff:
+            continue
+        size = freed_bytes(p)
+        if not dry_run:
+            release_upload(p)
+        removed.append((p, size))
+    return removed
+
+def collect_garbage(
+    submission_dirs: list[Path],
+    keep_last: Optional[int] = None,
+    drop_work: str = "success",
+    max_bytes: Optional[int] = None,
+    dry_run: bool = False,
+    blob_grace_s: float = 3600,
+    upload_grace_s: float = 86400,
+) -> GcResult:
+    if drop_work not in DROP_WORK_MODES:
+        raise ValueError(f"drop_work must be one of {', '.join(DROP_WORK_MODES)}")
+    res = GcResult(dry_run=dry_run)
+    removed_ids: list[str] = []
+    kept: list[tuple[RunDir, int]] = []
+    newest: set[Path] = set()
+
+    for sub in submission_dirs:
+        finished = [r for r in list_runs(sub) if r.finished]
+        if not finished:
+            continue
+        newest.add(finished[-1].path)
+        # never the newest run, whatever keep_last is
+        cut = min(len(finished) - keep_last, len(finished) - 1) if keep_last is not None else 0
+        for i, run in enumerate(finished):
+            if i < cut:
+                res.reclaimed_bytes += _remove(run.path, dry_run)
+                res.runs_removed.append(str(run.path))
+                removed_ids.append(run.job_id)
+                continue
+            size = freed_bytes(run.path)
+            work = run.path / "work"
+            if work.exists() and (drop_work == "all" or (drop_work == "success" and run.ok)):
+                freed = _remove(work, dry_run)
+                size -= freed
+                res.reclaimed_bytes += freed
+                res.work_dirs_removed.append(str(work))
+            kept.append((run, size))
+
+    # total cap: oldest runs first (by job id), but never a submission's newest run
+    total = sum(size for _, size in kept)
+    if max_bytes is not None:
+        for run, size in sorted(kept, key=lambda k: k[0].job_id):
+            if total <= max_bytes:
+                break
+            if run.path in newest:
+                continue
+            _remove(run.path, dry_run)
+            res.reclaimed_bytes += size
+            res.runs_removed.append(str(run.path))
+            removed_ids.append(run.job_id)
+            total -= size
+    res.remaining_bytes = total
+
+    # the history index must not list runs whose report and logs are gone
+    if removed_ids and not dry_run:
+        res.history_rows_removed = get_history().remove(removed_ids)
+
+    for path, size in sweep_uploads(grace_s=upload_grace_s, dry_run=dry_run):
+        res.uploads_removed.append(str(path))
+        res.reclaimed_bytes += size
+
+    # blobs are freed once the last run linking them is gone (in a dry run nothing was
+    # unlinked, so this only reports blobs that are already unreferenced)
+    for blob in sweep_blobs(grace_s=blob_grace_s, dry_run=dry_run):
+        res.blobs_removed.append(blob.digest)
+        res.reclaimed_bytes += blob.size_bytes
+    return res
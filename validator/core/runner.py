@@ -1,49 +1,404 @@
 from __future__ import annotations
 
 import shutil
-import zipfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
+from typing import Optional, Union
 
 from validator.core.artifacts import SubmissionArtifacts
-from validator.core.sandbox import create_sandbox, write_text
-from validator.core.subprocess import run_cmd
-from validator.core.docker import DockerConfig, docker_build, docker_run, docker_image_tag
+from validator.core.sandbox import Sandbox, create_sandbox, safe_rmtree, write_text
+from validator.core.baselines import clone_baseline, is_cacheable, lookup_baseline, publish_baseline
+from validator.core.hashing import cached_file_sha256
+from validator.core.subprocess import CANCELLED_EXIT_CODE, CmdResult, run_cmd
+from validator.core.patch_check import check_patches
+from validator.core.build_context import layer_cache_dir, plan_build_context
+from validator.core.extract import ExtractError, ExtractLimits, extract_zip, release_scratch, scratch_repo_dir
+from validator.core.docker import CACHE_LABEL, DIGEST_LABEL, DockerConfig, JobContainer, OneShotContainers, container_labels, docker_build, docker_image_tag
+from validator.core.image_cache import cached_tag_for, lookup_image, record_image
+from validator.core.junit import FAILED, RERUN_PLUGIN, TestCase, junit_file_name, parse_junit, rerun_ids, summarize
+from validator.core.phase_memo import lookup_phase1, phase1_key, record_phase1
+from validator.core.reaper import reap_orphans_once
+from validator.core.scheduler import split_cpuset
+from validator.core.trace import in_context, span, traced
 from validator.checks.preflight import run_preflight
-from validator.checks.policy import load_policy
+from validator.checks.policy import Policy, load_policy, parse_size_bytes
 from validator.reports.models import Report, StageResult
 
-def _extract_repo_zip(zip_path: Path, dest: Path) -> None:
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        zf.extractall(dest)
-
-def _ensure_git(repo_root: Path, max_log_bytes: int) -> None:
+def _ensure_git(repo_root: Path, max_log_bytes: int, log_prefix: Optional[Path] = None) -> None:
     if (repo_root / ".git").exists():
         return
 
-    run_cmd(["git", "init"], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes)
-    run_cmd(["git", "add", "-A"], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes)
-    run_cmd(["git", "commit", "-m", "baseline"], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes)
+    for cmd in (
+        ["git", "init"],
+        ["git", "add", "-A"],
+        # don't depend on the host having a git identity configured
+        ["git", "-c", "user.name=validator", "-c", "user.email=validator@localhost", "commit", "-m", "baseline"],
+    ):
+        r = run_cmd(cmd, cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes, log_prefix=log_prefix)
+        if not r.ok:
+            raise RuntimeError(f"{' '.join(cmd)} failed with exit code {r.exit_code}: {r.stderr_tail[-2000:]}")
 
+def _normalize_repo_root(repo_dir: Path) -> Path:
+    # repo may extract into a single top-level folder; normalize to that
+    entries = [p for p in repo_dir.iterdir()]
+    if len(entries) == 1 and entries[0].is_dir():
+        return entries[0]
+    return repo_dir
+
+@traced("reset_clean")
 def _reset_clean(repo_root: Path, max_log_bytes: int) -> None:
     run_cmd(["git", "reset", "--hard"], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes)
     run_cmd(["git", "clean", "-xdf"], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes)
 
-def _apply_patch(repo_root: Path, patch_path: Path, max_log_bytes: int) -> StageResult:
-    r = run_cmd(["git", "apply", str(patch_path)], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes)
+def _stage_from_cmd(name: str, r: CmdResult, ok: Optional[bool] = None, details: Optional[dict] = None) -> StageResult:
+    details = dict(details or {})
+    if r.logs:
+        details["logs"] = {stream: f"stage_logs/{Path(ref['path']).name}" for stream, ref in r.logs.items()}
+        # where in those (appended-to) files this command's output is, for compact reports
+        details["log_refs"] = {stream: {**ref, "path": details["logs"][stream]} for stream, ref in r.logs.items()}
     return StageResult(
-        name=f"APPLY_{patch_path.name}",
-        ok=r.ok,
+        name=name,
+        ok=r.ok if ok is None else ok,
         exit_code=r.exit_code,
         elapsed_ms=r.elapsed_ms,
         cmd=r.cmd,
         stdout_tail=r.stdout_tail,
         stderr_tail=r.stderr_tail,
+        details=details,
     )
 
-def run_triad_job(submission_dir: Path, artifacts: SubmissionArtifacts) -> Report:
+def _apply_patch(repo_root: Path, patch_path: Path, max_log_bytes: int, log_prefix: Optional[Path] = None) -> StageResult:
+    r = run_cmd(["git", "apply", str(patch_path)], cwd=str(repo_root), timeout_s=60, max_log_bytes=max_log_bytes, log_prefix=log_prefix)
+    return _stage_from_cmd(f"APPLY_{patch_path.name}", r)
+
+# scratch dir inside the checkout (/app/.validator in the container) for JUnit XML and the
+# rerun plugin; removed after each test stage
+_SCRATCH_DIR = ".validator"
+
+PhaseOutcome = tuple[list[StageResult], Optional[str]]
+TestContainers = Union[OneShotContainers, JobContainer]
+
+def _test_cmd(mode: str, junit: Optional[str] = None, rerun: bool = False) -> list[str]:
+    # pytest picks the JUnit path up from PYTEST_ADDOPTS, so test.sh needs no changes
+    if junit is None:
+        return ["bash", "-lc", f"chmod +x test.sh && ./test.sh {mode}"]
+    opts = f"--junitxml=/app/{_SCRATCH_DIR}/{junit}"
+    env = ""
+    if rerun:
+        opts = f"-p validator_rerun {opts}"
+        env = f'PYTHONPATH="/app/{_SCRATCH_DIR}${{PYTHONPATH:+:$PYTHONPATH}}" VALIDATOR_RERUN_IDS=/app/{_SCRATCH_DIR}/rerun-ids.txt '
+    return ["bash", "-lc", f'chmod +x test.sh && {env}PYTEST_ADDOPTS="${{PYTEST_ADDOPTS:+$PYTEST_ADDOPTS }}{opts}" ./test.sh {mode}']
+
+def _collect_junit(repo_root: Path, junit: str, logs_dir: Path) -> Optional[list[TestCase]]:
+    src = repo_root / _SCRATCH_DIR / junit
+    cases = parse_junit(src)
+    if cases is not None:
+        shutil.copyfile(src, logs_dir / junit)
+    return cases
+
+def _rerun_failing(containers: TestContainers, repo_root: Path, mode: str, stage: StageResult, cases: list[TestCase], timeout_s: int, policy: Policy, logs_dir: Path) -> None:
+    # reruns only the failing tests, in the same image (or exec container), up to
+    # flaky_retries times; the stage passes if every one of them passes on some attempt
+    failing = [c for c in cases if c.outcome in FAILED]
+    # a timeout, or more failures than a flake would explain, is not worth a rerun
+    if not failing or len(failing) > policy.flaky_max_tests or stage.exit_code in (124, CANCELLED_EXIT_CODE):
+        return
+    scratch = repo_root / _SCRATCH_DIR
+    still = failing
+    attempts = []
+    for n in range(1, policy.flaky_retries + 1):
+        name = f"{stage.name}_RERUN{n}"
+        junit = junit_file_name(name)
+        scratch.mkdir(exist_ok=True)
+        (scratch / "validator_rerun.py").write_text(RERUN_PLUGIN, encoding="utf-8")
+        (scratch / "rerun-ids.txt").write_text(rerun_ids(still), encoding="utf-8")
+        r = containers.run(_test_cmd(mode, junit, rerun=True), timeout_s, logs_dir / name)
+        rerun = {c.key: c for c in _collect_junit(repo_root, junit, logs_dir) or []}
+        # a test that did not run again counts as still failing
+        still = [c for c in still if c.key not in rerun or rerun[c.key].outcome != "passed"]
+        attempt = _stage_from_cmd(name, r)
+        attempt.details.setdefault("logs", {})["junit"] = f"stage_logs/{junit}"
+        attempts.append({
+            "attempt": n,
+            "exit_code": r.exit_code,
+            "elapsed_ms": r.elapsed_ms,
+            "still_failing": [c.test_id for c in still],
+            "logs": attempt.details["logs"],
+        })
+        if not still:
+            break
+
+    stage.details["reruns"] = attempts
+    stage.details["flaky"] = [c.test_id for c in failing if c not in still]
+    if not still:
+        stage.ok = True
+
+def _run_test_stage(containers: TestContainers, repo_root: Path, mode: str, name: str, timeout_s: int, policy: Policy, logs_dir: Path, expect_fail: bool = False) -> StageResult:
+    junit = junit_file_name(name) if policy.junit_results else None
+    try:
+        r = containers.run(_test_cmd(mode, junit), timeout_s, logs_dir / name)
+        stage = _stage_from_cmd(name, r, ok=(r.exit_code != 0) if expect_fail else None, details=containers.last_details)
+        cases = _collect_junit(repo_root, junit, logs_dir) if junit else None
+        if cases is None:
+            return stage
+        stage.details["tests"] = summarize(cases)
+        stage.details.setdefault("logs", {})["junit"] = f"stage_logs/{junit}"
+        if not stage.ok and not expect_fail and policy.flaky_retries > 0:
+            _rerun_failing(containers, repo_root, mode, stage, cases, timeout_s, policy, logs_dir)
+        return stage
+    finally:
+        shutil.rmtree(repo_root / _SCRATCH_DIR, ignore_errors=True)
+
+@traced("phase1", cat="phase")
+def _run_phase1(containers: TestContainers, repo_root: Path, artifacts: SubmissionArtifacts, policy: Policy, logs_dir: Path) -> PhaseOutcome:
+    # PHASE 1: test.patch only
+    stages = [_apply_patch(repo_root, artifacts.test_patch, policy.max_log_bytes, logs_dir / "PHASE1_APPLY_test.patch")]
+
+    base1 = _run_test_stage(containers, repo_root, "base", "TESTPATCH_BASE", policy.base_timeout_s, policy, logs_dir)
+    stages.append(base1)
+    if not base1.ok:
+        return stages, "base_failed_with_test_patch"
+
+    # new must FAIL in phase 1
+    new1 = _run_test_stage(containers, repo_root, "new", "TESTPATCH_NEW_EXPECT_FAIL", policy.new_timeout_s, policy, logs_dir, expect_fail=True)
+    stages.append(new1)
+    if not new1.ok:
+        return stages, "new_unexpectedly_passed_with_test_patch"
+    return stages, None
+
+@traced("phase2", cat="phase")
+def _run_phase2(containers: TestContainers, repo_root: Path, artifacts: SubmissionArtifacts, policy: Policy, logs_dir: Path) -> PhaseOutcome:
+    # PHASE 2: test.patch + solution.patch
+    stages = [
+        _apply_patch(repo_root, artifacts.test_patch, policy.max_log_bytes, logs_dir / "PHASE2_APPLY_test.patch"),
+        _apply_patch(repo_root, artifacts.solution_patch, policy.max_log_bytes, logs_dir / "PHASE2_APPLY_solution.patch"),
+    ]
+
+    base2 = _run_test_stage(containers, repo_root, "base", "BOTH_BASE", policy.base_timeout_s, policy, logs_dir)
+    stages.append(base2)
+    if not base2.ok:
+        return stages, "base_failed_with_both_patches"
+
+    new2 = _run_test_stage(containers, repo_root, "new", "BOTH_NEW", policy.new_timeout_s, policy, logs_dir)
+    stages.append(new2)
+    if not new2.ok:
+        return stages, "new_failed_with_both_patches"
+    return stages, None
+
+def _test_containers(tag: str, job_id: str, name: str, repo_root: Path, policy: Policy, cfg: DockerConfig, cancel: Optional[threading.Event] = None) -> TestContainers:
+    labels = container_labels(job_id)
+    if policy.container_mode == "exec":
+        return JobContainer(tag, name, repo_root, cfg, policy.max_log_bytes, labels=labels, cancel=cancel)
+    return OneShotContainers(tag, repo_root, cfg, policy.max_log_bytes, name=name, labels=labels, cancel=cancel)
+
+def _run_phases_sequential(tag: str, job_id: str, repo_root: Path, artifacts: SubmissionArtifacts, policy: Policy, cfg: DockerConfig, logs_dir: Path) -> list[PhaseOutcome]:
+    # both phases reuse repo_root in place, so in exec mode one container serves the whole job
+    with _test_containers(tag, job_id, f"validator-{job_id}", repo_root, policy, cfg) as containers:
+        _reset_clean(repo_root, policy.max_log_bytes)
+        phase1 = _run_phase1(containers, repo_root, artifacts, policy, logs_dir)
+        if phase1[1] is not None:
+            return [phase1]
+
+        _reset_clean(repo_root, policy.max_log_bytes)
+        return [phase1, _run_phase2(containers, repo_root, artifacts, policy, logs_dir)]
+
+def _run_phase2_only(tag: str, job_id: str, repo_root: Path, artifacts: SubmissionArtifacts, policy: Policy, cfg: DockerConfig, logs_dir: Path) -> PhaseOutcome:
+    with _test_containers(tag, job_id, f"validator-{job_id}", repo_root, policy, cfg) as containers:
+        _reset_clean(repo_root, policy.max_log_bytes)
+        return _run_phase2(containers, repo_root, artifacts, policy, logs_dir)
+
+def _add_worktree(repo_root: Path, dest: Path, max_log_bytes: int) -> bool:
+    r = run_cmd(["git", "worktree", "add", "--detach", str(dest), "HEAD"], cwd=str(repo_root), timeout_s=120, max_log_bytes=max_log_bytes)
+    return r.ok
+
+def _remove_worktree(repo_root: Path, dest: Path, max_log_bytes: int) -> None:
+    run_cmd(["git", "worktree", "remove", "--force", str(dest)], cwd=str(repo_root), timeout_s=120, max_log_bytes=max_log_bytes)
+
+def _run_phases_parallel(tag: str, job_id: str, repo_root: Path, workdir: Path, artifacts: SubmissionArtifacts, policy: Policy, cfg: DockerConfig, logs_dir: Path) -> Optional[list[PhaseOutcome]]:
+    # each phase gets its own checkout of the baseline commit; returns None if the
+    # worktrees cannot be created so the caller falls back to the sequential path
+    roots = [workdir / "phase1", workdir / "phase2"]
+    created: list[Path] = []
+    try:
+        for root in roots:
+            if not _add_worktree(repo_root, root, policy.max_log_bytes):
+                return None
+            created.append(root)
+
+        # both containers split the job's cpu and memory budget, and its cpuset if pinned
+        phase_cfg = replace(cfg, cpus=max(cfg.cpus / 2, 0.01), memory=str(parse_size_bytes(cfg.memory) // 2))
+        cpusets = split_cpuset(cfg.cpuset) if cfg.cpuset else ("", "")
+        # a phase 1 verdict makes phase 2 moot: its running test is killed, not waited out
+        cancel = threading.Event()
+        c1 = _test_containers(tag, job_id, f"validator-{job_id}-phase1", roots[0], policy, replace(phase_cfg, cpuset=cpusets[0]))
+        c2 = _test_containers(tag, job_id, f"validator-{job_id}-phase2", roots[1], policy, replace(phase_cfg, cpuset=cpusets[1]), cancel=cancel)
+        with c1, c2, ThreadPoolExecutor(max_workers=2, thread_name_prefix="triad-phase") as pool:
+            f1 = pool.submit(in_context(_run_phase1), c1, roots[0], artifacts, policy, logs_dir)
+            f2 = pool.submit(in_context(_run_phase2), c2, roots[1], artifacts, policy, logs_dir)
+            phase1 = f1.result()
+            if phase1[1] is not None:
+                cancel.set()
+            phase2 = f2.result()
+    finally:
+        for root in created:
+            _remove_worktree(repo_root, root, policy.max_log_bytes)
+
+    # report exactly what the sequential runner would: phase 2 only counts if phase 1 passed
+    if phase1[1] is not None:
+        return [phase1]
+    return [phase1, phase2]
+
+def _materialize_repo(artifacts: SubmissionArtifacts, sb: Sandbox, policy: Policy) -> tuple[list[StageResult], Optional[str], Path]:
+    git_log = sb.logs_dir / "ENSURE_GIT_BASELINE"
+    git_logs = {"stdout": "stage_logs/ENSURE_GIT_BASELINE.stdout.log", "stderr": "stage_logs/ENSURE_GIT_BASELINE.stderr.log"}
+
+    digest = None
+    if policy.baseline_cache:
+        with span("EXTRACT_REPO", cat="stage") as sp:
+            digest = cached_file_sha256(artifacts.repo_zip)
+            hit = lookup_baseline(digest)
+            r = None
+            if hit is not None:
+                bare, rel_root = hit
+                repo_root = sb.repo_dir / rel_root
+                r = clone_baseline(bare, repo_root, policy.max_log_bytes, log_prefix=git_log)
+        if r is not None and r.ok:
+            stage = _stage_from_cmd("EXTRACT_REPO", r, details={"baseline_cache": "hit", "digest": digest})
+            stage.elapsed_ms = sp.elapsed_ms
+            stage_git = StageResult(name="ENSURE_GIT_BASELINE", ok=True, exit_code=0, elapsed_ms=0, cmd=[], stdout_tail="", stderr_tail="")
+            stage_git.details = {"baseline_cache": "hit", "logs": git_logs}
+            return [stage, stage_git], None, repo_root.resolve()
+        if r is not None:
+            # evicted underneath us or otherwise broken: fall back to a fresh extract
+            safe_rmtree(sb.repo_dir)
+            sb.repo_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- EXTRACT
+    stage = StageResult(name="EXTRACT_REPO", ok=True, exit_code=0, elapsed_ms=0, cmd=[], stdout_tail="", stderr_tail="")
+    if digest is not None:
+        stage.details = {"baseline_cache": "miss", "digest": digest}
+    with span("EXTRACT_REPO", cat="stage") as sp:
+        scratch = scratch_repo_dir(policy.scratch_dir, sb.job_id, sb.repo_dir) if policy.scratch_dir else None
+        if scratch is not None:
+            stage.details["scratch_dir"] = str(scratch)
+        try:
+            stats = extract_zip(artifacts.repo_zip, sb.repo_dir, ExtractLimits.from_policy(policy), policy.extract_workers)
+            stage.details.update(stats.to_dict())
+        except ExtractError as exc:
+            stage.ok = False
+            stage.stderr_tail = str(exc)
+            stage.details["error"] = exc.code
+        except Exception as exc:
+            stage.ok = False
+            stage.stderr_tail = str(exc)
+    stage.elapsed_ms = sp.elapsed_ms
+    if not stage.ok:
+        return [stage], "extract_failed", sb.repo_dir
+
+    repo_root = _normalize_repo_root(sb.repo_dir)
+
+    # --- ENSURE GIT
+    stage_git = StageResult(name="ENSURE_GIT_BASELINE", ok=True, exit_code=0, elapsed_ms=0, cmd=[], stdout_tail="", stderr_tail="")
+    stage_git.details["logs"] = git_logs
+    with span("ENSURE_GIT_BASELINE", cat="stage") as sp:
+        try:
+            _ensure_git(repo_root, policy.max_log_bytes, git_log)
+        except Exception as exc:
+            stage_git.ok = False
+            stage_git.stderr_tail = str(exc)
+        if stage_git.ok and digest is not None:
+            with span("publish_baseline"):
+                cached = is_cacheable(repo_root, policy.max_log_bytes) and publish_baseline(
+                    digest, repo_root, str(repo_root.relative_to(sb.repo_dir)), policy.max_log_bytes
+                )
+            stage_git.details["baseline_cache"] = "stored" if cached else "uncacheable"
+    stage_git.elapsed_ms = sp.elapsed_ms
+    if not stage_git.ok:
+        return [stage, stage_git], "git_init_failed", repo_root
+    return [stage, stage_git], None, repo_root
+
+@traced("DOCKER_BUILD", cat="stage")
+def _build_image(job_id: str, artifacts: SubmissionArtifacts, repo_root: Path, policy: Policy, logs_dir: Path, cancel: Optional[threading.Event] = None) -> tuple[StageResult, str]:
+    log_prefix = logs_dir / "DOCKER_BUILD"
+    context = plan_build_context(artifacts.dockerfile, repo_root, policy.docker_build_context)
+    cache_dir = layer_cache_dir(policy.build_cache_dir, artifacts.dockerfile)
+    if not policy.docker_image_cache:
+        tag = docker_image_tag(job_id)
+        r = docker_build(tag, context, policy.docker_build_timeout_s, policy.max_log_bytes, log_prefix=log_prefix, cancel=cancel, cache_dir=cache_dir)
+        return _stage_from_cmd("DOCKER_BUILD", r, details={"image": tag, "cache": "disabled", "context": context.to_dict(), "layer_cache": cache_dir or None}), tag
+
+    start = time.monotonic()
+    tag, digest = cached_tag_for(artifacts.dockerfile, artifacts.repo_zip, policy)
+    if lookup_image(tag):
+        return StageResult(
+            name="DOCKER_BUILD",
+            ok=True,
+            exit_code=0,
+            elapsed_ms=int((time.monotonic() - start) * 1000),
+            cmd=[],
+            stdout_tail="",
+            stderr_tail="",
+            details={"image": tag, "digest": digest, "cache": "hit"},
+        ), tag
+
+    labels = {CACHE_LABEL: "1", DIGEST_LABEL: digest}
+    r = docker_build(tag, context, policy.docker_build_timeout_s, policy.max_log_bytes, labels=labels, log_prefix=log_prefix, cancel=cancel, cache_dir=cache_dir)
+    if r.ok:
+        record_image(tag)
+    stage = _stage_from_cmd("DOCKER_BUILD", r, details={"image": tag, "digest": digest, "cache": "miss", "context": context.to_dict(), "layer_cache": cache_dir or None})
+    stage.elapsed_ms = int((time.monotonic() - start) * 1000)
+    return stage, tag
+
+def _format_patch_failure(f: dict) -> str:
+    where = f["file"] if f.get("line") is None else f"{f['file']}:{f['line']}"
+    return f"{f['patch']}: {where}: {f['reason']}"
+
+def _check_patches_while_building(job_id: str, artifacts: SubmissionArtifacts, repo_root: Path, policy: Policy, sb: Sandbox) -> tuple[StageResult, StageResult, str]:
+    # a patch that doesn't apply should fail the job in seconds, not after a full build
+    cancel = threading.Event()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="docker-build") as pool:
+        build = pool.submit(in_context(_build_image), job_id, artifacts, repo_root, policy, sb.logs_dir, cancel)
+        with span("PATCH_CHECK", cat="stage") as sp:
+            res = check_patches(
+                repo_root, artifacts.test_patch, artifacts.solution_patch,
+                sb.workdir / "patch-check.index", policy.max_log_bytes, sb.logs_dir / "PATCH_CHECK",
+            )
+        elapsed_ms = sp.elapsed_ms
+        if not res.ok:
+            cancel.set()
+        stage_build, tag = build.result()
+
+    if stage_build.exit_code == CANCELLED_EXIT_CODE and cancel.is_set():
+        stage_build.details["cancelled_by"] = "PATCH_CHECK"
+
+    stage_check = StageResult(
+        name="PATCH_CHECK",
+        ok=res.ok,
+        exit_code=0 if res.ok else 1,
+        elapsed_ms=elapsed_ms,
+        cmd=res.commands[-1].cmd if res.commands else [],
+        stdout_tail="",
+        stderr_tail="\n".join(_format_patch_failure(f) for f in res.failures[:50]),
+        details={
+            "failures": res.failures,
+            "logs": {"stdout": "stage_logs/PATCH_CHECK.stdout.log", "stderr": "stage_logs/PATCH_CHECK.stderr.log"},
+        },
+    )
+    return stage_check, stage_build, tag
+
+def run_triad_job(submission_dir: Path, artifacts: SubmissionArtifacts, cpuset: str = "") -> Report:
     policy = load_policy(artifacts.policy)
     sb = create_sandbox(submission_dir)
+    try:
+        return _run_triad(submission_dir, artifacts, cpuset, policy, sb)
+    finally:
+        # a checkout on scratch_dir (often tmpfs) does not outlive its job
+        release_scratch(sb.repo_dir)
 
+def _run_triad(submission_dir: Path, artifacts: SubmissionArtifacts, cpuset: str, policy: Policy, sb: Sandbox) -> Report:
     report = Report(
         ok=False,
         job_id=sb.job_id,
@@ -63,89 +418,60 @@ def run_triad_job(submission_dir: Path, artifacts: SubmissionArtifacts) -> Repor
         report.summary = {"triad": "SKIPPED", "reason": "preflight_failed"}
         return report
 
-    # --- EXTRACT
-    stage = StageResult(name="EXTRACT_REPO", ok=True, exit_code=0, elapsed_ms=0, cmd=[], stdout_tail="", stderr_tail="")
-    try:
-        _extract_repo_zip(artifacts.repo_zip, sb.repo_dir)
-    except Exception as exc:
-        stage.ok = False
-        stage.stderr_tail = str(exc)
-        report.stages.append(stage)
-        report.summary = {"triad": "FAIL", "reason": "extract_failed"}
+    # --- EXTRACT + ENSURE GIT
+    stages, reason, repo_root = _materialize_repo(artifacts, sb, policy)
+    report.stages.extend(stages)
+    if reason is not None:
+        report.summary = {"triad": "FAIL", "reason": reason}
         return report
-    report.stages.append(stage)
-
-    # repo may extract into a single top-level folder; normalize to that
-    repo_root = sb.repo_dir
-    entries = [p for p in repo_root.iterdir()]
-    if len(entries) == 1 and entries[0].is_dir():
-        repo_root = entries[0]
 
-    # --- ENSURE GIT
-    stage_git = StageResult(name="ENSURE_GIT_BASELINE", ok=True, exit_code=0, elapsed_ms=0, cmd=[], stdout_tail="", stderr_tail="")
-    try:
-        _ensure_git(repo_root, policy.max_log_bytes)
-    except Exception as exc:
-        stage_git.ok = False
-        stage_git.stderr_tail = str(exc)
-        report.stages.append(stage_git)
-        report.summary = {"triad": "FAIL", "reason": "git_init_failed"}
-        return report
-    report.stages.append(stage_git)
-
-    # --- BUILD IMAGE
-    tag = docker_image_tag(sb.job_id)
-    r_build = docker_build(tag, artifacts.dockerfile, repo_root, policy.docker_build_timeout_s, policy.max_log_bytes)
-    report.stages.append(StageResult(
-        name="DOCKER_BUILD",
-        ok=r_build.ok,
-        exit_code=r_build.exit_code,
-        elapsed_ms=r_build.elapsed_ms,
-        cmd=r_build.cmd,
-        stdout_tail=r_build.stdout_tail,
-        stderr_tail=r_build.stderr_tail,
-    ))
+    # --- PATCH CHECK + BUILD IMAGE
+    if policy.patch_check:
+        stage_check, r_build, tag = _check_patches_while_building(sb.job_id, artifacts, repo_root, policy, sb)
+        report.stages.append(stage_check)
+        report.stages.append(r_build)
+        if not stage_check.ok:
+            report.summary = {"triad": "FAIL", "reason": "patch_check_failed"}
+            return report
+    else:
+        r_build, tag = _build_image(sb.job_id, artifacts, repo_root, policy, sb.logs_dir)
+        report.stages.append(r_build)
     if not r_build.ok:
         report.summary = {"triad": "FAIL", "reason": "docker_build_failed"}
         return report
 
-    cfg = DockerConfig(network=policy.docker_network, cpus=policy.docker_cpus, memory=policy.docker_memory)
+    cfg = DockerConfig(network=policy.docker_network, cpus=policy.docker_cpus, memory=policy.docker_memory, cpuset=cpuset)
 
-    # --- PHASE 1: test.patch only
-    _reset_clean(repo_root, policy.max_log_bytes)
-    report.stages.append(_apply_patch(repo_root, artifacts.test_patch, policy.max_log_bytes))
+    # containers left by crashed validator processes are removed before this job starts
+    # its own; the first job of each process notes them in its summary
+    with span("reap_orphans"):
+        reaped = reap_orphans_once()
 
-    r_base1 = docker_run(tag, repo_root, ["bash", "-lc", "chmod +x test.sh && ./test.sh base"], policy.base_timeout_s, policy.max_log_bytes, cfg)
-    report.stages.append(StageResult("TESTPATCH_BASE", r_base1.ok, r_base1.exit_code, r_base1.elapsed_ms, r_base1.cmd, r_base1.stdout_tail, r_base1.stderr_tail))
-    if not r_base1.ok:
-        report.summary = {"triad": "FAIL", "reason": "base_failed_with_test_patch"}
-        return report
-
-    r_new1 = docker_run(tag, repo_root, ["bash", "-lc", "chmod +x test.sh && ./test.sh new"], policy.new_timeout_s, policy.max_log_bytes, cfg)
-    # new must FAIL in phase 1
-    ok_new_expected_fail = (r_new1.exit_code != 0)
-    report.stages.append(StageResult("TESTPATCH_NEW_EXPECT_FAIL", ok_new_expected_fail, r_new1.exit_code, r_new1.elapsed_ms, r_new1.cmd, r_new1.stdout_tail, r_new1.stderr_tail))
-    if not ok_new_expected_fail:
-        report.summary = {"triad": "FAIL", "reason": "new_unexpectedly_passed_with_test_patch"}
-        return report
+    # a passing phase 1 only depends on repo.zip, Dockerfile.problem, test.patch and the
+    # container limits; when only solution.patch changed it is replayed from the memo
+    with span("phase1_memo_lookup"):
+        memo_key = phase1_key(artifacts, policy)
+        cached_phase1 = None if policy.force_full_run else lookup_phase1(memo_key, sb.root)
+    phases: Optional[list[PhaseOutcome]] = None
+    if cached_phase1 is not None:
+        phases = [(cached_phase1, None), _run_phase2_only(tag, sb.job_id, repo_root, artifacts, policy, cfg, sb.logs_dir)]
+    elif policy.parallel_phases:
+        phases = _run_phases_parallel(tag, sb.job_id, repo_root, sb.workdir, artifacts, policy, cfg, sb.logs_dir)
+    if phases is None:
+        phases = _run_phases_sequential(tag, sb.job_id, repo_root, artifacts, policy, cfg, sb.logs_dir)
+    if cached_phase1 is None and phases[0][1] is None:
+        with span("phase1_memo_record"):
+            record_phase1(memo_key, sb.job_id, phases[0][0], sb.root)
+    notes: dict = {"phase1": "cached"} if cached_phase1 is not None else {}
+    if reaped:
+        notes["reaped_containers"] = [r.to_dict() for r in reaped]
 
-    # --- PHASE 2: test.patch + solution.patch
-    _reset_clean(repo_root, policy.max_log_bytes)
-    report.stages.append(_apply_patch(repo_root, artifacts.test_patch, policy.max_log_bytes))
-    report.stages.append(_apply_patch(repo_root, artifacts.solution_patch, policy.max_log_bytes))
-
-    r_base2 = docker_run(tag, repo_root, ["bash", "-lc", "chmod +x test.sh && ./test.sh base"], policy.base_timeout_s, policy.max_log_bytes, cfg)
-    report.stages.append(StageResult("BOTH_BASE", r_base2.ok, r_base2.exit_code, r_base2.elapsed_ms, r_base2.cmd, r_base2.stdout_tail, r_base2.stderr_tail))
-    if not r_base2.ok:
-        report.summary = {"triad": "FAIL", "reason": "base_failed_with_both_patches"}
-        return report
-
-    r_new2 = docker_run(tag, repo_root, ["bash", "-lc", "chmod +x test.sh && ./test.sh new"], policy.new_timeout_s, policy.max_log_bytes, cfg)
-    report.stages.append(StageResult("BOTH_NEW", r_new2.ok, r_new2.exit_code, r_new2.elapsed_ms, r_new2.cmd, r_new2.stdout_tail, r_new2.stderr_tail))
-    if not r_new2.ok:
-        report.summary = {"triad": "FAIL", "reason": "new_failed_with_both_patches"}
-        return report
+    for stages, reason in phases:
+        report.stages.extend(stages)
+        if reason is not None:
+            report.summary = {"triad": "FAIL", "reason": reason, **notes}
+            return report
 
     report.ok = True
-    report.summary = {"triad": "OK"}
+    report.summary = {"triad": "OK", **notes}
     return report
@@ -6,6 +6,8 @@ import uuid
 from dataclasses import dataclass
 from pathlib import Path
 
+from validator.core.trace import traced
+
 @dataclass
 class Sandbox:
     job_id: str
@@ -14,6 +16,7 @@ class Sandbox:
     repo_dir: Path
     logs_dir: Path
 
+@traced("create_sandbox")
 def create_sandbox(submission_dir: Path) -> Sandbox:
     job_id = time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:8]
     runs_root = submission_dir / ".validator_runs" / job_id
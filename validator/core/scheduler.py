@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from validator.checks.policy import Policy, parse_size_bytes
+
+# Host capacity bookkeeping for `validator triad-batch`: each admitted job holds a disjoint
+# set of whole cores (passed to its containers as --cpuset-cpus) and a share of memory.
+
+@dataclass(frozen=True)
+class HostCapacity:
+    cores: tuple[int, ...]
+    memory_bytes: int
+
+    def to_dict(self) -> dict:
+        return {"cores": len(self.cores), "cpuset": format_cpuset(self.cores), "memory_bytes": self.memory_bytes}
+
+@dataclass(frozen=True)
+class Demand:
+    cores: int
+    memory_bytes: int
+
+@dataclass(frozen=True)
+class Allocation:
+    cores: tuple[int, ...]
+    memory_bytes: int
+
+    @property
+    def cpuset(self) -> str:
+        return format_cpuset(self.cores)
+
+def host_capacity(cpus: Optional[int] = None, memory_bytes: Optional[int] = None) -> HostCapacity:
+    # the cores this process may run on; --cpus / --memory cap what the batch uses
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if cpus:
+        cores = cores[:cpus]
+    total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    return HostCapacity(cores=tuple(cores), memory_bytes=min(memory_bytes, total) if memory_bytes else total)
+
+def job_demand(policy: Policy, capacity: HostCapacity) -> Demand:
+    # whole cores covering docker_cpus and docker_memory; parallel phases split both between
+    # their two containers. Clamped so an oversized job still runs, alone
+    return Demand(
+        cores=min(max(1, math.ceil(policy.docker_cpus)), len(capacity.cores)),
+        memory_bytes=min(parse_size_bytes(policy.docker_memory), capacity.memory_bytes),
+    )
+
+def format_cpuset(cores: tuple[int, ...] | list[int]) -> str:
+    # (0, 1, 2, 5) -> "0-2,5"
+    parts = []
+    run: list[int] = []
+    for c in sorted(cores):
+        if run and c != run[-1] + 1:
+            parts.append(f"{run[0]}-{run[-1]}" if len(run) > 1 else str(run[0]))
+            run = []
+        run.append(c)
+    if run:
+        parts.append(f"{run[0]}-{run[-1]}" if len(run) > 1 else str(run[0]))
+    return ",".join(parts)
+
+def parse_cpuset(value: str) -> list[int]:
+    cores: list[int] = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cores.extend(range(int(lo), int(hi or lo) + 1))
+    return cores
+
+def split_cpuset(value: str) -> tuple[str, str]:
+    # halves for the two parallel phases; a single core is shared
+    cores = parse_cpuset(value)
+    if len(cores) < 2:
+        return value, value
+    mid = len(cores) // 2
+    return format_cpuset(cores[:mid]), format_cpuset(cores[mid:])
+
+class ResourcePool:
+    # thread-safe; also integrates allocated cores/memory over time for utilization
+    def __init__(self, capacity: HostCapacity):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._free = set(capacity.cores)
+        self._free_memory = capacity.memory_bytes
+        self._started = self._last = time.monotonic()
+        self._core_s = 0.0
+        self._memory_s = 0.0
+
+    def _tick(self) -> None:
+        now = time.monotonic()
+        dt = now - self._last
+        self._core_s += (len(self.capacity.cores) - len(self._free)) * dt
+        self._memory_s += (self.capacity.memory_bytes - self._free_memory) * dt
+        self._last = now
+
+    def _pick(self, n: int) -> tuple[int, ...]:
+        # prefer n adjacent cores (shared caches), else the lowest free ones
+        free = sorted(self._free)
+        for i in range(len(free) - n + 1):
+            if free[i + n - 1] - free[i] == n - 1:
+                return tuple(free[i:i + n])
+        return tuple(free[:n])
+
+    def try_acquire(self, demand: Demand) -> Optional[Allocation]:
+        with self._lock:
+            if demand.cores > len(self._free) or demand.memory_bytes > self._free_memory:
+                return None
+            self._tick()
+            cores = self._pick(demand.cores)
+            self._free.difference_update(cores)
+            self._free_memory -= demand.memory_bytes
+            return Allocation(cores=cores, memory_bytes=demand.memory_bytes)
+
+    def release(self, alloc: Allocation) -> None:
+        with self._lock:
+            self._tick()
+            self._free.update(alloc.cores)
+            self._free_memory += alloc.memory_bytes
+
+    def usage(self) -> dict:
+        with self._lock:
+            self._tick()
+            elapsed = max(self._last - self._started, 1e-9)
+            return {
+                "cores_used": len(self.capacity.cores) - len(self._free),
+                "cores": len(self.capacity.cores),
+                "memory_used_bytes": self.capacity.memory_bytes - self._free_memory,
+                "memory_bytes": self.capacity.memory_bytes,
+                "core_utilization": round(self._core_s / (len(self.capacity.cores) * elapsed), 4),
+                "memory_utilization": round(self._memory_s / (self.capacity.memory_bytes * elapsed), 4) if self.capacity.memory_bytes else None,
+            }
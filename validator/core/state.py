@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+_DEFAULT_STATE_DIR = Path.home() / ".cache" / "validator-local"
+
+def state_dir(*parts: str) -> Path:
+    root = Path(os.environ.get("VALIDATOR_STATE_DIR") or _DEFAULT_STATE_DIR)
+    path = root.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def connect(db_name: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(state_dir() / db_name), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+_instance: Optional[tuple[int, str]] = None
+
+def instance_id() -> str:
+    # random id of this process, so a restarted server that got its predecessor's pid (pid 1
+    # in a container) still tells the predecessor's leftovers from its own
+    global _instance
+    if _instance is None or _instance[0] != os.getpid():
+        _instance = (os.getpid(), uuid.uuid4().hex)
+    return _instance[1]
+
+def owner_alive(pid: int, instance: Optional[str]) -> bool:
+    if pid == os.getpid():
+        return instance == instance_id()
+    return pid_alive(pid)
+
+@dataclass(frozen=True)
+class LruEntry:
+    key: str
+    size_bytes: int
+    last_used_at: float
+
+class LruIndex:
+    # last-used bookkeeping for content-addressed caches that live outside sqlite
+    # (docker images, baseline repos); eviction itself is up to the caller
+    def __init__(self, kind: str, db_name: str = "cache.sqlite"):
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lru ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, size_bytes INTEGER NOT NULL DEFAULT 0,"
+            " last_used_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+        )
+
+    def touch(self, key: str, size_bytes: Optional[int] = None, when: Optional[float] = None) -> None:
+        now = time.time() if when is None else when
+        with self._lock:
+            if size_bytes is None:
+                self._conn.execute(
+                    "INSERT INTO lru (kind, key, size_bytes, last_used_at) VALUES (?, ?, 0, ?)"
+                    " ON CONFLICT(kind, key) DO UPDATE SET last_used_at=excluded.last_used_at",
+                    (self.kind, key, now),
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO lru (kind, key, size_bytes, last_used_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(kind, key) DO UPDATE SET size_bytes=excluded.size_bytes, last_used_at=excluded.last_used_at",
+                    (self.kind, key, int(size_bytes), now),
+                )
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM lru WHERE kind=? AND key=?", (self.kind, key))
+
+    def entries(self) -> list[LruEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size_bytes, last_used_at FROM lru WHERE kind=? ORDER BY last_used_at ASC, key ASC",
+                (self.kind,),
+            ).fetchall()
+        return [LruEntry(key=k, size_bytes=int(sz), last_used_at=float(t)) for k, sz, t in rows]
+
+    def select_evictions(self, max_entries: Optional[int], max_bytes: Optional[int]) -> list[LruEntry]:
+        entries = self.entries()  # oldest first
+        total = sum(e.size_bytes for e in entries)
+        count = len(entries)
+        victims: list[LruEntry] = []
+        for e in entries:
+            over_count = max_entries is not None and count > max_entries
+            over_bytes = max_bytes is not None and total > max_bytes
+            if not (over_count or over_bytes):
+                break
+            victims.append(e)
+            count -= 1
+            total -= e.size_bytes
+        return victims
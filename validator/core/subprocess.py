@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import hashlib
 import subprocess
+import threading
 import time
-from dataclasses import dataclass
-from typing import Optional
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Iterable, Optional
+
+from validator.core.trace import span
+
+_READ_CHUNK = 64 * 1024
+_PUMP_JOIN_S = 10
+_CANCEL_POLL_S = 0.1
+
+CANCELLED_EXIT_CODE = 130
 
 @dataclass(frozen=True)
 class CmdResult:
@@ -13,35 +25,185 @@ class CmdResult:
     elapsed_ms: int
     stdout_tail: str
     stderr_tail: str
+    # per stream: {"path", "offset", "length", "sha256"} of the bytes this command wrote
+    logs: dict[str, dict[str, Any]] = field(default_factory=dict)
 
 def _tail_bytes(data: bytes, max_bytes: int) -> str:
     if len(data) <= max_bytes:
         return data.decode("utf-8", errors="replace")
-    return data[-max_bytes:].decode("utf-8", errors="replace")
+    return data[-max_bytes:].decode("utf-8", errors="replace") if max_bytes > 0 else ""
+
+class _TailBuffer:
+    # keeps at most the last max_bytes of a stream, plus at most one partial chunk
+    def __init__(self, max_bytes: int):
+        self._max = max(0, max_bytes)
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+
+    def write(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._chunks and self._size - len(self._chunks[0]) >= self._max:
+            self._size -= len(self._chunks.popleft())
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+class StreamCapture:
+    # tail in memory, full stream appended to log_path; fed by pump() for pipes or write()
+    # for other sources (e.g. the Engine API backend)
+    def __init__(self, max_bytes: int, log_path: Optional[Path], header: bytes):
+        self.max_bytes = max_bytes
+        self.tail = _TailBuffer(max_bytes)
+        self.log_path = log_path
+        self.offset = 0
+        self.length = 0
+        self._hash = hashlib.sha256()
+        self._log: Optional[IO[bytes]] = None
+        if log_path is not None:
+            self._log = open(log_path, "ab")
+            if header:
+                self._log.write(header)
+            self.offset = self._log.tell()
+
+    def write(self, chunk: bytes) -> None:
+        self.tail.write(chunk)
+        self.length += len(chunk)
+        self._hash.update(chunk)
+        if self._log is not None:
+            self._log.write(chunk)
+
+    def close(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def pump(self, stream: IO[bytes]) -> None:
+        try:
+            while True:
+                chunk = stream.read1(_READ_CHUNK)
+                if not chunk:
+                    break
+                self.write(chunk)
+        finally:
+            stream.close()
+            self.close()
+
+    def text(self) -> str:
+        return _tail_bytes(self.tail.getvalue(), self.max_bytes)
+
+    def log_ref(self) -> Optional[dict[str, Any]]:
+        if self.log_path is None:
+            return None
+        return {
+            "path": str(self.log_path),
+            "offset": self.offset,
+            "length": self.length,
+            "sha256": self._hash.hexdigest(),
+        }
+
+def _wait(p: subprocess.Popen, timeout_s: int, cancel: Optional[threading.Event]) -> int:
+    if cancel is None:
+        try:
+            return p.wait(timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+            return 124
+
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            return p.wait(timeout=min(_CANCEL_POLL_S, max(deadline - time.monotonic(), 0)))
+        except subprocess.TimeoutExpired:
+            if cancel.is_set():
+                p.kill()
+                p.wait()
+                return CANCELLED_EXIT_CODE
+            if time.monotonic() >= deadline:
+                p.kill()
+                p.wait()
+                return 124
+
+def open_captures(cmd: list[str], max_log_bytes: int, log_prefix: Optional[Path]) -> dict[str, StreamCapture]:
+    header = ("$ " + " ".join(cmd) + "\n").encode("utf-8", errors="replace")
+    return {
+        "stdout": StreamCapture(max_log_bytes, Path(f"{log_prefix}.stdout.log") if log_prefix else None, header),
+        "stderr": StreamCapture(max_log_bytes, Path(f"{log_prefix}.stderr.log") if log_prefix else None, b""),
+    }
+
+def span_name(cmd: list[str]) -> str:
+    # "git apply", "docker run", ...
+    name = Path(cmd[0]).name
+    rest = iter(cmd[1:])
+    for arg in rest:
+        if arg == "-c":  # git -c key=value
+            next(rest, None)
+        elif not arg.startswith("-"):
+            return f"{name} {arg}"
+    return name
+
+def run_cmd(cmd: list[str], cwd: Optional[str], timeout_s: int, max_log_bytes: int, env: Optional[dict] = None, log_prefix: Optional[Path] = None, cancel: Optional[threading.Event] = None, stdin: Optional[Iterable[bytes]] = None) -> CmdResult:
+    # stdout/stderr are streamed to <log_prefix>.stdout.log / .stderr.log (appended) as they
+    # arrive; only the last max_log_bytes of each stream are kept in memory.
+    # Setting `cancel` kills the command early with CANCELLED_EXIT_CODE.
+    # `stdin` chunks are written to the command's stdin from a helper thread.
+    name = span_name(cmd) if log_prefix is None else f"{log_prefix.name}: {span_name(cmd)}"
+    with span(name, cat="cmd", cmd=cmd) as sp:
+        res = _run_cmd(cmd, cwd, timeout_s, max_log_bytes, env, log_prefix, cancel, stdin)
+        sp.args["exit_code"] = res.exit_code
+    return res
+
+def _feed(dst: IO[bytes], chunks: Iterable[bytes], errors: list[str]) -> None:
+    try:
+        for chunk in chunks:
+            dst.write(chunk)
+    except BrokenPipeError:
+        pass  # the command exited (or was killed) without reading everything
+    except Exception as exc:
+        errors.append(f"stdin: {exc}\n")
+    finally:
+        try:
+            dst.close()
+        except OSError:
+            pass
+
+def _run_cmd(cmd: list[str], cwd: Optional[str], timeout_s: int, max_log_bytes: int, env: Optional[dict], log_prefix: Optional[Path], cancel: Optional[threading.Event], stdin: Optional[Iterable[bytes]] = None) -> CmdResult:
+    captures = open_captures(cmd, max_log_bytes, log_prefix)
 
-def run_cmd(cmd: list[str], cwd: Optional[str], timeout_s: int, max_log_bytes: int, env: Optional[dict] = None) -> CmdResult:
     start = time.time()
     p = subprocess.Popen(
         cmd,
         cwd=cwd,
         env=env,
+        stdin=subprocess.PIPE if stdin is not None else None,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
-    try:
-        out, err = p.communicate(timeout=timeout_s)
-        code = p.returncode
-    except subprocess.TimeoutExpired:
-        p.kill()
-        out, err = p.communicate()
-        code = 124
+    pumps = [
+        threading.Thread(target=captures["stdout"].pump, args=(p.stdout,), daemon=True),
+        threading.Thread(target=captures["stderr"].pump, args=(p.stderr,), daemon=True),
+    ]
+    feed_errors: list[str] = []
+    if stdin is not None:
+        pumps.append(threading.Thread(target=_feed, args=(p.stdin, stdin, feed_errors), daemon=True))
+    for t in pumps:
+        t.start()
+
+    code = _wait(p, timeout_s, cancel)
+    for t in pumps:
+        # a grandchild may still hold the pipe open; don't hang on it
+        t.join(timeout=_PUMP_JOIN_S)
 
     elapsed_ms = int((time.time() - start) * 1000)
+    logs = {name: ref for name, c in captures.items() if (ref := c.log_ref()) is not None}
     return CmdResult(
         ok=(code == 0),
         cmd=cmd,
         exit_code=code,
         elapsed_ms=elapsed_ms,
-        stdout_tail=_tail_bytes(out or b"", max_log_bytes),
-        stderr_tail=_tail_bytes(err or b"", max_log_bytes),
+        stdout_tail=captures["stdout"].text(),
+        # a failed stdin feed is only in the tail: the stderr log is closed by then
+        stderr_tail=captures["stderr"].text() + "".join(feed_errors),
+        logs=logs,
     )
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+# lightweight spans: monotonic start/end per named step, collected by the Tracer that is
+# active in the current context and exported as Chrome trace JSON (chrome://tracing,
+# ui.perfetto.dev). Without an active tracer span() only measures time.
+
+_current: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar("validator_tracer", default=None)
+
+class Span:
+    __slots__ = ("name", "cat", "args", "start_ns", "end_ns", "tid")
+
+    def __init__(self, name: str, cat: str, args: dict[str, Any]):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start_ns = time.monotonic_ns()
+        self.end_ns: Optional[int] = None
+        self.tid = threading.get_ident()
+
+    @property
+    def elapsed_ms(self) -> int:
+        end = self.end_ns if self.end_ns is not None else time.monotonic_ns()
+        return (end - self.start_ns) // 1_000_000
+
+class Tracer:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spans: list[Span] = []
+        self._threads: dict[int, str] = {}
+        self.origin_ns = time.monotonic_ns()
+
+    def add(self, sp: Span) -> None:
+        with self._lock:
+            self._spans.append(sp)
+            self._threads.setdefault(sp.tid, threading.current_thread().name)
+
+    def to_chrome(self) -> dict[str, Any]:
+        pid = os.getpid()
+        now = time.monotonic_ns()
+        with self._lock:
+            spans = list(self._spans)
+            threads = dict(self._threads)
+        events: list[dict[str, Any]] = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        for sp in spans:
+            end = sp.end_ns if sp.end_ns is not None else now
+            events.append({
+                "name": sp.name,
+                "cat": sp.cat,
+                "ph": "X",
+                "ts": (sp.start_ns - self.origin_ns) / 1000,
+                "dur": (end - sp.start_ns) / 1000,
+                "pid": pid,
+                "tid": sp.tid,
+                "args": sp.args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_chrome()), encoding="utf-8")
+
+@contextmanager
+def tracing() -> Iterator[Tracer]:
+    tracer = Tracer()
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name: str, cat: str = "step", **args: Any) -> Iterator[Span]:
+    sp = Span(name, cat, args)
+    tracer = _current.get()
+    if tracer is not None:
+        tracer.add(sp)
+    try:
+        yield sp
+    finally:
+        sp.end_ns = time.monotonic_ns()
+
+def traced(name: str, cat: str = "step") -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    def deco(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*a: Any, **kw: Any) -> Any:
+            with span(name, cat):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+def in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    # for executor.submit: pool threads don't inherit the caller's tracer on their own
+    ctx = contextvars.copy_context()
+
+    def run(*a: Any, **kw: Any) -> Any:
+        return ctx.run(fn, *a, **kw)
+    return run
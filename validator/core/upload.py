@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tarfile
+import time
+import uuid
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import IO, Any, Optional
+
+from validator.checks.policy import parse_size_bytes
+from validator.core.hashing import remember_file_sha256
+from validator.core.state import state_dir
+
+# Submissions uploaded to the API as a tar stream (optionally gzipped) instead of a shared
+# dir_path. The stream is parsed incrementally as chunks arrive: artifact members are
+# written to $VALIDATOR_STATE_DIR/uploads/<upload_id>/ and hashed on the way, everything
+# else is skipped, and nothing is held in memory beyond one tar header. Symlinks, devices
+# and nested paths are never created.
+
+ARTIFACT_NAMES = ("repo.zip", "Dockerfile.problem", "test.patch", "solution.patch", "description.txt", "validator.toml", "test.sh")
+REQUIRED_NAMES = ("Dockerfile.problem", "test.patch", "solution.patch")
+
+_MAX_META_BYTES = 1024 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+# decompressed bytes produced per step, so a gzip bomb is cut off at the size limit
+_INFLATE_STEP = 1024 * 1024
+
+def upload_max_bytes() -> int:
+    # VALIDATOR_UPLOAD_MAX_BYTES caps the uncompressed tar stream (default 8g)
+    return parse_size_bytes(os.environ.get("VALIDATOR_UPLOAD_MAX_BYTES") or "8g")
+
+def uploads_dir() -> Path:
+    return state_dir("uploads")
+
+def new_upload_dir() -> Path:
+    path = uploads_dir() / uuid.uuid4().hex
+    path.mkdir()
+    return path
+
+def is_upload_dir(path: str | Path) -> bool:
+    return Path(path).resolve().parent == uploads_dir().resolve()
+
+class UploadError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+def _artifact_name(name: str) -> Optional[str]:
+    # "test.patch" or "<folder>/test.patch" -> "test.patch"; None for anything else
+    parts = [p for p in PurePosixPath(name).parts if p not in ("", ".")]
+    if not parts or len(parts) > 2 or ".." in parts or parts[0] == "/":
+        return None
+    base = parts[-1]
+    if base.startswith("._"):
+        return None  # macOS resource forks
+    if base in ARTIFACT_NAMES or base.endswith(".zip"):
+        return base
+    return None
+
+def _pax_path(payload: bytes) -> Optional[str]:
+    # PAX extended header records: "<len> <key>=<value>\n"
+    pos = 0
+    path = None
+    while pos < len(payload):
+        space = payload.find(b" ", pos)
+        if space == -1:
+            break
+        length = int(payload[pos:space])
+        if length <= 0:
+            break
+        key, _, value = payload[space + 1:pos + length - 1].partition(b"=")
+        if key == b"path":
+            path = value.decode("utf-8", errors="surrogateescape")
+        pos += length
+    return path
+
+class TarUpload:
+    # feed() chunks as they arrive, then close(); files maps artifact name -> sha256/bytes
+    def __init__(self, dest: Path, max_bytes: int):
+        self.dest = dest
+        self.max_bytes = max_bytes
+        self.files: dict[str, dict[str, Any]] = {}
+        self.ignored: list[str] = []
+        self.received_bytes = 0
+        self.tar_bytes = 0
+        self._start = time.monotonic()
+        self._sniff: Optional[bytes] = b""
+        self._inflate: Optional[Any] = None
+        self._header = bytearray()
+        self._ended = False
+        # current member
+        self._remaining = 0
+        self._pad = 0
+        self._out: Optional[IO[bytes]] = None
+        self._hash: Optional[Any] = None
+        self._name = ""
+        self._meta: Optional[bytearray] = None
+        self._meta_type = b""
+        self._next_name: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> None:
+        self.received_bytes += len(chunk)
+        if self._sniff is not None:
+            # gzip or plain tar, told apart by the first two bytes
+            self._sniff += chunk
+            if len(self._sniff) < 2:
+                return
+            chunk, self._sniff = self._sniff, None
+            if chunk[:2] == _GZIP_MAGIC:
+                self._inflate = zlib.decompressobj(wbits=31)
+        if self._inflate is None:
+            self._consume(chunk)
+            return
+        data = chunk
+        while data:
+            try:
+                out = self._inflate.decompress(data, _INFLATE_STEP)
+            except zlib.error as exc:
+                raise UploadError("upload_bad_tar", f"bad gzip stream: {exc}")
+            self._consume(out)
+            data = self._inflate.unconsumed_tail
+
+    def close(self) -> None:
+        if self._sniff:
+            self._consume(self._sniff)
+        if self._inflate is not None:
+            self._consume(self._inflate.flush())
+            if not self._inflate.eof:
+                raise UploadError("upload_truncated", "gzip stream ended early")
+        if self._remaining or self._header:
+            self._abort_member()
+            raise UploadError("upload_truncated", f"tar stream ended inside {self._name or 'a header'}")
+        missing = [n for n in REQUIRED_NAMES if n not in self.files]
+        if not any(n.endswith(".zip") for n in self.files):
+            missing.append("repo.zip")
+        if missing:
+            raise UploadError("upload_missing_files", f"upload is missing {', '.join(missing)}")
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "upload_id": self.dest.name,
+            "dir": str(self.dest),
+            "files": self.files,
+            "ignored": self.ignored[:50],
+            "received_bytes": self.received_bytes,
+            "tar_bytes": self.tar_bytes,
+            "elapsed_ms": int((time.monotonic() - self._start) * 1000),
+        }
+
+    def _consume(self, data: bytes) -> None:
+        self.tar_bytes += len(data)
+        if self.tar_bytes > self.max_bytes:
+            self._abort_member()
+            raise UploadError("upload_too_large", f"upload exceeds {self.max_bytes} bytes")
+        view = memoryview(data)
+        pos = 0
+        while pos < len(view):
+            if self._remaining:
+                n = min(self._remaining, len(view) - pos)
+                self._write(view[pos:pos + n])
+                pos += n
+                self._remaining -= n
+                if not self._remaining:
+                    self._finish_member()
+            elif self._pad:
+                n = min(self._pad, len(view) - pos)
+                pos += n
+                self._pad -= n
+            elif self._ended:
+                return  # end-of-archive blocks and record padding
+            else:
+                n = min(tarfile.BLOCKSIZE - len(self._header), len(view) - pos)
+                self._header += view[pos:pos + n]
+                pos += n
+                if len(self._header) == tarfile.BLOCKSIZE:
+                    block = bytes(self._header)
+                    self._header.clear()
+                    self._start_member(block)
+
+    def _start_member(self, block: bytes) -> None:
+        if block == tarfile.NUL * tarfile.BLOCKSIZE:
+            self._ended = True
+            return
+        try:
+            info = tarfile.TarInfo.frombuf(block, "utf-8", "surrogateescape")
+        except tarfile.HeaderError as exc:
+            raise UploadError("upload_bad_tar", f"not a tar stream: {exc}")
+        self._remaining = info.size
+        self._pad = -info.size % tarfile.BLOCKSIZE
+        name = self._next_name or info.name
+        if info.type in (tarfile.XHDTYPE, tarfile.XGLTYPE, tarfile.GNUTYPE_LONGNAME):
+            if info.size > _MAX_META_BYTES:
+                raise UploadError("upload_bad_tar", f"tar extended header of {info.size} bytes")
+            self._meta = bytearray()
+            self._meta_type = info.type
+        else:
+            self._next_name = None
+            self._name = name
+            base = _artifact_name(name) if info.type in (tarfile.REGTYPE, tarfile.AREGTYPE) else None
+            if base is not None:
+                if base in self.files or (base.endswith(".zip") and any(n.endswith(".zip") for n in self.files)):
+                    raise UploadError("upload_duplicate", f"{base} appears more than once in the upload")
+                self._name = base
+                self._out = open(self.dest / base, "xb")
+                self._hash = hashlib.sha256()
+            elif not info.isdir():
+                self.ignored.append(name)
+        if not self._remaining:
+            self._finish_member()
+
+    def _write(self, data: memoryview) -> None:
+        if self._meta is not None:
+            self._meta += data
+        elif self._out is not None:
+            self._out.write(data)
+            self._hash.update(data)
+
+    def _finish_member(self) -> None:
+        if self._meta is not None:
+            payload = bytes(self._meta)
+            if self._meta_type == tarfile.GNUTYPE_LONGNAME:
+                self._next_name = payload.rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+            elif self._meta_type == tarfile.XHDTYPE:
+                try:
+                    self._next_name = _pax_path(payload) or self._next_name
+                except ValueError:
+                    raise UploadError("upload_bad_tar", "malformed pax extended header")
+            self._meta = None
+            return
+        if self._out is not None:
+            self._out.close()
+            path = self.dest / self._name
+            digest = self._hash.hexdigest()
+            self.files[self._name] = {"sha256": digest, "bytes": path.stat().st_size}
+            # later cached_file_sha256 calls (image cache, baselines, phase memo) skip the re-read
+            remember_file_sha256(path, digest)
+            self._out = None
+            self._hash = None
+
+    def _abort_member(self) -> None:
+        if self._out is not None:
+            self._out.close()
+            self._out = None
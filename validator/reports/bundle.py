@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import shutil
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from validator.core.blobstore import blobs_dir, link_blob, put_file
+from validator.core.hashing import cached_file_sha256
+
+# already-compressed formats gain nothing from deflate, so they are stored as-is
+_COMPRESSED_SUFFIXES = {".zip", ".gz", ".tgz", ".xz", ".txz", ".bz2", ".zst", ".7z", ".whl", ".jar", ".png", ".jpg", ".jpeg", ".gif", ".webp"}
+_COMPRESSED_MAGIC = (
+    b"PK\x03\x04",  # zip
+    b"\x1f\x8b",  # gzip
+    b"\xfd7zXZ\x00",  # xz
+    b"BZh",  # bzip2
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"7z\xbc\xaf\x27\x1c",  # 7z
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # jpeg
+)
+_SNIFF_BYTES = 64 * 1024
+# deflate has to save at least 10% on a sample for the entry to be compressed
+_MIN_RATIO = 0.9
+
+def choose_compression(path: Path) -> int:
+    if path.suffix.lower() in _COMPRESSED_SUFFIXES:
+        return zipfile.ZIP_STORED
+    with open(path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+    if head.startswith(_COMPRESSED_MAGIC):
+        return zipfile.ZIP_STORED
+    if len(head) >= 4096 and len(zlib.compress(head, 1)) > len(head) * _MIN_RATIO:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+class BundleWriter:
+    # zip members are streamed from disk (ZipFile.write copies in chunks), each with its
+    # own compression method
+    def __init__(self, path: Path, compress_level: int = 6):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compress_level, allowZip64=True)
+
+    def add_file(self, src: Path, arcname: str, compress_type: Optional[int] = None) -> None:
+        ct = choose_compression(src) if compress_type is None else compress_type
+        self._zip.write(src, arcname=arcname, compress_type=ct)
+
+    def copy_member(self, src: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        # re-encodes with the member's original method; streamed, never fully in memory
+        zinfo = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        zinfo.compress_type = info.compress_type
+        zinfo.external_attr = info.external_attr
+        with src.open(info) as r, self._zip.open(zinfo, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as w:
+            shutil.copyfileobj(r, w, 1024 * 1024)
+
+    def add_json(self, obj: Any, arcname: str) -> None:
+        self._zip.writestr(arcname, json.dumps(obj, indent=2, sort_keys=True), compress_type=zipfile.ZIP_DEFLATED)
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self) -> "BundleWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def add_inputs(bundle: BundleWriter, submission_dir: Path, runs_dir: Path, names: list[str], store: bool, store_min_bytes: int) -> list[dict[str, Any]]:
+    # with store=True, inputs of at least store_min_bytes go to the blob store once per
+    # distinct content and are hardlinked into runs_dir/inputs; the bundle only lists them.
+    # The hardlink is what keeps a blob alive, so without one (store on another
+    # filesystem) the input is copied into the bundle as usual.
+    runs_dir.mkdir(parents=True, exist_ok=True)
+    store = store and blobs_dir().stat().st_dev == runs_dir.stat().st_dev
+    manifest: list[dict[str, Any]] = []
+    for name in names:
+        p = submission_dir / name
+        if not p.exists():
+            continue
+        digest = cached_file_sha256(p)
+        size = p.stat().st_size
+        entry: dict[str, Any] = {"name": name, "sha256": digest, "size_bytes": size, "location": "bundle"}
+        if store and size >= store_min_bytes and link_blob(put_file(p, digest), runs_dir / "inputs" / name):
+            entry["location"] = "store"
+            entry["path"] = f"inputs/{name}"
+        else:
+            bundle.add_file(p, f"inputs/{name}")
+        manifest.append(entry)
+    return manifest
+
+def export_bundle(runs_dir: Path, out: Path) -> dict[str, Any]:
+    # self-contained copy of a run's bundle.zip: inputs kept in the blob store are pulled
+    # back in from the run folder's hardlinks
+    src_path = runs_dir / "bundle.zip"
+    with zipfile.ZipFile(src_path) as src:
+        manifest = json.loads(src.read("inputs/manifest.json")) if "inputs/manifest.json" in src.namelist() else {"inputs": []}
+        with BundleWriter(out) as dst:
+            for info in src.infolist():
+                if info.filename == "inputs/manifest.json":
+                    continue
+                dst.copy_member(src, info)
+            for entry in manifest["inputs"]:
+                if entry.get("location") != "store":
+                    continue
+                p = runs_dir / entry["path"]
+                if not p.is_file() or cached_file_sha256(p) != entry["sha256"]:
+                    raise FileNotFoundError(f"input {entry['name']} ({entry['sha256'][:12]}) is missing from {runs_dir}")
+                dst.add_file(p, f"inputs/{entry['name']}")
+                entry["location"] = "bundle"
+                entry.pop("path", None)
+            dst.add_json(manifest, "inputs/manifest.json")
+    return manifest
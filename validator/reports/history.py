@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from validator.core.state import connect
+from validator.reports.models import Report
+
+# every written report is upserted here so history queries hit indexes instead of
+# walking <dir>/.validator_runs/*/report.json
+
+_DB_NAME = "history.sqlite"
+_JOB_ID_TIME_FORMAT = "%Y%m%d_%H%M%S"
+_AGE_RE = re.compile(r"^(\d+)([smhdw])$")
+_AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+_BACKFILL_BATCH = 500
+AGGREGATES = ("reason", "day", "stage", "violation")
+
+@dataclass(frozen=True)
+class HistoryRun:
+    job_id: str
+    submission_dir: str
+    runs_dir: str
+    created_at: float
+    ok: bool
+    triad: str
+    reason: Optional[str]
+    elapsed_ms: int
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "submission_dir": self.submission_dir,
+            "runs_dir": self.runs_dir,
+            "created_at": self.created_at,
+            "ok": self.ok,
+            "triad": self.triad,
+            "reason": self.reason,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+def parse_time(value: str) -> float:
+    # "7d" / "12h" / "30m" are relative to now; otherwise an ISO date or datetime
+    m = _AGE_RE.match(value.strip())
+    if m:
+        return time.time() - int(m.group(1)) * _AGE_UNITS[m.group(2)]
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+def _created_at(job_id: str, runs_dir: str) -> float:
+    try:
+        return time.mktime(time.strptime(job_id[:15], _JOB_ID_TIME_FORMAT))
+    except ValueError:
+        pass
+    try:
+        return os.stat(Path(runs_dir) / "report.json").st_mtime
+    except OSError:
+        return time.time()
+
+class HistoryIndex:
+    def __init__(self, db_name: str = _DB_NAME):
+        self._lock = threading.Lock()
+        self._conn = connect(db_name)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " job_id TEXT PRIMARY KEY, submission_dir TEXT NOT NULL, runs_dir TEXT NOT NULL,"
+            " created_at REAL NOT NULL, ok INTEGER NOT NULL, triad TEXT NOT NULL, reason TEXT,"
+            " elapsed_ms INTEGER NOT NULL);"
+            # covering: day/reason aggregates over a time range never touch the table
+            "CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at, ok, reason, triad, elapsed_ms);"
+            "CREATE INDEX IF NOT EXISTS runs_reason_created ON runs (reason, created_at);"
+            "CREATE INDEX IF NOT EXISTS runs_dir_created ON runs (submission_dir, created_at);"
+            "CREATE TABLE IF NOT EXISTS stages ("
+            " job_id TEXT NOT NULL, seq INTEGER NOT NULL, name TEXT NOT NULL, ok INTEGER NOT NULL,"
+            " exit_code INTEGER NOT NULL, elapsed_ms INTEGER NOT NULL, PRIMARY KEY (job_id, seq)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS stages_name ON stages (name, ok);"
+            "CREATE TABLE IF NOT EXISTS violations ("
+            " job_id TEXT NOT NULL, code TEXT NOT NULL, PRIMARY KEY (job_id, code)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS violations_code ON violations (code);"
+        )
+
+    def record(self, report: Report) -> None:
+        self.record_many([report.to_dict()])
+
+    def record_many(self, reports: list[dict[str, Any]]) -> None:
+        # one transaction per batch; re-recording a job_id replaces its rows
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for r in reports:
+                    self._upsert(r)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _upsert(self, r: dict[str, Any]) -> None:
+        job_id = r["job_id"]
+        summary = r.get("summary") or {}
+        stages = r.get("stages") or []
+        self._conn.execute(
+            "INSERT OR REPLACE INTO runs (job_id, submission_dir, runs_dir, created_at, ok, triad, reason, elapsed_ms)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                r.get("submission_dir", ""),
+                r.get("runs_dir", ""),
+                _created_at(job_id, r.get("runs_dir", "")),
+                int(bool(r.get("ok"))),
+                summary.get("triad", ""),
+                summary.get("reason"),
+                sum(int(s.get("elapsed_ms") or 0) for s in stages),
+            ),
+        )
+        self._conn.execute("DELETE FROM stages WHERE job_id=?", (job_id,))
+        self._conn.execute("DELETE FROM violations WHERE job_id=?", (job_id,))
+        self._conn.executemany(
+            "INSERT INTO stages (job_id, seq, name, ok, exit_code, elapsed_ms) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (job_id, i, s["name"], int(bool(s.get("ok"))), int(s.get("exit_code") or 0), int(s.get("elapsed_ms") or 0))
+                for i, s in enumerate(stages)
+            ],
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO violations (job_id, code) VALUES (?, ?)",
+            [(job_id, v["code"]) for v in r.get("violations") or []],
+        )
+
+    def remove(self, job_ids: list[str]) -> int:
+        # runs whose folders were deleted (validator gc): their rows go in one transaction
+        removed = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for job_id in job_ids:
+                    removed += self._conn.execute("DELETE FROM runs WHERE job_id=?", (job_id,)).rowcount
+                    self._conn.execute("DELETE FROM stages WHERE job_id=?", (job_id,))
+                    self._conn.execute("DELETE FROM violations WHERE job_id=?", (job_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def _where(
+        self,
+        ok: Optional[bool] = None,
+        reason: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        submission_dir: Optional[str] = None,
+        violation: Optional[str] = None,
+        failed_stage: Optional[str] = None,
+    ) -> tuple[str, list[Any]]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if ok is not None:
+            clauses.append("runs.ok=?")
+            params.append(int(ok))
+        if reason is not None:
+            clauses.append("runs.reason=?")
+            params.append(reason)
+        if since is not None:
+            clauses.append("runs.created_at>=?")
+            params.append(since)
+        if until is not None:
+            clauses.append("runs.created_at<?")
+            params.append(until)
+        if submission_dir is not None:
+            clauses.append("runs.submission_dir=?")
+            params.append(submission_dir)
+        if violation is not None:
+            clauses.append("runs.job_id IN (SELECT job_id FROM violations WHERE code=?)")
+            params.append(violation)
+        if failed_stage is not None:
+            clauses.append("runs.job_id IN (SELECT job_id FROM stages WHERE name=? AND ok=0)")
+            params.append(failed_stage)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: int = 100, **filters: Any) -> list[HistoryRun]:
+        where, params = self._where(**filters)
+        sql = (
+            "SELECT job_id, submission_dir, runs_dir, created_at, ok, triad, reason, elapsed_ms FROM runs"
+            f"{where} ORDER BY created_at DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params + [int(limit)]).fetchall()
+        return [
+            HistoryRun(
+                job_id=r[0], submission_dir=r[1], runs_dir=r[2], created_at=r[3],
+                ok=bool(r[4]), triad=r[5], reason=r[6], elapsed_ms=int(r[7]),
+            )
+            for r in rows
+        ]
+
+    def aggregate(self, by: str, **filters: Any) -> list[dict[str, Any]]:
+        where, params = self._where(**filters)
+        if by == "reason":
+            sql = (
+                "SELECT COALESCE(runs.reason, runs.triad) AS k, COUNT(*), SUM(runs.ok), AVG(runs.elapsed_ms)"
+                f" FROM runs{where} GROUP BY k ORDER BY COUNT(*) DESC"
+            )
+            cols = ["reason", "runs", "ok", "avg_elapsed_ms"]
+        elif by == "day":
+            sql = (
+                "SELECT date(runs.created_at, 'unixepoch', 'localtime') AS k, COUNT(*), SUM(runs.ok), AVG(runs.elapsed_ms)"
+                f" FROM runs{where} GROUP BY k ORDER BY k DESC"
+            )
+            cols = ["day", "runs", "ok", "avg_elapsed_ms"]
+        elif by == "stage":
+            sql = (
+                "SELECT stages.name, COUNT(*), SUM(stages.ok = 0), AVG(stages.elapsed_ms), MAX(stages.elapsed_ms)"
+                f" FROM runs CROSS JOIN stages ON stages.job_id = runs.job_id{where} GROUP BY stages.name ORDER BY stages.name"
+            )
+            cols = ["stage", "runs", "failed", "avg_elapsed_ms", "max_elapsed_ms"]
+        elif by == "violation":
+            sql = (
+                "SELECT violations.code, COUNT(*)"
+                f" FROM runs CROSS JOIN violations ON violations.job_id = runs.job_id{where}"
+                " GROUP BY violations.code ORDER BY COUNT(*) DESC"
+            )
+            cols = ["code", "runs"]
+        else:
+            raise ValueError(f"unknown aggregate: {by} (expected one of {', '.join(AGGREGATES)})")
+        # CROSS JOIN pins runs as the outer loop so the created_at/reason indexes drive the scan
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        out = []
+        for row in rows:
+            d = dict(zip(cols, row))
+            if d.get("avg_elapsed_ms") is not None:
+                d["avg_elapsed_ms"] = int(round(d["avg_elapsed_ms"]))
+            out.append(d)
+        return out
+
+    def submission_dirs(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT submission_dir FROM runs ORDER BY submission_dir").fetchall()]
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0])
+
+def find_report_files(root: Path) -> Iterator[Path]:
+    # <dir>/.validator_runs/<job_id>/report.json anywhere under root
+    for dirpath, dirnames, _ in os.walk(root):
+        if ".validator_runs" in dirnames:
+            runs = Path(dirpath) / ".validator_runs"
+            for entry in sorted(os.scandir(runs), key=lambda e: e.name):
+                report = Path(entry.path) / "report.json"
+                if entry.is_dir() and report.is_file():
+                    yield report
+        # never descend into run sandboxes (work/repo trees) or hidden dirs
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+
+def backfill(index: HistoryIndex, root: Path) -> dict[str, int]:
+    counts = {"imported": 0, "skipped": 0}
+    batch: list[dict[str, Any]] = []
+    for path in find_report_files(root):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if not isinstance(data, dict) or "job_id" not in data:
+                raise ValueError("not a report")
+        except (OSError, ValueError):
+            counts["skipped"] += 1
+            continue
+        batch.append(data)
+        if len(batch) >= _BACKFILL_BATCH:
+            index.record_many(batch)
+            counts["imported"] += len(batch)
+            batch = []
+    if batch:
+        index.record_many(batch)
+        counts["imported"] += len(batch)
+    return counts
+
+_index: Optional[HistoryIndex] = None
+_index_pid = 0
+_index_lock = threading.Lock()
+
+def get_history() -> HistoryIndex:
+    global _index, _index_pid
+    with _index_lock:
+        if _index is None or _index_pid != os.getpid():
+            _index = HistoryIndex()
+            _index_pid = os.getpid()
+        return _index
@@ -1,35 +1,79 @@
 from __future__ import annotations
 
 import json
+import sqlite3
 import zipfile
 from pathlib import Path
+from typing import Any, Iterator, Optional
 
+from validator.checks.policy import Policy
+from validator.core.trace import span, traced
+from validator.reports.bundle import BundleWriter, add_inputs
+from validator.reports.history import get_history
 from validator.reports.models import Report
 
-def write_report_files(submission_dir: Path, report: Report) -> None:
+_INPUT_NAMES = ["repo.zip", "Dockerfile.problem", "test.patch", "solution.patch", "description.txt", "validator.toml"]
+
+REPORT_FORMATS = ("full", "compact")
+# characters of each stage's stdout/stderr tail kept in a compact report
+EXCERPT_CHARS = 1024
+
+def compact_report(report: dict[str, Any], excerpt_chars: int = EXCERPT_CHARS) -> dict[str, Any]:
+    # stage tails cut to a short excerpt; the full streams stay in stage_logs/, located by
+    # details.log_refs (path, offset, length, sha256 of the bytes each stage wrote)
+    stages = []
+    for s in report.get("stages") or []:
+        s = dict(s)
+        for key in ("stdout_tail", "stderr_tail"):
+            tail = s.get(key) or ""
+            if len(tail) > excerpt_chars:
+                s[key] = tail[-excerpt_chars:]
+                s[f"{key}_truncated"] = True
+        stages.append(s)
+    return {**report, "stages": stages, "format": "compact"}
+
+def iter_report_json(obj: Any, pretty: bool = False) -> Iterator[str]:
+    # chunks from the stdlib streaming encoder; without indent it runs the C encoder
+    if pretty:
+        enc = json.JSONEncoder(indent=2, sort_keys=True)
+    else:
+        enc = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+    return enc.iterencode(obj)
+
+def format_report(report: Report, report_format: str = "full") -> dict[str, Any]:
+    data = report.to_dict()
+    return compact_report(data) if report_format == "compact" else data
+
+@traced("write_report_files")
+def write_report_files(submission_dir: Path, report: Report, policy: Optional[Policy] = None) -> None:
     runs_dir = Path(report.runs_dir)
     runs_dir.mkdir(parents=True, exist_ok=True)
 
+    pol = policy if policy is not None else Policy()
     report_path = runs_dir / "report.json"
-    report_path.write_text(json.dumps(report.to_dict(), indent=2, sort_keys=True), encoding="utf-8")
+    with span("report_json"), open(report_path, "w", encoding="utf-8") as f:
+        f.writelines(iter_report_json(format_report(report, pol.report_format), pretty=pol.report_format == "full"))
 
     triad_summary = runs_dir / "triad_summary.json"
     triad_summary.write_text(json.dumps(report.summary, indent=2, sort_keys=True), encoding="utf-8")
 
+    try:
+        with span("history_record"):
+            get_history().record(report)
+    except sqlite3.Error:
+        # the files above are the record of truth; `validator history backfill` catches up
+        pass
+
     # bundle.zip: inputs + reports + stage logs
-    bundle = runs_dir / "bundle.zip"
-    with zipfile.ZipFile(bundle, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        # include top-level inputs if present
-        for name in ["repo.zip", "Dockerfile.problem", "test.patch", "solution.patch", "description.txt", "validator.toml"]:
-            p = submission_dir / name
-            if p.exists():
-                z.write(p, arcname=f"inputs/{name}")
+    with span("bundle"), BundleWriter(runs_dir / "bundle.zip", compress_level=pol.bundle_compress_level) as bundle:
+        manifest = add_inputs(bundle, submission_dir, runs_dir, _INPUT_NAMES, pol.bundle_input_store, pol.bundle_store_min_bytes)
+        bundle.add_json({"inputs": manifest}, "inputs/manifest.json")
 
-        z.write(report_path, arcname="outputs/report.json")
-        z.write(triad_summary, arcname="outputs/triad_summary.json")
+        bundle.add_file(report_path, "outputs/report.json", zipfile.ZIP_DEFLATED)
+        bundle.add_file(triad_summary, "outputs/triad_summary.json", zipfile.ZIP_DEFLATED)
 
         logs_dir = runs_dir / "stage_logs"
         if logs_dir.exists():
             for p in sorted(logs_dir.rglob("*")):
                 if p.is_file():
-                    z.write(p, arcname=f"outputs/stage_logs/{p.relative_to(logs_dir)}")
+                    bundle.add_file(p, f"outputs/stage_logs/{p.relative_to(logs_dir)}", zipfile.ZIP_DEFLATED)
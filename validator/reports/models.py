@@ -27,6 +27,7 @@ class StageResult:
     cmd: list[str]
     stdout_tail: str
     stderr_tail: str
+    details: dict[str, Any] = field(default_factory=dict)
 
     def to_dict(self) -> dict:
         return {
@@ -37,6 +38,7 @@ class StageResult:
             "cmd": self.cmd,
             "stdout_tail": self.stdout_tail,
             "stderr_tail": self.stderr_tail,
+            "details": self.details,
         }
 
 @dataclass